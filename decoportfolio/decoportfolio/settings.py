@@ -10,6 +10,7 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/5.2/ref/settings/
 """
 
+import os
 from pathlib import Path
 from decouple import config, Csv
 
@@ -67,6 +68,7 @@ MIDDLEWARE = [
     "django.contrib.auth.middleware.AuthenticationMiddleware",
     "django.contrib.messages.middleware.MessageMiddleware",
     "django.middleware.clickjacking.XFrameOptionsMiddleware",
+    "gallery.middleware.InvalidationBatchMiddleware",
 ]
 
 CORS_ALLOWED_ORIGINS = config(
@@ -100,21 +102,70 @@ REDIS_URL = config("REDIS_URL", default="redis://127.0.0.1:6379/1")
 
 CACHES = {
     "default": {
-        "BACKEND": "django_redis.cache.RedisCache",
+        # django_redis behind a circuit breaker: after repeated connection
+        # errors or timeouts, requests use an in-process cache (or the DB)
+        # for the cooldown instead of waiting on Redis
+        "BACKEND": "gallery.caching.backends.CircuitBreakerRedisCache",
         "LOCATION": REDIS_URL,
         "OPTIONS": {
             "CLIENT_CLASS": "django_redis.client.DefaultClient",
+            # Fail fast; a stalled Redis must not hold requests for seconds
+            "SOCKET_CONNECT_TIMEOUT": config(
+                "REDIS_CONNECT_TIMEOUT", default=0.25, cast=float
+            ),
+            "SOCKET_TIMEOUT": config("REDIS_SOCKET_TIMEOUT", default=0.5, cast=float),
             "CONNECTION_POOL_KWARGS": {
                 "max_connections": 50,
-                "retry_on_timeout": True,
             },
         },
+        "CIRCUIT_BREAKER": {
+            "FAILURE_THRESHOLD": config(
+                "CACHE_BREAKER_FAILURES", default=5, cast=int
+            ),
+            "COOLDOWN": config("CACHE_BREAKER_COOLDOWN", default=30, cast=int),
+            "FALLBACK_TIMEOUT": 60,
+        },
         "TIMEOUT": 300,  # 5 minutes default timeout
         "KEY_PREFIX": "decoportfolio",
         "VERSION": 1,
     }
 }
 
+# Per-worker in-process tier in front of Redis for the public endpoints
+LOCAL_CACHE_MAX_BYTES = config(
+    "LOCAL_CACHE_MAX_BYTES", default=32 * 1024 * 1024, cast=int
+)
+# Seconds a worker serves its own copy before reading Redis again; never
+# past the entry's soft expiry
+LOCAL_CACHE_MAX_AGE = config("LOCAL_CACHE_MAX_AGE", default=60, cast=int)
+
+# Background threads per worker that rebuild soft-expired cache entries
+CACHE_REFRESH_WORKERS = config("CACHE_REFRESH_WORKERS", default=2, cast=int)
+
+# Per key family overrides of the cache TTL policies in
+# gallery/caching/ttl.py, e.g. {"portfolio_search": {"timeout": 600,
+# "soft_timeout": 120, "jitter": 0.2, "beta": 2.0}}
+CACHE_TTL_POLICIES = {}
+
+# Process-local memos (category ids, BusinessInfo) are evicted in every
+# worker over Redis pub/sub, or by polling shared counters when pub/sub is
+# unavailable; entries also expire after PROCESS_MEMO_TIMEOUT seconds
+CACHE_BUS_PUBSUB = config("CACHE_BUS_PUBSUB", default=True, cast=bool)
+CACHE_BUS_POLL_INTERVAL = config("CACHE_BUS_POLL_INTERVAL", default=5, cast=int)
+PROCESS_MEMO_TIMEOUT = config("PROCESS_MEMO_TIMEOUT", default=300, cast=int)
+
+# Request frequency tracking: fraction of requests counted, and how many of
+# the hottest pages/items are rebuilt in the background after an edit
+HOTLIST_SAMPLE_RATE = config("HOTLIST_SAMPLE_RATE", default=0.1, cast=float)
+HOTLIST_REWARM_SIZE = config("HOTLIST_REWARM_SIZE", default=20, cast=int)
+
+# AdvancedCache value codec: none, zlib-1/6/9, lzma, or zstd-3/9 when the
+# zstandard package is installed (compare with manage.py benchmark_codecs)
+CACHE_CODEC = config("CACHE_CODEC", default="zlib-6")
+CACHE_COMPRESSION_THRESHOLD = config(
+    "CACHE_COMPRESSION_THRESHOLD", default=1024, cast=int
+)
+
 # Session caching (optional but recommended)
 SESSION_ENGINE = "django.contrib.sessions.backends.cache"
 SESSION_CACHE_ALIAS = "default"
@@ -195,6 +246,26 @@ STATIC_ROOT = Path(config("STATIC_ROOT", default=str(BASE_DIR / "staticfiles")))
 MEDIA_URL = "/media/"
 MEDIA_ROOT = BASE_DIR / "media"
 
+# Thumbnails, gallery images and video frames are generated by
+# `manage.py process_media`, not on the upload request. Failed jobs are
+# retried after MEDIA_JOB_RETRY_DELAY seconds, doubling each attempt; jobs
+# still running after MEDIA_JOB_TIMEOUT seconds are taken back from a dead
+# worker.
+MEDIA_WORKER_CONCURRENCY = config(
+    "MEDIA_WORKER_CONCURRENCY", default=os.cpu_count() or 2, cast=int
+)
+MEDIA_JOB_MAX_ATTEMPTS = config("MEDIA_JOB_MAX_ATTEMPTS", default=3, cast=int)
+MEDIA_JOB_RETRY_DELAY = config("MEDIA_JOB_RETRY_DELAY", default=30, cast=int)
+MEDIA_JOB_TIMEOUT = config("MEDIA_JOB_TIMEOUT", default=600, cast=int)
+
+# Images are resized in a pool of MEDIA_POOL_WORKERS processes (0: in the
+# worker thread itself), each capped at MEDIA_WORKER_MEMORY_LIMIT_MB of
+# address space and replaced after MEDIA_POOL_TASKS_PER_CHILD images.
+# Compare worker counts with manage.py benchmark_media.
+MEDIA_POOL_WORKERS = config("MEDIA_POOL_WORKERS", default=os.cpu_count() or 1, cast=int)
+MEDIA_WORKER_MEMORY_LIMIT_MB = config("MEDIA_WORKER_MEMORY_LIMIT_MB", default=1024, cast=int)
+MEDIA_POOL_TASKS_PER_CHILD = config("MEDIA_POOL_TASKS_PER_CHILD", default=50, cast=int)
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.2/ref/settings/#default-auto-field
 
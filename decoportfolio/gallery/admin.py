@@ -1,5 +1,7 @@
+from django.conf import settings
 from django.contrib import admin
 from django.contrib.auth.admin import UserAdmin as BaseUserAdmin
+from django.utils import timezone
 from django.utils.html import format_html
 from .models import (
     FamilyMember,
@@ -10,7 +12,10 @@ from .models import (
     BusinessInfo,
     PortfolioImage,
     PortfolioVideo,
+    MediaJob,
+    ProcessingStatus,
 )
+from .media.registry import variant_path
 
 
 @admin.register(BusinessInfo)
@@ -72,7 +77,13 @@ class PortfolioVideoInline(admin.TabularInline):
 
 @admin.register(PortfolioImage)
 class PortfolioImageAdmin(admin.ModelAdmin):
-    list_display = ["portfolio_item", "caption", "display_order", "created_at"]
+    list_display = [
+        "portfolio_item",
+        "caption",
+        "display_order",
+        "processing_status",
+        "created_at",
+    ]
     list_filter = ["portfolio_item"]
     search_fields = ["portfolio_item__title", "caption"]
     ordering = ["display_order", "created_at"]
@@ -80,7 +91,13 @@ class PortfolioImageAdmin(admin.ModelAdmin):
 
 @admin.register(PortfolioVideo)
 class PortfolioVideoAdmin(admin.ModelAdmin):
-    list_display = ["portfolio_item", "caption", "display_order", "created_at"]
+    list_display = [
+        "portfolio_item",
+        "caption",
+        "display_order",
+        "processing_status",
+        "created_at",
+    ]
     list_filter = ["portfolio_item"]
     search_fields = ["portfolio_item__title", "caption"]
     ordering = ["display_order", "created_at"]
@@ -94,6 +111,7 @@ class PortfolioItemAdmin(admin.ModelAdmin):
         "service",
         "has_main_image",
         "has_before_after",
+        "processing_status",
         "upload_date",
         "image_preview",
     ]
@@ -141,10 +159,10 @@ class PortfolioItemAdmin(admin.ModelAdmin):
     has_before_after.boolean = True
 
     def image_preview(self, obj):
-        if obj.thumbnail:
+        if obj.processing_status == ProcessingStatus.READY and obj.image:
             return format_html(
                 '<img src="{}" style="max-height: 50px; max-width: 50px; object-fit: cover;" />',
-                obj.thumbnail.url,
+                settings.MEDIA_URL + variant_path(obj, "image", "thumb"),
             )
         elif obj.image:
             return format_html(
@@ -156,6 +174,30 @@ class PortfolioItemAdmin(admin.ModelAdmin):
     image_preview.short_description = "Image Preview"
 
 
+@admin.register(MediaJob)
+class MediaJobAdmin(admin.ModelAdmin):
+    list_display = [
+        "asset_type",
+        "asset_id",
+        "status",
+        "attempts",
+        "run_after",
+        "locked_by",
+        "updated_at",
+    ]
+    list_filter = ["status", "asset_type"]
+    search_fields = ["asset_id", "last_error"]
+    readonly_fields = ["created_at", "updated_at", "locked_at", "locked_by", "last_error"]
+    actions = ["retry_jobs"]
+
+    @admin.action(description="Retry selected jobs")
+    def retry_jobs(self, request, queryset):
+        retried = queryset.exclude(status=MediaJob.Status.PROCESSING).update(
+            status=MediaJob.Status.PENDING, attempts=0, run_after=timezone.now()
+        )
+        self.message_user(request, f"{retried} jobs queued again.")
+
+
 @admin.register(FamilyMember)
 class FamilyMemberAdmin(BaseUserAdmin):
     """Admin interface for FamilyMember (separate from Django User)"""
@@ -0,0 +1,177 @@
+from django.core.cache.backends.base import DEFAULT_TIMEOUT
+from django.core.cache.backends.locmem import LocMemCache
+from django_redis.cache import RedisCache
+from django_redis.exceptions import ConnectionInterrupted
+from redis.exceptions import ConnectionError as RedisConnectionError
+from redis.exceptions import TimeoutError as RedisTimeoutError
+from .breaker import DEFAULT_COOLDOWN, DEFAULT_FAILURE_THRESHOLD, get_breaker
+
+# Entries written while Redis is away may miss invalidations made by other
+# workers, so they are kept briefly
+DEFAULT_FALLBACK_TIMEOUT = 60  # seconds
+DEFAULT_FALLBACK_MAX_ENTRIES = 1000
+
+REDIS_ERRORS = (ConnectionInterrupted, RedisConnectionError, RedisTimeoutError, OSError)
+
+
+class CircuitBreakerRedisCache(RedisCache):
+    """
+    django_redis cache that stops waiting on an unreachable Redis.
+
+    Connection errors and timeouts are counted by a CircuitBreaker; once it
+    opens, calls go straight to a small in-process LocMemCache for the
+    cooldown, then one call probes Redis again. Configured with a
+    CIRCUIT_BREAKER dict next to OPTIONS in CACHES (FAILURE_THRESHOLD,
+    COOLDOWN, FALLBACK_TIMEOUT, FALLBACK_MAX_ENTRIES).
+    """
+
+    def __init__(self, server, params):
+        super().__init__(server, params)
+        options = params.get("CIRCUIT_BREAKER", {})
+        # Shared by every thread's instance of this cache, as is the fallback
+        # (LocMemCache instances with the same name share one store)
+        self.breaker = get_breaker(
+            server,
+            failure_threshold=options.get("FAILURE_THRESHOLD", DEFAULT_FAILURE_THRESHOLD),
+            cooldown=options.get("COOLDOWN", DEFAULT_COOLDOWN),
+        )
+        self.fallback_timeout = options.get("FALLBACK_TIMEOUT", DEFAULT_FALLBACK_TIMEOUT)
+        self.fallback = LocMemCache(
+            f"circuit-breaker-fallback-{server}",
+            {
+                "TIMEOUT": self.fallback_timeout,
+                "KEY_PREFIX": params.get("KEY_PREFIX", ""),
+                "VERSION": params.get("VERSION", 1),
+                "OPTIONS": {
+                    "MAX_ENTRIES": options.get(
+                        "FALLBACK_MAX_ENTRIES", DEFAULT_FALLBACK_MAX_ENTRIES
+                    )
+                },
+            },
+        )
+
+    def _fallback_timeout(self, timeout):
+        if timeout is DEFAULT_TIMEOUT or timeout is None:
+            return self.fallback_timeout
+        return min(timeout, self.fallback_timeout)
+
+    def _call(self, name, args, kwargs, fallback):
+        """Run RedisCache.<name> through the breaker, else fallback()"""
+        if self.breaker.allow_request():
+            try:
+                result = getattr(super(), name)(*args, **kwargs)
+            except REDIS_ERRORS as e:
+                self.breaker.record_failure()
+                print(f"Redis cache error ({name}), using local fallback: {e}")
+            except Exception:
+                # Redis answered (e.g. incr of a missing key); not an outage
+                self.breaker.record_success()
+                raise
+            else:
+                self.breaker.record_success()
+                return result
+        return fallback()
+
+    def get(self, key, default=None, version=None, client=None):
+        return self._call(
+            "get",
+            (key, default, version, client),
+            {},
+            lambda: self.fallback.get(key, default, version),
+        )
+
+    def get_many(self, keys, version=None, client=None):
+        return self._call(
+            "get_many",
+            (keys,),
+            {"version": version, "client": client},
+            lambda: self.fallback.get_many(keys, version),
+        )
+
+    def has_key(self, key, version=None, client=None):
+        return self._call(
+            "has_key",
+            (key,),
+            {"version": version, "client": client},
+            lambda: self.fallback.has_key(key, version),
+        )
+
+    def set(
+        self, key, value, timeout=DEFAULT_TIMEOUT, version=None, client=None, nx=False, xx=False
+    ):
+        def fallback():
+            if nx:
+                return self.fallback.add(key, value, self._fallback_timeout(timeout), version)
+            self.fallback.set(key, value, self._fallback_timeout(timeout), version)
+            return True
+
+        return self._call(
+            "set",
+            (key, value, timeout),
+            {"version": version, "client": client, "nx": nx, "xx": xx},
+            fallback,
+        )
+
+    def add(self, key, value, timeout=DEFAULT_TIMEOUT, version=None, client=None):
+        return self._call(
+            "add",
+            (key, value, timeout),
+            {"version": version, "client": client},
+            lambda: self.fallback.add(key, value, self._fallback_timeout(timeout), version),
+        )
+
+    def set_many(self, data, timeout=DEFAULT_TIMEOUT, version=None, client=None):
+        return self._call(
+            "set_many",
+            (data, timeout),
+            {"version": version, "client": client},
+            lambda: self.fallback.set_many(data, self._fallback_timeout(timeout), version),
+        )
+
+    def touch(self, key, timeout=DEFAULT_TIMEOUT, version=None, client=None):
+        return self._call(
+            "touch",
+            (key, timeout),
+            {"version": version, "client": client},
+            lambda: self.fallback.touch(key, self._fallback_timeout(timeout), version),
+        )
+
+    def incr(self, key, delta=1, version=None, client=None, ignore_key_check=False):
+        return self._call(
+            "incr",
+            (key, delta),
+            {"version": version, "client": client, "ignore_key_check": ignore_key_check},
+            lambda: self.fallback.incr(key, delta, version),
+        )
+
+    def delete(self, key, version=None, prefix=None, client=None):
+        # A delete that never reached Redis would leave a stale entry behind;
+        # drop the local copy too so this worker at least stops serving it
+        self.fallback.delete(key, version)
+        return self._call(
+            "delete",
+            (key,),
+            {"version": version, "prefix": prefix, "client": client},
+            lambda: False,
+        )
+
+    def delete_many(self, keys, version=None, client=None):
+        self.fallback.delete_many(keys, version)
+        return self._call(
+            "delete_many",
+            (keys,),
+            {"version": version, "client": client},
+            lambda: 0,
+        )
+
+    def delete_pattern(
+        self, pattern, version=None, prefix=None, client=None, itersize=None
+    ):
+        kwargs = {"version": version, "prefix": prefix, "client": client}
+        if itersize is not None:
+            kwargs["itersize"] = itersize
+        return self._call("delete_pattern", (pattern,), kwargs, lambda: 0)
+
+    def clear(self):
+        self.fallback.clear()
+        return self._call("clear", (), {}, lambda: False)
@@ -0,0 +1,125 @@
+import threading
+import time
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+DEFAULT_FAILURE_THRESHOLD = 5
+DEFAULT_COOLDOWN = 30  # seconds spent open before probing again
+
+
+class CircuitBreaker:
+    """
+    Stops calling a failing dependency until it has had time to recover.
+
+    Closed: calls go through and consecutive failures are counted; the
+    failure_threshold-th one opens the breaker. Open: calls are refused
+    (the caller uses its fallback) for cooldown seconds. Half-open: a
+    single probe call is let through; success closes the breaker, failure
+    opens it for another cooldown.
+    """
+
+    def __init__(
+        self,
+        failure_threshold=DEFAULT_FAILURE_THRESHOLD,
+        cooldown=DEFAULT_COOLDOWN,
+        clock=time.monotonic,
+    ):
+        self.failure_threshold = failure_threshold
+        self.cooldown = cooldown
+        self.clock = clock
+        self.state = CLOSED
+        self.consecutive_failures = 0
+        self.opened_at = None
+        self._probing = False
+        self._recover_callbacks = []
+        self._lock = threading.Lock()
+        self.counters = {
+            "calls": 0,
+            "failures": 0,
+            "short_circuited": 0,
+            "trips": 0,
+            "recoveries": 0,
+        }
+
+    def allow_request(self):
+        """True if the caller should try the dependency now"""
+        with self._lock:
+            if self.state == OPEN and self.clock() - self.opened_at >= self.cooldown:
+                self.state = HALF_OPEN
+                self._probing = False
+
+            if self.state == CLOSED:
+                self.counters["calls"] += 1
+                return True
+            if self.state == HALF_OPEN and not self._probing:
+                self._probing = True
+                self.counters["calls"] += 1
+                return True
+
+            self.counters["short_circuited"] += 1
+            return False
+
+    def record_success(self):
+        with self._lock:
+            self.consecutive_failures = 0
+            if self.state == CLOSED:
+                return
+            self.state = CLOSED
+            self._probing = False
+            self.counters["recoveries"] += 1
+            callbacks = list(self._recover_callbacks)
+
+        print("Cache circuit breaker closed: Redis is reachable again")
+        for callback in callbacks:
+            try:
+                callback()
+            except Exception as e:
+                print(f"Circuit breaker recovery callback failed: {e}")
+
+    def record_failure(self):
+        with self._lock:
+            self.counters["failures"] += 1
+            self.consecutive_failures += 1
+            if self.state == HALF_OPEN or (
+                self.state == CLOSED
+                and self.consecutive_failures >= self.failure_threshold
+            ):
+                self.state = OPEN
+                self.opened_at = self.clock()
+                self._probing = False
+                self.counters["trips"] += 1
+                print(f"Cache circuit breaker opened for {self.cooldown}s")
+
+    def on_recover(self, callback):
+        """Call callback() each time the breaker closes after being open"""
+        self._recover_callbacks.append(callback)
+
+    @property
+    def is_closed(self):
+        return self.state == CLOSED
+
+    def stats(self):
+        with self._lock:
+            return {
+                **self.counters,
+                "state": self.state,
+                "consecutive_failures": self.consecutive_failures,
+            }
+
+
+_breakers = {}
+_breakers_lock = threading.Lock()
+
+
+def get_breaker(name, **kwargs):
+    """
+    Process-wide breaker for name. Django builds a cache backend per
+    thread, so the breaker has to live outside the backend to count every
+    thread's failures.
+    """
+    with _breakers_lock:
+        if name not in _breakers:
+            _breakers[name] = CircuitBreaker(**kwargs)
+        return _breakers[name]
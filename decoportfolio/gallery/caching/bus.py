@@ -0,0 +1,196 @@
+import json
+import os
+import threading
+import time
+from django.conf import settings
+from django.core.cache import cache
+from .connection import get_redis_client
+
+# Memoized values are dropped after this even if an eviction never arrives
+# (a pub/sub message lost while the subscriber reconnected)
+DEFAULT_MEMO_TIMEOUT = 60 * 5
+DEFAULT_POLL_INTERVAL = 5  # seconds between counter checks without pub/sub
+BUS_CHANNEL = "bus"
+# A namespace (or everything) in a message, instead of one key
+ALL = None
+
+
+class ProcessMemo:
+    """
+    In-process memoization for small, hot lookups (category ids by name,
+    the BusinessInfo singleton), grouped in namespaces so the invalidation
+    bus can evict a key or a whole namespace in every worker.
+    """
+
+    def __init__(self, timeout=DEFAULT_MEMO_TIMEOUT, clock=time.monotonic):
+        self.timeout = timeout
+        self.clock = clock
+        self._entries = {}
+        self._lock = threading.Lock()
+        # Every namespace ever used here; the polling fallback watches these
+        self.namespaces = set()
+        self.counters = {"hits": 0, "misses": 0, "evictions": 0}
+
+    def get_or_load(self, namespace, key, load):
+        """Return the memoized value for (namespace, key), calling load() on a miss"""
+        invalidation_bus.ensure_started()
+        now = self.clock()
+        with self._lock:
+            entry = self._entries.get(namespace, {}).get(key)
+            if entry is not None and entry[0] > now:
+                self.counters["hits"] += 1
+                return entry[1]
+            self.counters["misses"] += 1
+
+        value = load()
+        with self._lock:
+            self.namespaces.add(namespace)
+            self._entries.setdefault(namespace, {})[key] = (now + self.timeout, value)
+        return value
+
+    def evict(self, namespace=ALL, key=ALL):
+        """Drop one key, one namespace, or (with no arguments) everything"""
+        with self._lock:
+            self.counters["evictions"] += 1
+            if namespace is ALL:
+                self._entries.clear()
+            elif key is ALL:
+                self._entries.pop(namespace, None)
+            else:
+                self._entries.get(namespace, {}).pop(key, None)
+
+
+class InvalidationBus:
+    """
+    Carries memo evictions from the worker that saved a model to every
+    other worker and node.
+
+    publish() evicts locally, sends a compact JSON message ([[namespace,
+    key], ...]) on a Redis pub/sub channel and bumps a per-namespace
+    counter in the shared cache. Each worker runs one daemon thread that
+    listens on the channel, or, when pub/sub isn't available (another
+    cache backend, CACHE_BUS_PUBSUB off, the circuit breaker open), polls
+    the counters every poll_interval seconds and evicts namespaces whose
+    counter moved.
+    """
+
+    def __init__(
+        self,
+        memo,
+        client_factory=get_redis_client,
+        pubsub=True,
+        poll_interval=DEFAULT_POLL_INTERVAL,
+    ):
+        self.memo = memo
+        self.client_factory = client_factory
+        self.pubsub = pubsub
+        self.poll_interval = poll_interval
+        self._seen = {}
+        self._thread = None
+        self._pid = None
+        self._stop = threading.Event()
+        self._lock = threading.Lock()
+
+    def _channel(self):
+        return cache.make_key(BUS_CHANNEL)
+
+    def _counter_key(self, namespace):
+        return f"{BUS_CHANNEL}:{namespace}"
+
+    def publish(self, messages):
+        """Evict [(namespace, key)] here and in every other worker"""
+        messages = sorted(set(messages), key=lambda message: (message[0], str(message[1])))
+        if not messages:
+            return
+        for namespace, key in messages:
+            self.memo.evict(namespace, key)
+
+        # Counters for polling workers
+        for namespace in {namespace for namespace, _ in messages}:
+            counter_key = self._counter_key(namespace)
+            try:
+                cache.incr(counter_key)
+            except ValueError:
+                cache.add(counter_key, 1, None)
+
+        client = self.client_factory() if self.pubsub else None
+        if client is not None:
+            try:
+                client.publish(self._channel(), json.dumps(messages, separators=(",", ":")))
+            except Exception as e:
+                print(f"Invalidation bus publish error: {e}")
+
+    def handle_message(self, data):
+        """Apply one pub/sub message from publish()"""
+        try:
+            messages = json.loads(data)
+        except (TypeError, ValueError):
+            print(f"Invalidation bus: ignoring malformed message {data!r}")
+            return
+        for namespace, key in messages:
+            self.memo.evict(namespace, key)
+
+    def poll_once(self):
+        """Evict every namespace whose shared counter changed since the last poll"""
+        keys = {
+            self._counter_key(namespace): namespace for namespace in list(self.memo.namespaces)
+        }
+        if not keys:
+            return
+        found = cache.get_many(list(keys))
+        for counter_key, namespace in keys.items():
+            value = found.get(counter_key)
+            if counter_key in self._seen and self._seen[counter_key] != value:
+                self.memo.evict(namespace)
+            self._seen[counter_key] = value
+
+    def ensure_started(self):
+        """Start this process's listener thread (again, after a fork)"""
+        if self._pid == os.getpid() and self._thread is not None:
+            return
+        with self._lock:
+            if self._pid == os.getpid() and self._thread is not None:
+                return
+            self._pid = os.getpid()
+            self._stop.clear()
+            self._thread = threading.Thread(
+                target=self._run, name="cache-invalidation-bus", daemon=True
+            )
+            self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+    def _run(self):
+        while not self._stop.is_set():
+            client = self.client_factory() if self.pubsub else None
+            if client is None:
+                try:
+                    self.poll_once()
+                except Exception as e:
+                    print(f"Invalidation bus poll error: {e}")
+                self._stop.wait(self.poll_interval)
+                continue
+
+            pubsub = client.pubsub(ignore_subscribe_messages=True)
+            try:
+                pubsub.subscribe(self._channel())
+                while not self._stop.is_set():
+                    message = pubsub.get_message(timeout=self.poll_interval)
+                    if message is not None:
+                        self.handle_message(message["data"])
+            except Exception as e:
+                print(f"Invalidation bus subscriber error: {e}")
+                self._stop.wait(self.poll_interval)
+            finally:
+                pubsub.close()
+            # Messages published while we were disconnected are gone
+            self.memo.evict()
+
+
+process_memo = ProcessMemo(getattr(settings, "PROCESS_MEMO_TIMEOUT", DEFAULT_MEMO_TIMEOUT))
+invalidation_bus = InvalidationBus(
+    process_memo,
+    pubsub=getattr(settings, "CACHE_BUS_PUBSUB", True),
+    poll_interval=getattr(settings, "CACHE_BUS_POLL_INTERVAL", DEFAULT_POLL_INTERVAL),
+)
@@ -0,0 +1,124 @@
+import lzma
+import pickle
+import threading
+import zlib
+
+try:
+    import zstandard
+except ImportError:  # optional; zstd codecs are simply not offered
+    zstandard = None
+
+# Payloads below the threshold are stored uncompressed; the threshold moves
+# between these bounds depending on whether compression has been paying off
+MIN_THRESHOLD = 256  # bytes
+MAX_THRESHOLD = 64 * 1024  # bytes
+DEFAULT_THRESHOLD = 1024  # bytes
+# Compression must save at least this fraction to be kept
+MIN_SAVINGS = 0.1
+# One in this many payloads below the threshold is compressed anyway to
+# see whether the threshold can come down
+PROBE_EVERY = 50
+
+
+class Compressor:
+    """A named compress/decompress pair with a one-byte id for the frame header"""
+
+    def __init__(self, name, frame_id, compress, decompress):
+        self.name = name
+        self.frame_id = frame_id
+        self.compress = compress
+        self.decompress = decompress
+
+
+def _zstd(level):
+    # zstandard contexts are not thread-safe; make one per call
+    return Compressor(
+        f"zstd-{level}",
+        0x10 + level,
+        lambda data: zstandard.ZstdCompressor(level=level).compress(data),
+        lambda data: zstandard.ZstdDecompressor().decompress(data),
+    )
+
+
+IDENTITY = Compressor("none", 0x00, lambda data: data, lambda data: data)
+
+COMPRESSORS = {
+    compressor.name: compressor
+    for compressor in [
+        IDENTITY,
+        *(
+            Compressor(
+                f"zlib-{level}",
+                level,
+                lambda data, level=level: zlib.compress(data, level),
+                zlib.decompress,
+            )
+            for level in (1, 6, 9)
+        ),
+        Compressor(
+            "lzma",
+            0x0A,
+            lambda data: lzma.compress(data, preset=1),
+            lzma.decompress,
+        ),
+        *((_zstd(3), _zstd(9)) if zstandard is not None else ()),
+    ]
+}
+_BY_FRAME_ID = {compressor.frame_id: compressor for compressor in COMPRESSORS.values()}
+
+
+class Codec:
+    """
+    Pickles a value and compresses it above an adaptive size threshold.
+
+    The encoded bytes start with the id of the compressor used, so entries
+    stay readable when the configured compressor changes.
+    """
+
+    def __init__(self, compressor="zlib-6", threshold=DEFAULT_THRESHOLD, adaptive=True):
+        if compressor not in COMPRESSORS:
+            raise ValueError(
+                f"Unknown compressor {compressor!r}; available: {', '.join(COMPRESSORS)}"
+            )
+        self.compressor = COMPRESSORS[compressor]
+        self.threshold = threshold
+        self.adaptive = adaptive
+        self._encodes = 0
+        self._lock = threading.Lock()
+
+    def encode(self, value):
+        raw = pickle.dumps(value, pickle.HIGHEST_PROTOCOL)
+        compressor = self.compressor
+        if compressor is IDENTITY or not self._should_compress(len(raw)):
+            return bytes([IDENTITY.frame_id]) + raw
+
+        compressed = compressor.compress(raw)
+        worth_it = len(compressed) <= len(raw) * (1 - MIN_SAVINGS)
+        if self.adaptive:
+            self._adapt(len(raw), worth_it)
+        if not worth_it:
+            return bytes([IDENTITY.frame_id]) + raw
+        return bytes([compressor.frame_id]) + compressed
+
+    def decode(self, data):
+        compressor = _BY_FRAME_ID.get(data[0])
+        if compressor is None:
+            raise ValueError(f"Unknown codec frame id {data[0]}")
+        return pickle.loads(compressor.decompress(data[1:]))
+
+    def _should_compress(self, size):
+        if size >= self.threshold:
+            return True
+        if not self.adaptive or size < MIN_THRESHOLD:
+            return False
+        with self._lock:
+            self._encodes += 1
+            return self._encodes % PROBE_EVERY == 0
+
+    def _adapt(self, size, worth_it):
+        with self._lock:
+            if worth_it and size < self.threshold:
+                # A probe below the threshold paid off: compress from here on
+                self.threshold = max(MIN_THRESHOLD, size)
+            elif not worth_it and size >= self.threshold:
+                self.threshold = min(MAX_THRESHOLD, size * 2)
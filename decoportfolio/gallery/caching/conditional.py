@@ -0,0 +1,66 @@
+import zlib
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import http_date
+from .generations import get_content_version
+
+
+def mark_outdated(response):
+    """
+    Flag a response built from an older generation (a single-flight
+    waiter's stale fallback) so it is not sent with the current validators
+    """
+    response.outdated = True
+    return response
+
+
+def make_version_etag(family, generation, accept):
+    """
+    Strong ETag for any representation of a family at one generation.
+    The Accept header is folded in because JSON and the browsable API
+    are different representations of the same URL.
+    """
+    accept_digest = zlib.crc32(accept.encode()) & 0xFFFFFFFF
+    return f'"{family}-{generation}-{accept_digest:08x}"'
+
+
+class ConditionalGetMixin:
+    """
+    ETag / Last-Modified support for public read-only viewsets.
+
+    Validators come from the generation counter of content_version_family,
+    which the signals bump on every save or delete. Matching conditional
+    requests get a 304 straight from dispatch(), before authentication,
+    any query, or serialization runs.
+    """
+
+    content_version_family = None
+
+    def dispatch(self, request, *args, **kwargs):
+        if request.method not in ("GET", "HEAD") or not self.content_version_family:
+            return super().dispatch(request, *args, **kwargs)
+
+        generation, modified_at = get_content_version(self.content_version_family)
+        etag = make_version_etag(
+            self.content_version_family,
+            generation,
+            request.META.get("HTTP_ACCEPT", ""),
+        )
+        last_modified = int(modified_at) if modified_at else None
+
+        not_modified = get_conditional_response(
+            request, etag=etag, last_modified=last_modified
+        )
+        if not_modified is not None:
+            not_modified["ETag"] = etag
+            return not_modified
+
+        response = super().dispatch(request, *args, **kwargs)
+        if getattr(response, "outdated", False):
+            # A client caching it under this ETag would get 304s for the
+            # old content until the next edit
+            patch_cache_control(response, no_store=True)
+        elif response.status_code == 200:
+            response["ETag"] = etag
+            if last_modified:
+                response["Last-Modified"] = http_date(last_modified)
+        return response
@@ -0,0 +1,19 @@
+from django.core.cache import caches
+
+
+def get_redis_client(alias="default"):
+    """
+    Raw redis-py client behind a django_redis cache, or None when the cache
+    is another backend (locmem in tests, file/db caches) or its circuit
+    breaker is open, so callers can use an in-process fallback instead.
+    """
+    breaker = getattr(caches[alias], "breaker", None)
+    if breaker is not None and not breaker.is_closed:
+        return None
+
+    try:
+        from django_redis import get_redis_connection
+
+        return get_redis_connection(alias)
+    except (ImportError, NotImplementedError):
+        return None
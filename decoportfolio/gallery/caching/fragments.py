@@ -0,0 +1,129 @@
+import hashlib
+import time
+from .generations import fold_generations, get_generations
+from .rendering import render_fragment
+from .swr import schedule_refresh, unwrap, wrap
+from .tags import tag_registry
+from .tiered import response_cache
+from .ttl import ttl_policy
+
+# One pre-rendered PortfolioItem per key, shared by every page that shows it
+# and by the detail endpoint; lifetime from the portfolio_item TTL policy.
+# Keys fold in the fragment epoch (bumped only by a resync) and the item's
+# own counter, both read before the item is queried. Saving the item, one of
+# its images or videos, or the category or service it embeds bumps that
+# counter, so an edit retires that item's fragments alone, and a build that
+# raced the edit writes a key nobody reads any more. The tag delete on an
+# edit only frees the old entries early.
+#
+# The keys are fully versioned, so worker-local copies need no generation
+# check of their own.
+LOCAL_GENERATION = None
+
+
+def item_base_key(item_id):
+    """Unversioned name of an item's fragment, as counted per family"""
+    return f"portfolio_item_{item_id}"
+
+
+def item_versions(item_ids):
+    """{id: (epoch, item counter)} for the given items, in one round trip"""
+    epoch, *counters = get_generations(
+        ("portfolio_item", None), *[("item", item_id) for item_id in item_ids]
+    )
+    return {item_id: (epoch, counter) for item_id, counter in zip(item_ids, counters)}
+
+
+def item_fragment_key(item_id, version):
+    """Cache key holding the rendered fragment of one item at a version"""
+    return fold_generations(item_base_key(item_id), *version)
+
+
+def item_tags(data):
+    """Invalidation tags for a serialized item: itself and what it embeds"""
+    tags = [f"item:{data['id']}"]
+    if data.get("category"):
+        tags.append(f"category:{data['category']['id']}")
+    if data.get("service"):
+        tags.append(f"service:{data['service']['id']}")
+        # Services embed their category
+        if data["service"].get("category"):
+            tags.append(f"category:{data['service']['category']['id']}")
+    return tags
+
+
+def store_item_fragments(items, versions, compute_time=0.0):
+    """
+    Render serialized items ({id: data}) to JSON bytes and cache them with
+    soft and hard expiry under the versions ({id: version}) read before
+    they were queried, tagged with the objects they embed. Returns the
+    rendered fragments by id. compute_time is how long serializing them
+    took, shared out per item for early refresh.
+    """
+    policy = ttl_policy("portfolio_item")
+    per_item_time = compute_time / len(items) if items else 0.0
+    fragments = {item_id: render_fragment(data) for item_id, data in items.items()}
+    keys = {item_id: item_fragment_key(item_id, versions[item_id]) for item_id in items}
+    # One hard TTL per batch (a single pipeline); soft expiry varies per item
+    timeout = policy.hard_ttl()
+    response_cache.set_many(
+        {
+            keys[item_id]: wrap(fragment, policy, per_item_time)
+            for item_id, fragment in fragments.items()
+        },
+        timeout,
+        LOCAL_GENERATION,
+    )
+    tag_registry.register(
+        {keys[item_id]: item_tags(data) for item_id, data in items.items()},
+        policy.max_ttl(),
+    )
+    return fragments
+
+
+def get_item_fragments(item_ids, build_fragments):
+    """
+    Return the rendered fragments ({"body", "content_type"}) for
+    item_ids, in order.
+
+    The items' versions and then the cached fragments are each fetched in
+    one round trip; build_fragments is called once with the ids that missed
+    and must return {id: data}. Ids that no longer exist are dropped from
+    the result. Fragments past their soft expiry are returned as-is and
+    rebuilt in the background.
+    """
+    versions = item_versions(item_ids)
+
+    def build_and_store(ids):
+        start = time.perf_counter()
+        built = build_fragments(ids)
+        if not built:
+            return {}
+        return store_item_fragments(built, versions, time.perf_counter() - start)
+
+    keys = [item_fragment_key(item_id, versions[item_id]) for item_id in item_ids]
+    found = response_cache.get_many(keys, LOCAL_GENERATION)
+
+    fragments = {}
+    missing_ids = []
+    stale_ids = []
+    for item_id, key in zip(item_ids, keys):
+        data, is_stale = unwrap(found.get(key))
+        if data is None:
+            missing_ids.append(item_id)
+            continue
+        fragments[item_id] = data
+        if is_stale:
+            stale_ids.append(item_id)
+
+    if missing_ids:
+        fragments.update(build_and_store(missing_ids))
+
+    if stale_ids:
+        ids_digest = hashlib.md5(",".join(map(str, stale_ids)).encode()).hexdigest()
+        schedule_refresh(
+            f"portfolio_item_refresh_{ids_digest}",
+            lambda: build_and_store(stale_ids),
+        )
+
+    return [fragments[item_id] for item_id in item_ids if item_id in fragments]
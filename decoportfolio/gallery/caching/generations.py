@@ -0,0 +1,112 @@
+import time
+from django.core.cache import cache
+from .connection import get_redis_client
+
+# Generation counters live forever; the keys they version expire on their own.
+GENERATION_PREFIX = "gen"
+MODIFIED_PREFIX = "modified"
+
+
+def _generation_key(family, scope=None):
+    """Build the counter key for a family, optionally narrowed to one scope"""
+    if scope is None:
+        return f"{GENERATION_PREFIX}:{family}"
+    return f"{GENERATION_PREFIX}:{family}:{scope}"
+
+
+def _modified_key(family, scope=None):
+    """Key holding the unix time of the family/scope's last bump"""
+    return _generation_key(family, scope).replace(GENERATION_PREFIX, MODIFIED_PREFIX, 1)
+
+
+def _initial_generation():
+    """
+    Seed a missing counter from the clock so a counter that was evicted
+    never restarts at a value that older keys were already written with.
+    """
+    return int(time.time() * 1000)
+
+
+def get_generations(*scopes):
+    """
+    Return the current generation for each (family, scope) pair in one
+    round trip, creating any counters that do not exist yet.
+    """
+    keys = [_generation_key(*scope) for scope in scopes]
+    found = cache.get_many(keys)
+
+    generations = []
+    for key in keys:
+        generation = found.get(key)
+        if generation is None:
+            cache.add(key, _initial_generation(), None)
+            generation = cache.get(key)
+        generations.append(generation)
+    return generations
+
+
+def get_generation(family, scope=None):
+    """Return the current generation for a single family/scope"""
+    return get_generations((family, scope))[0]
+
+
+def bump_generation(family, scope=None):
+    """
+    Invalidate everything versioned by this family/scope with a single INCR.
+    Entries written under the old generation are never looked up again.
+    """
+    key = _generation_key(family, scope)
+    # Last-Modified for conditional GETs on this family
+    cache.set(_modified_key(family, scope), time.time(), None)
+    try:
+        return cache.incr(key)
+    except ValueError:
+        # Counter missing (never read or evicted): start a fresh one
+        cache.add(key, _initial_generation(), None)
+        return cache.get(key)
+
+
+def bump_generations(*scopes):
+    """
+    Bump several (family, scope) pairs in one pipeline on Redis.
+
+    SET NX seeds a missing counter from the clock before its INCR, the same
+    guarantee bump_generation gives. Other backends bump one at a time.
+    """
+    if not scopes:
+        return []
+
+    redis_client = get_redis_client()
+    if redis_client is None:
+        return [bump_generation(*scope) for scope in scopes]
+
+    modified_at = cache.client.encode(time.time())
+    pipe = redis_client.pipeline(transaction=False)
+    for scope in scopes:
+        key = cache.make_key(_generation_key(*scope))
+        pipe.set(cache.make_key(_modified_key(*scope)), modified_at)
+        pipe.set(key, _initial_generation(), nx=True)
+        pipe.incr(key)
+    # Every third reply is the INCR result
+    return pipe.execute()[2::3]
+
+
+def get_content_version(family, scope=None):
+    """
+    Return (generation, modified_at) for a family/scope in one round trip.
+    modified_at is None until the scope has been bumped at least once.
+    """
+    generation_key = _generation_key(family, scope)
+    modified_key = _modified_key(family, scope)
+    found = cache.get_many([generation_key, modified_key])
+
+    generation = found.get(generation_key)
+    if generation is None:
+        generation = get_generation(family, scope)
+    return generation, found.get(modified_key)
+
+
+def fold_generations(base_key, *generations):
+    """Append already-fetched generation numbers to a cache key"""
+    suffix = ".".join(str(generation) for generation in generations)
+    return f"{base_key}:g{suffix}"
@@ -0,0 +1,106 @@
+import json
+import random
+import threading
+import time
+from collections import Counter
+from django.conf import settings
+from django.core.cache import cache
+from .connection import get_redis_client
+
+DEFAULT_SAMPLE_RATE = 0.1  # fraction of requests counted
+HALF_LIFE = 60 * 60  # seconds; every score is halved this often
+MAX_MEMBERS = 1000  # the set is trimmed to the hottest entries on decay
+# Each worker asks whether a decay is due at most this often
+DECAY_CHECK_INTERVAL = 60  # seconds
+
+
+def hotlist_member(action, params):
+    """Reversible member for an action and its canonical params"""
+    return json.dumps([action, params], sort_keys=True, separators=(",", ":"))
+
+
+class Hotlist:
+    """
+    Decayed request counts per canonical query (action + params).
+
+    A sample of requests is counted with ZINCRBY into one Redis sorted set;
+    once per HALF_LIFE one worker halves every score, so the ranking favours
+    what is hot now. Non-Redis caches keep the counts in this process.
+    """
+
+    def __init__(self, sample_rate=None):
+        self.sample_rate = (
+            sample_rate
+            if sample_rate is not None
+            else getattr(settings, "HOTLIST_SAMPLE_RATE", DEFAULT_SAMPLE_RATE)
+        )
+        self._local = Counter()
+        self._lock = threading.Lock()
+        self._next_decay_check = time.monotonic() + DECAY_CHECK_INTERVAL
+
+    def _key(self):
+        return cache.make_key("hotlist")
+
+    def record(self, action, params):
+        if random.random() >= self.sample_rate:
+            return
+
+        member = hotlist_member(action, params)
+        redis_client = get_redis_client()
+        try:
+            if redis_client is None:
+                with self._lock:
+                    self._local[member] += 1
+            else:
+                redis_client.zincrby(self._key(), 1, member)
+            self._maybe_decay(redis_client)
+        except Exception as e:
+            print(f"Hotlist error: {e}")
+
+    def _maybe_decay(self, redis_client):
+        now = time.monotonic()
+        if now < self._next_decay_check:
+            return
+        self._next_decay_check = now + DECAY_CHECK_INTERVAL
+
+        # Whoever adds the marker decays; it expires after one half-life
+        if cache.add("hotlist:decayed", 1, HALF_LIFE):
+            self.decay(redis_client)
+
+    def decay(self, redis_client=None):
+        """Halve every score and keep the MAX_MEMBERS hottest"""
+        redis_client = redis_client or get_redis_client()
+        if redis_client is None:
+            with self._lock:
+                self._local = Counter(
+                    {
+                        member: score / 2
+                        for member, score in self._local.most_common(MAX_MEMBERS)
+                    }
+                )
+            return
+
+        key = self._key()
+        pipe = redis_client.pipeline()
+        pipe.zunionstore(key, {key: 0.5})
+        pipe.zremrangebyrank(key, 0, -(MAX_MEMBERS + 1))
+        pipe.execute()
+
+    def top(self, limit):
+        """[(action, params, score)] for the hottest queries, hottest first"""
+        redis_client = get_redis_client()
+        if redis_client is None:
+            with self._lock:
+                ranked = self._local.most_common(limit)
+        else:
+            ranked = [
+                (member.decode(), score)
+                for member, score in redis_client.zrevrange(
+                    self._key(), 0, limit - 1, withscores=True
+                )
+            ]
+
+        return [(*json.loads(member), score) for member, score in ranked]
+
+
+hotlist = Hotlist()
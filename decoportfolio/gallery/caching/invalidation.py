@@ -0,0 +1,126 @@
+import threading
+from contextlib import contextmanager
+from django.core.cache import cache
+from django.db import transaction
+from .bus import invalidation_bus
+from .generations import bump_generations
+from .tags import tag_registry
+from .warming import schedule_rewarm
+
+
+class InvalidationCollector:
+    """
+    Gathers the tags, generation scopes and process memo evictions a write
+    touches and flushes them once, deduplicated.
+
+    Inside a transaction the flush runs on commit (and is dropped with a
+    rollback); inside a batch() it runs when the batch exits; otherwise it
+    runs immediately. Saving an item with ten images therefore clears each
+    tag and bumps each generation once instead of eleven times.
+    """
+
+    def __init__(self):
+        self._state = threading.local()
+        # Set when a flush may not have reached Redis (see resync)
+        self.missed_invalidations = False
+
+    def _pending(self):
+        state = self._state
+        if not hasattr(state, "tags"):
+            state.tags = set()
+            state.scopes = set()
+            state.memos = set()
+            state.depth = 0
+        return state
+
+    def add(self, tags=(), scopes=(), memos=()):
+        """
+        Queue tags to invalidate and (family, scope) generations to bump.
+        memos are (namespace, key) process memo entries to evict in every
+        worker (key None: the whole namespace), sent over the invalidation
+        bus.
+        """
+        state = self._pending()
+        state.tags.update(tags)
+        state.scopes.update(scopes)
+        state.memos.update(memos)
+
+        if transaction.get_connection().in_atomic_block:
+            # Registered per call: after a rollback the earlier callback is
+            # gone, and flushing an already drained collector is a no-op
+            transaction.on_commit(self.flush)
+        elif state.depth == 0:
+            self.flush()
+
+    @contextmanager
+    def batch(self):
+        """Defer flushing outside transactions until the block exits"""
+        state = self._pending()
+        state.depth += 1
+        try:
+            yield self
+        finally:
+            state.depth -= 1
+            if state.depth == 0:
+                self.flush()
+
+    def flush(self):
+        state = self._pending()
+        tags, state.tags = state.tags, set()
+        scopes, state.scopes = state.scopes, set()
+        memos, state.memos = state.memos, set()
+
+        if memos:
+            invalidation_bus.publish(memos)
+        if not tags and not scopes:
+            return
+
+        try:
+            cleared = tag_registry.invalidate(*sorted(tags))
+            # Sorted so None (family-wide) scopes never compare with ids
+            ordered = sorted(scopes, key=lambda scope: (scope[0], str(scope[1])))
+            bump_generations(*ordered)
+            print(
+                f"Invalidated {len(tags)} tags ({cleared} keys) and bumped "
+                f"{len(scopes)} generations"
+            )
+            # Rebuild the most requested pages before visitors ask for them
+            if ("portfolio", None) in scopes:
+                schedule_rewarm()
+        except Exception as e:
+            self.missed_invalidations = True
+            print(f"Cache invalidation flush error: {e}")
+
+        breaker = getattr(cache, "breaker", None)
+        if breaker is not None and not breaker.is_closed:
+            # Went to the circuit breaker's local fallback, not Redis
+            self.missed_invalidations = True
+
+    def resync(self):
+        """
+        After Redis comes back, drop what it may still hold from before an
+        invalidation it never saw: every family generation is bumped, which
+        retires every page, and the fragment epoch, which retires every item
+        fragment whatever its own counter.
+        """
+        if not self.missed_invalidations:
+            return
+        self.missed_invalidations = False
+
+        bump_generations(
+            ("portfolio", None),
+            ("portfolio_item", None),
+            ("category", None),
+            ("service", None),
+            ("business", None),
+        )
+        invalidation_bus.publish([("category", None), ("business", None)])
+        print("Resynced cache after missed invalidations")
+
+
+invalidation_collector = InvalidationCollector()
+
+_breaker = getattr(cache, "breaker", None)
+if _breaker is not None:
+    _breaker.on_recover(invalidation_collector.resync)
+
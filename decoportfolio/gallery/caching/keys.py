@@ -0,0 +1,187 @@
+import hashlib
+import threading
+import time
+from urllib.parse import quote
+from django.core.cache import cache
+from .connection import get_redis_client
+
+# Pagination limits shared with paginate_queryset
+MIN_PAGE_SIZE = 5
+MAX_PAGE_SIZE = 200
+DEFAULT_PAGE = 1
+DEFAULT_PAGE_SIZE = 20
+
+# Filter params each PortfolioItemViewSet action understands; anything else
+# in the query string is dropped from the key.
+ACTION_PARAMS = {
+    "list": ("category",),
+    "search": ("q",),
+    "filter": ("category", "service"),
+    "combined": ("q", "category", "service"),
+    "by_category": ("category",),
+}
+
+# Longer values (search terms) are replaced by a digest in the key
+MAX_KEY_VALUE_LENGTH = 32
+
+# Distinct keys written per family are counted per day
+KEYSPACE_TIMEOUT = 60 * 60 * 48  # 2 days
+
+
+def normalize_pagination(
+    page, page_size, default_page_size=DEFAULT_PAGE_SIZE, max_page_size=MAX_PAGE_SIZE
+):
+    """Parse and clamp page/page_size, falling back to defaults on junk"""
+    try:
+        page_size = int(page_size) if page_size else default_page_size
+        page_size = max(MIN_PAGE_SIZE, min(page_size, max_page_size))
+    except (ValueError, TypeError):
+        page_size = default_page_size
+
+    try:
+        page = int(page) if page else DEFAULT_PAGE
+        if page < 1:
+            page = DEFAULT_PAGE
+    except (ValueError, TypeError):
+        page = DEFAULT_PAGE
+
+    return page, page_size
+
+
+def canonical_params(
+    query_params,
+    action,
+    default_page_size=DEFAULT_PAGE_SIZE,
+    max_page_size=MAX_PAGE_SIZE,
+    **overrides,
+):
+    """
+    Reduce a request's query string to the params that affect the result.
+
+    Filter values are stripped and lower-cased (every filter is matched
+    case-insensitively), empty values and unknown params are dropped and
+    pagination is clamped, so equivalent URLs map to one dict. overrides
+    supply values that came from the URL path instead of the query string.
+    """
+    params = {}
+    for name in ACTION_PARAMS[action]:
+        value = overrides.get(name, query_params.get(name, ""))
+        value = (value or "").strip().lower()
+        if value:
+            params[name] = value
+
+    params["page"], params["page_size"] = normalize_pagination(
+        query_params.get("page"),
+        query_params.get("page_size"),
+        default_page_size,
+        max_page_size,
+    )
+    return params
+
+
+def key_family(action):
+    """Key family (e.g. portfolio_list) for a PortfolioItemViewSet action"""
+    return f"portfolio_{action}"
+
+
+# Bookkeeping keys written by the caching package itself
+INTERNAL_FAMILIES = ("gen", "modified", "lock", "tag", "keyspace", "metrics", "bus")
+
+
+def family_of(key):
+    """
+    Key family of a cache key, with or without the backend's prefix:
+    portfolio_list, portfolio_item, portfolio_search:stale, gen, tag, ...
+    """
+    prefix = cache.make_key("")
+    if key.startswith(prefix):
+        key = key[len(prefix):]
+
+    head = key.split(":", 1)[0]
+    if head in INTERNAL_FAMILIES:
+        return head
+
+    families = [key_family(action) for action in ACTION_PARAMS] + [
+        "portfolio_item",
+        "portfolio_notfound",
+    ]
+    for family in sorted(families, key=len, reverse=True):
+        if key.startswith(family + "_"):
+            return f"{family}:stale" if key.endswith(":stale") else family
+    return "other"
+
+
+def _key_value(value):
+    value = str(value)
+    if len(value) > MAX_KEY_VALUE_LENGTH:
+        value = "h" + hashlib.sha1(value.encode()).hexdigest()[:16]
+    return quote(value, safe="")
+
+
+def page_cache_key(action, params):
+    """Deterministic cache key for canonical params of one action"""
+    parts = [f"{name}={_key_value(params[name])}" for name in sorted(params)]
+    return f"{key_family(action)}_{'&'.join(parts)}"
+
+
+def not_found_key(kind, value):
+    """Cache key recording that an item pk or category name doesn't exist"""
+    return f"portfolio_notfound_{kind}={_key_value(value)}"
+
+
+class KeyspaceCounter:
+    """
+    Approximate number of distinct keys written per family today.
+
+    Uses a Redis HyperLogLog per family and day when the cache is
+    django_redis, and an in-process set otherwise (locmem, tests).
+    """
+
+    def __init__(self):
+        self._local = {}
+        self._lock = threading.Lock()
+
+    def _redis_key(self, family, day=None):
+        day = day or time.strftime("%Y%m%d", time.gmtime())
+        return cache.make_key(f"keyspace:{family}:{day}")
+
+    def record(self, family, key):
+        self.record_many(family, [key])
+
+    def record_many(self, family, keys):
+        if not keys:
+            return
+
+        redis_client = get_redis_client()
+        if redis_client is None:
+            with self._lock:
+                self._local.setdefault(family, set()).update(keys)
+            return
+
+        try:
+            hll_key = self._redis_key(family)
+            pipe = redis_client.pipeline()
+            pipe.pfadd(hll_key, *keys)
+            pipe.expire(hll_key, KEYSPACE_TIMEOUT)
+            pipe.execute()
+        except Exception as e:
+            print(f"Keyspace counter error: {e}")
+
+    def cardinality(self, families=None):
+        """Return {family: distinct keys written today}"""
+        families = families or [
+            *(key_family(action) for action in ACTION_PARAMS),
+            "portfolio_item",
+            "portfolio_notfound",
+        ]
+        redis_client = get_redis_client()
+        if redis_client is None:
+            with self._lock:
+                return {family: len(self._local.get(family, ())) for family in families}
+
+        return {
+            family: redis_client.pfcount(self._redis_key(family)) for family in families
+        }
+
+
+keyspace_counter = KeyspaceCounter()
@@ -0,0 +1,168 @@
+import threading
+import time
+from django.core.cache import cache
+from .connection import get_redis_client
+
+# Upper bounds (ms) of the latency histogram buckets; one overflow bucket follows
+LATENCY_BUCKETS_MS = (0.1, 0.25, 0.5, 1, 2, 5, 10, 25, 50, 100, 250)
+
+# Counters are pushed to Redis at most this often so cache_stats, which
+# runs in its own process, can report totals across every worker
+PUBLISH_INTERVAL = 10  # seconds
+METRICS_TIMEOUT = 60 * 60 * 24 * 7  # 7 days
+
+
+def _empty_counters():
+    return {
+        "hits": 0,
+        "misses": 0,
+        "sets": 0,
+        "bytes": 0,
+        "max_bytes": 0,
+        "get_latency": [0] * (len(LATENCY_BUCKETS_MS) + 1),
+        "set_latency": [0] * (len(LATENCY_BUCKETS_MS) + 1),
+    }
+
+
+def _bucket(seconds):
+    elapsed_ms = seconds * 1000
+    for index, bound in enumerate(LATENCY_BUCKETS_MS):
+        if elapsed_ms <= bound:
+            return index
+    return len(LATENCY_BUCKETS_MS)
+
+
+def histogram_percentile(histogram, percentile):
+    """
+    Upper bound (ms) of the bucket holding the given percentile, or None for
+    an empty histogram. The overflow bucket reports as infinity.
+    """
+    total = sum(histogram)
+    if not total:
+        return None
+
+    threshold = total * percentile / 100
+    running = 0
+    for index, count in enumerate(histogram):
+        running += count
+        if running >= threshold:
+            break
+    if index < len(LATENCY_BUCKETS_MS):
+        return LATENCY_BUCKETS_MS[index]
+    return float("inf")
+
+
+class CacheMetrics:
+    """
+    In-process hit/miss counters, get/set latency histograms and payload
+    sizes per key family (see keys.family_of).
+
+    Every worker keeps its own totals in memory and periodically adds the
+    change since the last push to a Redis hash per family.
+    """
+
+    def __init__(self):
+        self._totals = {}
+        self._unpublished = {}
+        self._lock = threading.Lock()
+        self._last_publish = time.monotonic()
+
+    def _counters(self, family):
+        # Caller holds the lock
+        totals = self._totals.setdefault(family, _empty_counters())
+        unpublished = self._unpublished.setdefault(family, _empty_counters())
+        return totals, unpublished
+
+    def record_get(self, family, hits, misses, seconds):
+        bucket = _bucket(seconds)
+        with self._lock:
+            for counters in self._counters(family):
+                counters["hits"] += hits
+                counters["misses"] += misses
+                counters["get_latency"][bucket] += 1
+        self._maybe_publish()
+
+    def record_set(self, family, sizes, seconds):
+        bucket = _bucket(seconds)
+        with self._lock:
+            for counters in self._counters(family):
+                counters["sets"] += len(sizes)
+                counters["bytes"] += sum(sizes)
+                counters["max_bytes"] = max(counters["max_bytes"], *sizes, 0)
+                counters["set_latency"][bucket] += 1
+        self._maybe_publish()
+
+    def snapshot(self):
+        """{family: counters} for this process since start (or reset)"""
+        with self._lock:
+            return {
+                family: {
+                    **counters,
+                    "get_latency": list(counters["get_latency"]),
+                    "set_latency": list(counters["set_latency"]),
+                }
+                for family, counters in self._totals.items()
+            }
+
+    def reset(self):
+        with self._lock:
+            self._totals.clear()
+            self._unpublished.clear()
+
+    def _metrics_key(self, family):
+        return cache.make_key(f"metrics:{family}")
+
+    def _maybe_publish(self):
+        if time.monotonic() - self._last_publish >= PUBLISH_INTERVAL:
+            self.publish()
+
+    def publish(self):
+        """Add this process's unpublished counters to the shared Redis hashes"""
+        with self._lock:
+            unpublished, self._unpublished = self._unpublished, {}
+            self._last_publish = time.monotonic()
+
+        redis_client = get_redis_client()
+        if redis_client is None or not unpublished:
+            return
+
+        try:
+            pipe = redis_client.pipeline(transaction=False)
+            for family, counters in unpublished.items():
+                metrics_key = self._metrics_key(family)
+                for field in ("hits", "misses", "sets", "bytes"):
+                    if counters[field]:
+                        pipe.hincrby(metrics_key, field, counters[field])
+                for name in ("get_latency", "set_latency"):
+                    for index, count in enumerate(counters[name]):
+                        if count:
+                            pipe.hincrby(metrics_key, f"{name}:{index}", count)
+                pipe.expire(metrics_key, METRICS_TIMEOUT)
+            pipe.execute()
+        except Exception as e:
+            print(f"Cache metrics publish error: {e}")
+
+    def published(self, redis_client, families):
+        """Read the totals every worker has pushed, shaped like snapshot()"""
+        pipe = redis_client.pipeline(transaction=False)
+        for family in families:
+            pipe.hgetall(self._metrics_key(family))
+
+        results = {}
+        for family, raw in zip(families, pipe.execute()):
+            if not raw:
+                continue
+            fields = {key.decode(): int(value) for key, value in raw.items()}
+            counters = _empty_counters()
+            for field in ("hits", "misses", "sets", "bytes"):
+                counters[field] = fields.get(field, 0)
+            for name in ("get_latency", "set_latency"):
+                counters[name] = [
+                    fields.get(f"{name}:{index}", 0)
+                    for index in range(len(counters[name]))
+                ]
+            results[family] = counters
+        return results
+
+
+cache_metrics = CacheMetrics()
@@ -0,0 +1,32 @@
+from .generations import fold_generations
+from .keys import keyspace_counter, not_found_key
+from .tiered import response_cache
+from .ttl import ttl_policy
+
+# Stands in for a cached "no such object"; None would read as a miss
+NOT_FOUND = 1
+
+
+def is_known_missing(kind, value, generation):
+    """
+    True if a recent lookup of this item pk or category name found nothing.
+
+    Entries are folded with the portfolio generation, which the signals
+    bump whenever an item or category is saved, so creating the object
+    makes the entry unreachable straight away. The local tier answers
+    repeats without a Redis round trip.
+    """
+    key = fold_generations(not_found_key(kind, value), generation)
+    return response_cache.get(key, generation) == NOT_FOUND
+
+
+def remember_missing(kind, value, generation):
+    """Cache a not-found result for the portfolio_notfound TTL"""
+    base_key = not_found_key(kind, value)
+    response_cache.set(
+        fold_generations(base_key, generation),
+        NOT_FOUND,
+        ttl_policy("portfolio_notfound").hard_ttl(),
+        generation,
+    )
+    keyspace_counter.record("portfolio_notfound", base_key)
@@ -0,0 +1,71 @@
+import json
+from django.conf import settings
+from django.http import HttpResponse
+from rest_framework.renderers import JSONRenderer
+from rest_framework.response import Response
+
+JSON_CONTENT_TYPE = "application/json"
+
+_renderer = JSONRenderer()
+
+
+def render_json(data):
+    """Encode data exactly as DRF's JSONRenderer would for a Response"""
+    return _renderer.render(data)
+
+
+def render_fragment(data):
+    """Pre-render a serialized object for caching as response bytes"""
+    return {"body": render_json(data), "content_type": JSON_CONTENT_TYPE}
+
+
+def assemble_list_body(fragments, pagination, extra=None):
+    """
+    Build the body of a {..., "portfolio_items": [...], "pagination": {...}}
+    response by concatenating pre-rendered fragments, with no decoding.
+    extra holds fields that come before portfolio_items, in order.
+    """
+    leading = b"".join(
+        render_json(name) + b":" + render_json(value) + b","
+        for name, value in (extra or {}).items()
+    )
+    return b"".join(
+        [
+            b"{",
+            leading,
+            b'"portfolio_items":[',
+            b",".join(fragment["body"] for fragment in fragments),
+            b'],"pagination":',
+            render_json(pagination),
+            b"}",
+        ]
+    )
+
+
+def absolute_media_urls(request, body):
+    """
+    Prefix the media URLs in a cached body, which are kept relative to
+    MEDIA_URL, with this request's scheme and host. One bytes.replace();
+    a MEDIA_URL that is already absolute (a CDN) is left alone.
+    """
+    media_url = settings.MEDIA_URL
+    if not media_url.startswith("/") or media_url.startswith("//"):
+        return body
+    return body.replace(
+        b'"' + media_url.encode(),
+        b'"' + request.build_absolute_uri(media_url).encode(),
+    )
+
+
+def rendered_response(request, body, content_type=JSON_CONTENT_TYPE):
+    """
+    Answer with the cached bytes when the client negotiated JSON; other
+    renderers (e.g. the browsable API) get the decoded data instead.
+    ETag/Last-Modified are added by ConditionalGetMixin.
+    """
+    body = absolute_media_urls(request, body)
+    accepted = getattr(request, "accepted_renderer", None)
+    if accepted is not None and accepted.format != "json":
+        return Response(json.loads(body))
+
+    return HttpResponse(body, content_type=content_type)
@@ -0,0 +1,78 @@
+import time
+import uuid
+from django.core.cache import cache
+from .ttl import ttl_policy
+
+# The lock only has to outlive one regeneration; if the holder dies it expires.
+LOCK_TIMEOUT = 10  # seconds
+WAIT_TIMEOUT = 2.0  # seconds a waiter polls before giving up
+POLL_INTERVAL = 0.05  # seconds
+
+
+def _lock_key(key):
+    return f"lock:{key}"
+
+
+def acquire_lock(key, timeout=LOCK_TIMEOUT):
+    """
+    Try to become the single regenerator for key.
+
+    cache.add is SET NX on Redis and an atomic check-and-set on locmem, so
+    the same code works (and can be tested) without Redis. Returns a token
+    to pass to release_lock, or None when someone else holds the lock.
+    """
+    token = uuid.uuid4().hex
+    if cache.add(_lock_key(key), token, timeout):
+        return token
+    return None
+
+
+def release_lock(key, token):
+    """Release the lock if we still own it (it may have expired and moved on)"""
+    lock_key = _lock_key(key)
+    if cache.get(lock_key) == token:
+        cache.delete(lock_key)
+
+
+def stale_key(key):
+    """Key holding the last good copy of key"""
+    return f"{key}:stale"
+
+
+def store_stale(stale_key, value):
+    """Keep the last good value for waiters while a key is regenerated"""
+    cache.set(stale_key, value, ttl_policy("stale").hard_ttl())
+
+
+def single_flight(key, read, generate, stale_key=None):
+    """
+    Regenerate a missing cache entry at most once across all workers.
+
+    read() returns the cached value or None. generate() builds the value,
+    stores it under key and returns it; it should also keep a copy under
+    stale_key (see store_stale) when it wants waiters to have a fallback.
+    Concurrent callers poll read() for up to WAIT_TIMEOUT and then fall
+    back to that stale copy before generating themselves.
+    """
+    token = acquire_lock(key)
+    if token is not None:
+        try:
+            return generate()
+        finally:
+            release_lock(key, token)
+
+    deadline = time.monotonic() + WAIT_TIMEOUT
+    while time.monotonic() < deadline:
+        time.sleep(POLL_INTERVAL)
+        value = read()
+        if value is not None:
+            return value
+
+    if stale_key is not None:
+        value = cache.get(stale_key)
+        if value is not None:
+            print(f"Serving stale value for: {key}")
+            return value
+
+    # The holder is slow or died; don't leave this request empty-handed
+    return generate()
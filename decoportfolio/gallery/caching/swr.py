@@ -0,0 +1,89 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from django.conf import settings
+from django.db import connection
+from .singleflight import acquire_lock, release_lock
+from .ttl import refresh_due
+
+DEFAULT_REFRESH_WORKERS = 2
+# Refreshes beyond this many in flight are dropped; the stale value is still
+# served and the next request after the pool drains will try again.
+MAX_PENDING_REFRESHES = 100
+
+_refresh_pool = ThreadPoolExecutor(
+    max_workers=getattr(settings, "CACHE_REFRESH_WORKERS", DEFAULT_REFRESH_WORKERS),
+    thread_name_prefix="cache-refresh",
+)
+_pending_keys = set()
+_pending_lock = threading.Lock()
+
+
+def wrap(value, policy, compute_time=0.0):
+    """
+    Envelope a value with a jittered soft expiry from its TTLPolicy. The
+    hard expiry is the TTL the envelope is stored with (policy.hard_ttl());
+    between the two the value is served stale. compute_time is how long the
+    value took to build, for early refresh.
+    """
+    envelope = {"data": value, "soft_expires_at": time.time() + policy.soft_ttl()}
+    early = policy.early(compute_time)
+    if early:
+        envelope["early"] = early
+    return envelope
+
+
+def unwrap(envelope):
+    """
+    Return (value, is_stale) for an envelope, or (None, False) on a miss.
+    is_stale may turn true shortly before the soft expiry (see refresh_due).
+    """
+    if envelope is None:
+        return None, False
+    return envelope["data"], refresh_due(
+        envelope["soft_expires_at"], envelope.get("early", 0.0)
+    )
+
+
+def fresh_for(envelope):
+    """Seconds until an envelope's soft expiry; None for other values"""
+    if not isinstance(envelope, dict) or "soft_expires_at" not in envelope:
+        return None
+    return envelope["soft_expires_at"] - time.time()
+
+
+def schedule_refresh(key, refresh):
+    """
+    Run refresh() in the background pool to rebuild a stale entry.
+
+    Refreshes are deduplicated per key within this worker and guarded by the
+    single-flight lock across workers, so a hot stale key is rebuilt once.
+    """
+    with _pending_lock:
+        if key in _pending_keys or len(_pending_keys) >= MAX_PENDING_REFRESHES:
+            return False
+        _pending_keys.add(key)
+
+    _refresh_pool.submit(_run_refresh, key, refresh)
+    return True
+
+
+def _run_refresh(key, refresh):
+    token = None
+    try:
+        # Inside the try: a Redis error here must still clear the key below,
+        # or it would never be refreshed again and fill MAX_PENDING_REFRESHES
+        token = acquire_lock(key)
+        if token is None:
+            return
+        print(f"Refreshing stale cache entry: {key}")
+        refresh()
+    except Exception as e:
+        print(f"Background refresh failed for {key}: {e}")
+    finally:
+        if token is not None:
+            release_lock(key, token)
+        with _pending_lock:
+            _pending_keys.discard(key)
+        # Each pool thread gets its own DB connection; don't leak it
+        connection.close()
@@ -0,0 +1,90 @@
+import threading
+from django.core.cache import cache
+from .connection import get_redis_client
+
+TAG_PREFIX = "tag"
+# A tag set must outlive the longest-lived entry registered in it. Every
+# registration sets its expiry to at least this, so a batch with a short
+# TTL never cuts the set below members registered earlier with a longer one.
+DEFAULT_TAG_TIMEOUT = 60 * 60 * 24  # 24 hours
+
+
+class TagRegistry:
+    """
+    Maps invalidation tags (item:42, category:3, service:7, business) to the
+    cache keys that depend on them.
+
+    On Redis each tag is a SET of cache keys, written and invalidated with
+    pipelines. Other backends keep the sets in this process, which matches
+    the per-process scope of locmem.
+    """
+
+    def __init__(self):
+        self._local = {}
+        self._lock = threading.Lock()
+
+    def _tag_key(self, tag):
+        return cache.make_key(f"{TAG_PREFIX}:{tag}")
+
+    def register(self, entries, timeout=DEFAULT_TAG_TIMEOUT):
+        """
+        Record dependencies for {cache_key: [tags]} in one pipeline.
+        timeout is the longest the entries can live (a TTLPolicy's
+        max_ttl(), not one jittered TTL).
+        """
+        if not entries:
+            return
+
+        redis_client = get_redis_client()
+        if redis_client is None:
+            with self._lock:
+                for key, tags in entries.items():
+                    for tag in tags:
+                        self._local.setdefault(tag, set()).add(key)
+            return
+
+        try:
+            pipe = redis_client.pipeline(transaction=False)
+            touched = set()
+            for key, tags in entries.items():
+                for tag in tags:
+                    pipe.sadd(self._tag_key(tag), key)
+                    touched.add(tag)
+            expire = max(timeout, DEFAULT_TAG_TIMEOUT) if timeout else DEFAULT_TAG_TIMEOUT
+            for tag in touched:
+                pipe.expire(self._tag_key(tag), expire)
+            pipe.execute()
+        except Exception as e:
+            print(f"Tag registry error: {e}")
+
+    def invalidate(self, *tags):
+        """
+        Delete every key registered under any of the tags, and the tags
+        themselves. Returns the number of keys removed.
+        """
+        if not tags:
+            return 0
+
+        redis_client = get_redis_client()
+        if redis_client is None:
+            with self._lock:
+                keys = set()
+                for tag in tags:
+                    keys |= self._local.pop(tag, set())
+            if keys:
+                cache.delete_many(list(keys))
+            return len(keys)
+
+        tag_keys = [self._tag_key(tag) for tag in tags]
+        pipe = redis_client.pipeline(transaction=False)
+        for tag_key in tag_keys:
+            pipe.smembers(tag_key)
+        members = set().union(*pipe.execute())
+
+        # Registered names are unprefixed; DEL needs the full Redis keys
+        keys = [cache.make_key(member.decode()) for member in members]
+        redis_client.delete(*keys, *tag_keys)
+        return len(members)
+
+
+tag_registry = TagRegistry()
@@ -0,0 +1,220 @@
+import pickle
+import threading
+import time
+from collections import OrderedDict
+from django.conf import settings
+from django.core.cache import cache
+from .keys import family_of
+from .metrics import cache_metrics
+from .swr import fresh_for
+
+DEFAULT_LOCAL_CACHE_MAX_BYTES = 32 * 1024 * 1024  # 32 MB per worker
+DEFAULT_LOCAL_CACHE_MAX_AGE = 60  # seconds
+
+
+class LocalLRUCache:
+    """
+    Bounded in-process LRU keyed by cache key.
+
+    Sizes are measured once, when an entry is stored, as the length of its
+    pickle, so the budget tracks roughly what Redis would have sent over the
+    wire. Values are returned by reference and must not be mutated.
+    """
+
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self.current_bytes = 0
+        self.evictions = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, generation):
+        """Return (found, value); entries from another generation are dropped"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return False, None
+
+            entry_generation, expires_at, size, value = entry
+            if entry_generation != generation or expires_at < time.monotonic():
+                self._discard(key)
+                return False, None
+
+            self._entries.move_to_end(key)
+            return True, value
+
+    def set(self, key, value, timeout, generation):
+        """Store value and return its pickled size; timeout <= 0 only drops key"""
+        size = len(pickle.dumps(value, pickle.HIGHEST_PROTOCOL))
+        if size > self.max_bytes or (timeout is not None and timeout <= 0):
+            self.delete(key)
+            return size
+
+        expires_at = time.monotonic() + (timeout if timeout is not None else 86400)
+        with self._lock:
+            self._discard(key)
+            self._entries[key] = (generation, expires_at, size, value)
+            self.current_bytes += size
+
+            while self.current_bytes > self.max_bytes:
+                oldest_key = next(iter(self._entries))
+                self._discard(oldest_key)
+                self.evictions += 1
+        return size
+
+    def delete(self, key):
+        with self._lock:
+            self._discard(key)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.current_bytes = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    def _discard(self, key):
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self.current_bytes -= entry[2]
+
+
+class TieredCache:
+    """
+    Two-tier cache: a per-worker LRU in front of the shared Django cache.
+
+    Every read and write carries a generation number that the caller got
+    from Redis (see caching.generations). Local entries written under an
+    older generation are treated as misses, so invalidations made by any
+    worker or node are honoured here without pub/sub.
+
+    Local copies of stale-while-revalidate envelopes expire at their soft
+    expiry, and any copy after max_age seconds. Once an entry is due, every
+    worker reads it from Redis again, so the one refresh that took the lock
+    is seen everywhere instead of each worker rebuilding from its own copy.
+
+    Hits, misses, latency and payload sizes are recorded per key family in
+    caching.metrics.
+    """
+
+    def __init__(self, backend, max_bytes, max_age=DEFAULT_LOCAL_CACHE_MAX_AGE):
+        self.backend = backend
+        self.local = LocalLRUCache(max_bytes)
+        self.max_age = max_age
+        self.counters = {
+            "local_hits": 0,
+            "local_misses": 0,
+            "backend_hits": 0,
+            "backend_misses": 0,
+        }
+
+    def get(self, key, generation):
+        start = time.perf_counter()
+        value = self._get(key, generation)
+        elapsed = time.perf_counter() - start
+
+        hit = value is not None
+        cache_metrics.record_get(family_of(key), int(hit), int(not hit), elapsed)
+        return value
+
+    def _get(self, key, generation):
+        found, value = self.local.get(key, generation)
+        if found:
+            self.counters["local_hits"] += 1
+            return value
+        self.counters["local_misses"] += 1
+
+        value = self.backend.get(key)
+        if value is None:
+            self.counters["backend_misses"] += 1
+            return None
+
+        self.counters["backend_hits"] += 1
+        self.local.set(key, value, self._local_timeout(value), generation)
+        return value
+
+    def get_many(self, keys, generation):
+        start = time.perf_counter()
+        results = self._get_many(keys, generation)
+        elapsed = time.perf_counter() - start
+
+        families = {}
+        for key in keys:
+            hits_misses = families.setdefault(family_of(key), [0, 0])
+            hits_misses[key not in results] += 1
+        for family, (hits, misses) in families.items():
+            cache_metrics.record_get(family, hits, misses, elapsed)
+        return results
+
+    def _get_many(self, keys, generation):
+        results = {}
+        remote_keys = []
+        for key in keys:
+            found, value = self.local.get(key, generation)
+            if found:
+                results[key] = value
+            else:
+                remote_keys.append(key)
+
+        self.counters["local_hits"] += len(results)
+        self.counters["local_misses"] += len(remote_keys)
+
+        if remote_keys:
+            found = self.backend.get_many(remote_keys)
+            self.counters["backend_hits"] += len(found)
+            self.counters["backend_misses"] += len(remote_keys) - len(found)
+            for key, value in found.items():
+                self.local.set(key, value, self._local_timeout(value), generation)
+            results.update(found)
+
+        return results
+
+    def set(self, key, value, timeout, generation):
+        start = time.perf_counter()
+        self.backend.set(key, value, timeout)
+        size = self.local.set(key, value, self._local_timeout(value, timeout), generation)
+        elapsed = time.perf_counter() - start
+        cache_metrics.record_set(family_of(key), [size], elapsed)
+
+    def set_many(self, data, timeout, generation):
+        start = time.perf_counter()
+        self.backend.set_many(data, timeout)
+        sizes = {}
+        for key, value in data.items():
+            size = self.local.set(key, value, self._local_timeout(value, timeout), generation)
+            sizes.setdefault(family_of(key), []).append(size)
+        elapsed = time.perf_counter() - start
+        for family, family_sizes in sizes.items():
+            cache_metrics.record_set(family, family_sizes, elapsed)
+
+    def _local_timeout(self, value, timeout=None):
+        """How long this worker may answer with its own copy of value"""
+        local_timeout = self.max_age if timeout is None else min(timeout, self.max_age)
+        remaining = fresh_for(value)
+        if remaining is not None:
+            local_timeout = min(local_timeout, remaining)
+        return local_timeout
+
+    def delete_many(self, keys):
+        self.backend.delete_many(keys)
+        for key in keys:
+            self.local.delete(key)
+
+    def stats(self):
+        """Hit/miss counters per tier plus the local tier's memory use"""
+        return {
+            **self.counters,
+            "local_entries": len(self.local),
+            "local_bytes": self.local.current_bytes,
+            "local_max_bytes": self.local.max_bytes,
+            "local_evictions": self.local.evictions,
+        }
+
+
+# Shared by the public viewsets; one instance (and one LRU) per worker process
+response_cache = TieredCache(
+    cache,
+    getattr(settings, "LOCAL_CACHE_MAX_BYTES", DEFAULT_LOCAL_CACHE_MAX_BYTES),
+    getattr(settings, "LOCAL_CACHE_MAX_AGE", DEFAULT_LOCAL_CACHE_MAX_AGE),
+)
@@ -0,0 +1,113 @@
+import math
+import random
+import time
+from django.conf import settings
+from .keys import ACTION_PARAMS, key_family
+
+# Every timeout is scaled by a random factor in [1 - jitter, 1 + jitter] so
+# entries written together (a warm_cache run, a burst after an invalidation)
+# don't all expire together.
+DEFAULT_JITTER = 0.1
+# XFetch: how eagerly an entry is refreshed ahead of its soft expiry, in
+# multiples of the time it took to build. 0 disables early refresh.
+DEFAULT_BETA = 1.0
+
+
+class TTLPolicy:
+    """
+    Lifetime of one key family: the hard timeout it is stored with, the
+    soft timeout after which it is served stale and refreshed (None: only
+    the hard one), the jitter applied to both and the XFetch beta.
+    """
+
+    def __init__(self, timeout, soft_timeout=None, jitter=DEFAULT_JITTER, beta=DEFAULT_BETA):
+        self.timeout = timeout
+        self.soft_timeout = soft_timeout
+        self.jitter = jitter
+        self.beta = beta
+
+    def jittered(self, seconds):
+        """seconds scaled by this policy's jitter; None stays None"""
+        if seconds is None or not self.jitter:
+            return seconds
+        factor = random.uniform(1 - self.jitter, 1 + self.jitter)
+        return max(1, round(seconds * factor))
+
+    def hard_ttl(self):
+        return self.jittered(self.timeout)
+
+    def max_ttl(self):
+        """Longest hard TTL jitter can produce; what tag sets must outlive"""
+        if self.timeout is None:
+            return None
+        return math.ceil(self.timeout * (1 + self.jitter))
+
+    def soft_ttl(self):
+        soft_timeout = self.soft_timeout if self.soft_timeout is not None else self.timeout
+        soft_ttl = self.jittered(soft_timeout)
+        if self.timeout is not None and soft_ttl is not None:
+            # Never later than the shortest hard expiry jitter can produce
+            soft_ttl = min(soft_ttl, round(self.timeout * (1 - self.jitter)))
+        return soft_ttl
+
+    def early(self, compute_time):
+        """XFetch window stored with an entry that took compute_time to build"""
+        return compute_time * self.beta
+
+
+def refresh_due(soft_expires_at, early=0.0, now=None):
+    """
+    True once an entry should be refreshed: past its soft expiry, or, with
+    a non-zero early window, with a probability that rises as the soft
+    expiry nears (XFetch). One request refreshes ahead of time instead of
+    every request missing at once.
+    """
+    if now is None:
+        now = time.time()
+    if early:
+        # -log(u) for u in (0, 1] is exponentially distributed, mean 1
+        now -= early * math.log(1.0 - random.random())
+    return now >= soft_expires_at
+
+
+def _build_policies():
+    policies = {
+        "default": TTLPolicy(60 * 5),
+        # Keys are versioned by generation counters that the signals bump,
+        # so pages and fragments can live for hours without being served
+        # after an edit.
+        **{
+            key_family(action): TTLPolicy(60 * 60, 60 * 5)
+            for action in ACTION_PARAMS
+        },
+        "portfolio_item": TTLPolicy(60 * 60 * 6, 60 * 10),
+        # Unknown pks and category names; short, since nothing but a new
+        # generation would otherwise clear a stale "doesn't exist"
+        "portfolio_notfound": TTLPolicy(60, beta=0),
+        # Last good copies, served while others regenerate
+        "stale": TTLPolicy(60 * 60 * 24, beta=0),
+    }
+
+    # e.g. CACHE_TTL_POLICIES = {"portfolio_search": {"timeout": 600}}
+    for family, overrides in getattr(settings, "CACHE_TTL_POLICIES", {}).items():
+        base = policies.get(family, policies["default"])
+        policies[family] = TTLPolicy(
+            **{
+                "timeout": base.timeout,
+                "soft_timeout": base.soft_timeout,
+                "jitter": base.jitter,
+                "beta": base.beta,
+                **overrides,
+            }
+        )
+    return policies
+
+
+TTL_POLICIES = _build_policies()
+
+
+def ttl_policy(family):
+    """Policy for a key family as returned by family_of; stale copies share one"""
+    if family.endswith(":stale"):
+        family = "stale"
+    return TTL_POLICIES.get(family, TTL_POLICIES["default"])
@@ -0,0 +1,61 @@
+from django.conf import settings
+from django.core.exceptions import ObjectDoesNotExist
+from django.http import Http404
+from rest_framework.request import Request
+from rest_framework.test import APIRequestFactory
+from .fragments import get_item_fragments, item_fragment_key, item_versions
+from .generations import get_generation
+from .hotlist import hotlist
+from .swr import schedule_refresh
+
+DEFAULT_REWARM_SIZE = 20
+
+
+def make_viewset(action_name, **kwargs):
+    """
+    A PortfolioItemViewSet outside the request cycle. Fragments are
+    serialized without the request, so what it builds holds no host.
+    """
+    from gallery.viewsets import PortfolioItemViewSet
+
+    django_request = APIRequestFactory().get("/api/portfolio-items/")
+    viewset = PortfolioItemViewSet(action=action_name, format_kwarg=None, kwargs=kwargs)
+    viewset.request = Request(django_request)
+    return viewset
+
+
+def warm_entry(action, params, generation):
+    """
+    Build what a request for (action, params) reads: the page and the
+    fragments of its items, or a single item fragment for retrieve.
+    """
+    if action == "retrieve":
+        pk = params["pk"]
+        version = item_versions([pk])[pk]
+        viewset = make_viewset(action, pk=pk)
+        viewset.build_item(item_fragment_key(pk, version), version)
+        return
+
+    viewset = make_viewset(action)
+    page = viewset.build_page(action, params, generation)
+    get_item_fragments(page["ids"], viewset.build_item_fragments)
+
+
+def rewarm_hot_entries(limit=None):
+    """Rebuild the hottest entries under the current generation"""
+    limit = limit or getattr(settings, "HOTLIST_REWARM_SIZE", DEFAULT_REWARM_SIZE)
+    generation = get_generation("portfolio")
+    warmed = 0
+    for action, params, _ in hotlist.top(limit):
+        try:
+            warm_entry(action, params, generation)
+            warmed += 1
+        except (Http404, ObjectDoesNotExist):
+            # Deleted item or category still ranked; it decays away
+            continue
+    print(f"Re-warmed {warmed} hot cache entries")
+
+
+def schedule_rewarm():
+    """Re-warm the hot entries in the background after an invalidation"""
+    return schedule_refresh("hotlist_rewarm", rewarm_hot_entries)
@@ -10,7 +10,7 @@ class CacheHealthCheck:
     def check_redis_connection():
         """Check if Redis is accessible"""
         try:
-            r = redis.Redis(host='127.0.0.1', port=6379, db=1)
+            r = redis.Redis.from_url(settings.REDIS_URL, socket_connect_timeout=1)
             r.ping()
             return True, "Redis connection OK"
         except Exception as e:
@@ -44,12 +44,31 @@ class CacheHealthCheck:
         except Exception as e:
             return False, f"Cache performance test failed: {e}"
     
+    @staticmethod
+    def check_circuit_breaker():
+        """Report this process's cache circuit breaker state and counters"""
+        breaker = getattr(cache, 'breaker', None)
+        if breaker is None:
+            return True, "No circuit breaker configured for the cache backend"
+
+        stats = breaker.stats()
+        message = (
+            f"{stats['state'].upper()} (calls: {stats['calls']}, "
+            f"failures: {stats['failures']}, trips: {stats['trips']}, "
+            f"short-circuited: {stats['short_circuited']}, "
+            f"recoveries: {stats['recoveries']})"
+        )
+        # Failures below the trip threshold already mean Redis is struggling
+        return stats['state'] == 'closed' and not stats['consecutive_failures'], message
+
     @staticmethod
     def get_health_status():
         """Get overall cache health status"""
         status = {
             'redis_connection': CacheHealthCheck.check_redis_connection(),
             'cache_performance': CacheHealthCheck.check_cache_performance(),
+            # After the performance check, so it reflects this run's calls
+            'circuit_breaker': CacheHealthCheck.check_circuit_breaker(),
             'status': time.time(),
         }
 
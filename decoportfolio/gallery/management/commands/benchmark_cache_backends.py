@@ -0,0 +1,293 @@
+import os
+import random
+import shutil
+import tempfile
+import time
+from django.conf import settings
+from django.core.cache.backends.db import DatabaseCache
+from django.core.cache.backends.filebased import FileBasedCache
+from django.core.cache.backends.locmem import LocMemCache
+from django.core.management.base import BaseCommand, CommandError
+from django.core.management.commands.createcachetable import Command as CreateCacheTable
+from django.db import DEFAULT_DB_ALIAS, connection
+from gallery.caching.codecs import COMPRESSORS, Codec
+from gallery.caching.fragments import item_fragment_key
+from gallery.caching.keys import canonical_params, not_found_key, page_cache_key
+from gallery.caching.rendering import render_fragment
+from gallery.caching.swr import wrap
+from gallery.caching.ttl import ttl_policy
+from gallery.caching.warming import make_viewset
+from gallery.models import PortfolioItem
+from gallery.viewsets import paginate_queryset
+
+# One simulated request per draw, weighted roughly like production traffic:
+# list/search/filter pages, detail pages, and junk pks from crawlers
+REQUEST_MIX = [('page', 0.7), ('retrieve', 0.25), ('not_found', 0.05)]
+
+BENCHMARK_TABLE = 'gallery_benchmark_cache'
+BENCHMARK_PREFIX = 'benchmark'
+# Codec names besides caching.codecs.COMPRESSORS: values stored as-is and
+# pickled by the backend, the way response_cache stores them today
+NATIVE_CODEC = 'pickle'
+
+
+def percentile(samples, pct):
+    """pct-th percentile of an already sorted list"""
+    if not samples:
+        return 0.0
+    index = min(len(samples) - 1, int(len(samples) * pct / 100))
+    return samples[index]
+
+
+class Command(BaseCommand):
+    help = 'Replay a PortfolioItemViewSet cache workload against each cache backend and codec'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--requests',
+            type=int,
+            default=2000,
+            help='Simulated requests per backend and codec (default: 2000)'
+        )
+        parser.add_argument(
+            '--backends',
+            default='locmem,file,db',
+            help='Comma-separated local backends: locmem, file, db (default: all three)'
+        )
+        parser.add_argument(
+            '--redis',
+            nargs='?',
+            const=settings.REDIS_URL,
+            help='Also benchmark Redis, at this URL (default: REDIS_URL)'
+        )
+        parser.add_argument(
+            '--codecs',
+            default=f"{NATIVE_CODEC},zlib-1,zlib-6",
+            help=(
+                f"Comma-separated codecs: {NATIVE_CODEC} or any of "
+                f"{', '.join(COMPRESSORS)} (default: {NATIVE_CODEC},zlib-1,zlib-6)"
+            )
+        )
+        parser.add_argument(
+            '--miss-rate',
+            type=float,
+            default=0.1,
+            help='Fraction of lookups treated as misses and rebuilt with a set (default: 0.1)'
+        )
+        parser.add_argument(
+            '--page-size',
+            type=int,
+            default=12,
+            help='Items per cached page (default: 12)'
+        )
+        parser.add_argument(
+            '--seed',
+            type=int,
+            default=1,
+            help='Random seed, so runs replay the same request sequence (default: 1)'
+        )
+
+    def handle(self, *args, **options):
+        self.stdout.write("CACHE BACKEND BENCHMARK")
+        self.stdout.write("=" * 50)
+
+        if not PortfolioItem.objects.exists():
+            self.stdout.write(self.style.WARNING("No portfolio items found; run seed_data first"))
+            return
+
+        codecs = options['codecs'].split(',')
+        unknown = [name for name in codecs if name != NATIVE_CODEC and name not in COMPRESSORS]
+        if unknown:
+            raise CommandError(f"Unknown codecs: {', '.join(unknown)}")
+
+        self.options = options
+        self.build_workload(options['page_size'])
+        self.stdout.write(
+            f"Workload: {len(self.pages)} pages, {len(self.fragments)} item fragments, "
+            f"{options['requests']} requests, {options['miss_rate']:.0%} misses"
+        )
+
+        backends = [name.strip() for name in options['backends'].split(',') if name.strip()]
+        if options['redis']:
+            backends.append('redis')
+
+        for backend_name in backends:
+            backend, cleanup = self.make_backend(backend_name)
+            try:
+                for codec_name in codecs:
+                    self.reset(backend)
+                    self.run(backend_name, backend, codec_name)
+            finally:
+                cleanup()
+
+        self.stdout.write(self.style.SUCCESS("\nCache backend benchmark completed!"))
+
+    def build_workload(self, page_size):
+        """Real pages and fragments, shaped exactly as the viewsets cache them"""
+        viewset = make_viewset('list')
+        ids = list(viewset.filter_items('list', {}).values_list('id', flat=True))
+        self.fragments = {
+            item_fragment_key(item_id, (1, 1)): wrap(render_fragment(data), ttl_policy('portfolio_item'))
+            for item_id, data in viewset.build_item_fragments(ids).items()
+        }
+
+        self.pages = {}
+        total_pages = 1
+        page = 1
+        while page <= total_pages:
+            params = canonical_params({'page': page, 'page_size': page_size}, 'list')
+            page_ids, pagination = paginate_queryset(ids, page, page_size, None)
+            total_pages = pagination['total_pages']
+            key = f"{page_cache_key('list', params)}:g1"
+            self.pages[key] = (
+                [item_fragment_key(item_id, (1, 1)) for item_id in page_ids],
+                wrap({'ids': list(page_ids), 'pagination': pagination}, ttl_policy('portfolio_list')),
+            )
+            page += 1
+        self.generation_key = 'gen:portfolio'
+
+    def make_backend(self, name):
+        """Return (cache, cleanup) for a benchmark-only cache of this kind"""
+        params = {'KEY_PREFIX': BENCHMARK_PREFIX, 'TIMEOUT': 3600, 'OPTIONS': {'MAX_ENTRIES': 100000}}
+        if name == 'locmem':
+            return LocMemCache('cache-benchmark', params), lambda: None
+        if name == 'file':
+            directory = tempfile.mkdtemp(prefix='cache-benchmark-')
+            return FileBasedCache(directory, params), lambda: shutil.rmtree(directory, ignore_errors=True)
+        if name == 'db':
+            create_command = CreateCacheTable()
+            create_command.verbosity = 0
+            create_command.create_table(DEFAULT_DB_ALIAS, BENCHMARK_TABLE, dry_run=False)
+
+            def drop_table():
+                with connection.cursor() as cursor:
+                    cursor.execute(f"DROP TABLE {connection.ops.quote_name(BENCHMARK_TABLE)}")
+
+            return DatabaseCache(BENCHMARK_TABLE, params), drop_table
+        if name == 'redis':
+            from django_redis.cache import RedisCache
+
+            # Same client options (timeouts, pool) as the site's cache
+            options = settings.CACHES['default'].get('OPTIONS', {})
+            backend = RedisCache(self.options['redis'], {**params, 'OPTIONS': options})
+            return backend, lambda: self.reset(backend)
+        raise CommandError(f"Unknown backend: {name}")
+
+    def reset(self, backend):
+        if hasattr(backend, 'delete_pattern'):
+            # Only the benchmark's keys; clear() would FLUSHDB the site's cache
+            backend.delete_pattern('*')
+        else:
+            backend.clear()
+
+    def run(self, backend_name, backend, codec_name):
+        if codec_name == NATIVE_CODEC:
+            encode = decode = lambda value: value
+        else:
+            codec = Codec(codec_name)
+            encode, decode = codec.encode, codec.decode
+
+        timings = {'get': [], 'get_many': [], 'set': [], 'set_many': []}
+
+        def timed(op, func, *args):
+            start = time.perf_counter()
+            result = func(*args)
+            timings[op].append(time.perf_counter() - start)
+            return result
+
+        def get(key):
+            value = timed('get', backend.get, key)
+            return decode(value) if value is not None else None
+
+        def get_many(keys):
+            start = time.perf_counter()
+            found = backend.get_many(keys)
+            values = {key: decode(value) for key, value in found.items()}
+            timings['get_many'].append(time.perf_counter() - start)
+            return values
+
+        def set_value(key, value):
+            timed('set', lambda: backend.set(key, encode(value)))
+
+        def set_many(data):
+            timed('set_many', lambda: backend.set_many({key: encode(value) for key, value in data.items()}))
+
+        # Everything cached, as after warm_cache
+        set_value(self.generation_key, 1)
+        for key, (fragment_keys, page) in self.pages.items():
+            set_value(key, page)
+        set_many(self.fragments)
+        for values in timings.values():
+            values.clear()
+
+        rng = random.Random(self.options['seed'])
+        miss_rate = self.options['miss_rate']
+        page_keys = list(self.pages)
+        fragment_keys = list(self.fragments)
+        kinds, weights = zip(*REQUEST_MIX)
+
+        start = time.perf_counter()
+        for _ in range(self.options['requests']):
+            kind = rng.choices(kinds, weights)[0]
+            get(self.generation_key)
+            miss = rng.random() < miss_rate
+
+            if kind == 'page':
+                key = rng.choice(page_keys)
+                item_keys, page = self.pages[key]
+                if get(key) is None or miss:
+                    set_value(key, page)
+                get_many(item_keys)
+                if miss:
+                    set_many({item_key: self.fragments[item_key] for item_key in item_keys})
+            elif kind == 'retrieve':
+                key = rng.choice(fragment_keys)
+                if get(key) is None or miss:
+                    set_value(key, self.fragments[key])
+            else:
+                key = not_found_key('item', rng.randrange(10 ** 6, 10 ** 7))
+                if get(key) is None:
+                    set_value(key, 1)
+        elapsed = time.perf_counter() - start
+
+        ops = sum(len(values) for values in timings.values())
+        memory = self.memory_per_entry(backend_name, backend)
+        self.stdout.write(
+            f"\n{backend_name} / {codec_name}: {ops / elapsed:,.0f} ops/s "
+            f"({self.options['requests'] / elapsed:,.0f} requests/s), "
+            f"{memory}"
+        )
+        for op, values in timings.items():
+            if not values:
+                continue
+            values.sort()
+            self.stdout.write(
+                f"  {op:<9} {len(values):>6} ops  "
+                f"p50 {percentile(values, 50) * 1e6:>8.1f}us  "
+                f"p99 {percentile(values, 99) * 1e6:>8.1f}us"
+            )
+
+    def memory_per_entry(self, backend_name, backend):
+        """Storage the backend reports (or holds on disk) per warm entry"""
+        if backend_name == 'locmem':
+            total, count = sum(len(value) for value in backend._cache.values()), len(backend._cache)
+        elif backend_name == 'file':
+            paths = [os.path.join(backend._dir, name) for name in os.listdir(backend._dir)]
+            total, count = sum(os.path.getsize(path) for path in paths), len(paths)
+        elif backend_name == 'db':
+            table = connection.ops.quote_name(BENCHMARK_TABLE)
+            with connection.cursor() as cursor:
+                cursor.execute(f"SELECT SUM(LENGTH(value)), COUNT(*) FROM {table}")
+                total, count = cursor.fetchone()
+        else:
+            client = backend.client.get_client()
+            keys = list(client.scan_iter(match=f"{BENCHMARK_PREFIX}:*", count=1000))
+            try:
+                total = sum(client.memory_usage(key) or 0 for key in keys)
+            except Exception:
+                return f"{len(keys)} keys (MEMORY USAGE unavailable)"
+            count = len(keys)
+
+        if not count:
+            return "no entries stored"
+        return f"~{(total or 0) / count:,.0f} B/entry over {count} entries"
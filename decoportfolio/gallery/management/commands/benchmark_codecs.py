@@ -0,0 +1,99 @@
+import base64
+import gzip
+import json
+import pickle
+import statistics
+import time
+from django.core.management.base import BaseCommand
+from gallery.caching.codecs import COMPRESSORS, Codec
+from gallery.caching.warming import make_viewset
+from gallery.models import PortfolioItem
+
+
+def legacy_encode(data):
+    """The previous AdvancedCache format: JSON, gzip, base64, in a pickled dict"""
+    json_data = json.dumps(data)
+    compressed = base64.b64encode(gzip.compress(json_data.encode('utf-8'))).decode('utf-8')
+    return pickle.dumps({'data': compressed, 'compressed': True}, pickle.HIGHEST_PROTOCOL)
+
+
+def legacy_decode(entry):
+    cache_data = pickle.loads(entry)
+    return json.loads(gzip.decompress(base64.b64decode(cache_data['data'].encode('utf-8'))))
+
+
+class Command(BaseCommand):
+    help = 'Compare AdvancedCache codecs on real PortfolioItemSerializer payloads'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--iterations',
+            type=int,
+            default=200,
+            help='Encode/decode rounds per codec and payload (default: 200)'
+        )
+        parser.add_argument(
+            '--page-size',
+            type=int,
+            default=12,
+            help='Items in the list payload (default: 12)'
+        )
+
+    def handle(self, *args, **options):
+        self.stdout.write("CACHE CODEC BENCHMARK")
+        self.stdout.write("=" * 50)
+
+        if not PortfolioItem.objects.exists():
+            self.stdout.write(self.style.WARNING("No portfolio items found; run seed_data first"))
+            return
+
+        viewset = make_viewset('list')
+        items = viewset.get_queryset()[:options['page_size']]
+        serialized = viewset.get_serializer(items, many=True).data
+        payloads = {
+            'single item': json.loads(json.dumps(serialized[0])),
+            f"page of {len(serialized)}": json.loads(json.dumps(list(serialized))),
+        }
+
+        # Every codec stores the same pickled value; compressors differ
+        codecs = {
+            'legacy json+gzip+b64': (legacy_encode, legacy_decode),
+            **{
+                name: self.codec_functions(name)
+                for name in COMPRESSORS
+            },
+        }
+
+        for payload_name, payload in payloads.items():
+            pickled_size = len(pickle.dumps(payload, pickle.HIGHEST_PROTOCOL))
+            self.stdout.write(f"\nPayload: {payload_name} ({pickled_size} bytes pickled)")
+            self.stdout.write(
+                f"  {'codec':<22}{'bytes':>8}{'ratio':>8}{'encode us':>12}{'decode us':>12}"
+            )
+            for codec_name, (encode, decode) in codecs.items():
+                encoded = encode(payload)
+                if decode(encoded) != payload:
+                    self.stdout.write(self.style.ERROR(f"  {codec_name}: round trip mismatch"))
+                    continue
+
+                encode_time = self.median_time(lambda: encode(payload), options['iterations'])
+                decode_time = self.median_time(lambda: decode(encoded), options['iterations'])
+                self.stdout.write(
+                    f"  {codec_name:<22}{len(encoded):>8}{len(encoded) / pickled_size:>8.2f}"
+                    f"{encode_time * 1e6:>12.1f}{decode_time * 1e6:>12.1f}"
+                )
+
+        self.stdout.write(self.style.SUCCESS("\nCodec benchmark completed!"))
+
+    def codec_functions(self, name):
+        # Threshold 0 and no adaptation: measure the compressor itself
+        codec = Codec(name, threshold=0, adaptive=False)
+        return codec.encode, codec.decode
+
+    def median_time(self, func, iterations):
+        samples = []
+        for _ in range(iterations):
+            start = time.perf_counter()
+            func()
+            samples.append(time.perf_counter() - start)
+        return statistics.median(samples)
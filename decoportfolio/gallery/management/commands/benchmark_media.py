@@ -0,0 +1,171 @@
+import multiprocessing
+import os
+import resource
+import shutil
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from PIL import Image
+from gallery.media.pool import VariantPool, render_variants
+
+
+def legacy_render_variants(source_path, filename, output_dir):
+    """The previous generate_image_variants: full decode, two copies, LANCZOS from full size"""
+    img = Image.open(source_path)
+    output_format = 'JPEG' if img.format in ['JPEG', 'JPG'] else 'PNG'
+    written = []
+    for prefix, directory, box, quality in [
+        ('thumb', 'thumbnails', (300, 300), 85),
+        ('gallery', 'gallery', (800, 600), 90),
+    ]:
+        variant = img.copy()
+        variant.thumbnail(box, Image.Resampling.LANCZOS)
+        variant_dir = os.path.join(output_dir, directory)
+        os.makedirs(variant_dir, exist_ok=True)
+        path = os.path.join(variant_dir, f"{prefix}_{filename}")
+        if output_format == 'JPEG' and variant.mode in ['RGBA', 'LA', 'P']:
+            variant = variant.convert('RGB')
+        variant.save(path, output_format, quality=quality)
+        written.append(path)
+    return written
+
+
+PIPELINES = {
+    'legacy': legacy_render_variants,
+    'decode-once': render_variants,
+}
+
+
+def measure_pipeline(name, tasks):
+    """
+    Run one pipeline over every task in a fresh process; returns (seconds,
+    RSS in KB before the first image, peak RSS in KB)
+    """
+    baseline = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    start = time.perf_counter()
+    for task in tasks:
+        PIPELINES[name](*task)
+    elapsed = time.perf_counter() - start
+    return elapsed, baseline, resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+
+def parse_size(value):
+    try:
+        width, height = (int(part) for part in value.lower().split('x'))
+    except ValueError:
+        raise CommandError(f"Size must look like 4000x3000, not {value!r}")
+    return width, height
+
+
+class Command(BaseCommand):
+    help = (
+        'Compare image variant pipelines (time, peak RSS) and measure throughput '
+        '(images/sec) for 1 to N pool workers'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--images',
+            type=int,
+            default=12,
+            help='Source images rendered per run (default: 12)'
+        )
+        parser.add_argument(
+            '--size',
+            default='6000x4000',
+            help='Source image size, a 24MP phone photo by default (default: 6000x4000)'
+        )
+        parser.add_argument(
+            '--max-workers',
+            type=int,
+            default=os.cpu_count() or 1,
+            help='Largest pool measured (default: CPU count)'
+        )
+        parser.add_argument(
+            '--memory-limit',
+            type=int,
+            default=getattr(settings, 'MEDIA_WORKER_MEMORY_LIMIT_MB', 1024),
+            help='Per-worker memory limit in MB (default: MEDIA_WORKER_MEMORY_LIMIT_MB)'
+        )
+
+    def handle(self, *args, **options):
+        self.stdout.write("IMAGE VARIANT BENCHMARK")
+        self.stdout.write("=" * 50)
+
+        size = parse_size(options['size'])
+        workdir = tempfile.mkdtemp(prefix='media-benchmark-')
+        try:
+            sources = self.make_sources(workdir, options['images'], size)
+            self.stdout.write(
+                f"{len(sources)} JPEGs of {size[0]}x{size[1]}, "
+                f"{os.cpu_count()} CPUs, {options['memory_limit']} MB per worker"
+            )
+
+            self.stdout.write("\nPipelines, one process each:")
+            self.stdout.write(
+                f"  {'pipeline':<14}{'seconds':>10}{'ms/image':>10}{'peak RSS MB':>14}{'over base MB':>14}"
+            )
+            for name in PIPELINES:
+                self.compare_pipeline(name, sources, workdir)
+
+            self.stdout.write("\nPool workers:")
+            self.stdout.write(f"  {'workers':<10}{'seconds':>10}{'images/s':>12}{'speedup':>10}")
+
+            baseline = None
+            # 0: in-process, as before the pool
+            for workers in range(0, options['max_workers'] + 1):
+                elapsed = self.run(workers, sources, workdir, options['memory_limit'])
+                rate = len(sources) / elapsed
+                baseline = baseline or rate
+                label = 'in-process' if workers == 0 else str(workers)
+                self.stdout.write(
+                    f"  {label:<10}{elapsed:>10.2f}{rate:>12.2f}{rate / baseline:>9.2f}x"
+                )
+        finally:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+        self.stdout.write(self.style.SUCCESS("\nImage variant benchmark completed!"))
+
+    def make_sources(self, workdir, count, size):
+        """Noisy photo-like JPEGs, so encode and decode cost what real uploads do"""
+        source_dir = os.path.join(workdir, 'sources')
+        os.makedirs(source_dir)
+        gradient = Image.linear_gradient('L').resize(size)
+        paths = []
+        for index in range(count):
+            noise = Image.effect_noise(size, 40 + index)
+            path = os.path.join(source_dir, f"photo_{index}.jpg")
+            Image.merge('RGB', (noise, gradient, noise)).save(path, 'JPEG', quality=90)
+            paths.append(path)
+        return paths
+
+    def compare_pipeline(self, name, sources, workdir):
+        output_dir = os.path.join(workdir, f"out_{name}")
+        tasks = [(path, os.path.basename(path), output_dir) for path in sources]
+        # A fresh process per pipeline: peak RSS is a high-water mark
+        context = multiprocessing.get_context('forkserver')
+        with ProcessPoolExecutor(max_workers=1, mp_context=context) as executor:
+            elapsed, baseline, peak = executor.submit(measure_pipeline, name, tasks).result()
+        # ru_maxrss is in KB on Linux
+        self.stdout.write(
+            f"  {name:<14}{elapsed:>10.2f}{elapsed / len(tasks) * 1000:>10.0f}"
+            f"{peak / 1024:>14.0f}{(peak - baseline) / 1024:>14.0f}"
+        )
+
+    def run(self, workers, sources, workdir, memory_limit):
+        output_dir = os.path.join(workdir, f"out_{workers}")
+        tasks = [
+            (path, os.path.basename(path), output_dir)
+            for path in sources
+        ]
+        pool = VariantPool(workers, memory_limit_mb=memory_limit)
+        try:
+            # Start the workers before timing; uploads find them running
+            pool.render_many(tasks[:max(workers, 1)])
+            start = time.perf_counter()
+            pool.render_many(tasks)
+            return time.perf_counter() - start
+        finally:
+            pool.shutdown()
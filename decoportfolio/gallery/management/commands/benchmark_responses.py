@@ -0,0 +1,86 @@
+import json
+import time
+from django.core.cache import cache
+from django.core.management.base import BaseCommand
+from rest_framework import permissions
+from rest_framework.response import Response
+from rest_framework.test import APIRequestFactory
+from rest_framework.views import APIView
+from gallery.models import PortfolioItem
+from gallery.viewsets import PortfolioItemViewSet
+
+DICT_PATH_CACHE_KEY = "benchmark_dict_path"
+
+
+class DictPathView(APIView):
+    """The previous hit path: unpickle a cached dict and render it again"""
+
+    permission_classes = [permissions.AllowAny]
+    authentication_classes = []
+
+    def get(self, request):
+        return Response(cache.get(DICT_PATH_CACHE_KEY))
+
+
+class Command(BaseCommand):
+    help = 'Compare cached dict responses with cached JSON bytes on /api/portfolio-items/'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--requests',
+            type=int,
+            default=2000,
+            help='Requests to time per path (default: 2000)'
+        )
+        parser.add_argument(
+            '--page-size',
+            type=int,
+            default=12,
+            help='Items per page in the benchmarked response (default: 12)'
+        )
+
+    def handle(self, *args, **options):
+        self.stdout.write("RESPONSE CACHE BENCHMARK")
+        self.stdout.write("=" * 50)
+
+        if not PortfolioItem.objects.exists():
+            self.stdout.write(self.style.WARNING("No portfolio items found; run seed_data first"))
+            return
+
+        factory = APIRequestFactory()
+        path = f"/api/portfolio-items/?page_size={options['page_size']}"
+        bytes_view = PortfolioItemViewSet.as_view({"get": "list"})
+        dict_view = DictPathView.as_view()
+
+        # Warm both paths so every timed request is a cache hit
+        warm_response = bytes_view(factory.get(path, HTTP_ACCEPT="application/json"))
+        cache.set(DICT_PATH_CACHE_KEY, json.loads(warm_response.content), 600)
+        dict_view(factory.get(path, HTTP_ACCEPT="application/json")).render()
+
+        self.stdout.write(f"Endpoint: {path}")
+        self.stdout.write(f"Response size: {len(warm_response.content)} bytes")
+        self.stdout.write(f"Requests per path: {options['requests']}\n")
+
+        results = {
+            "dict path": self.time_view(dict_view, factory, path, options['requests']),
+            "bytes path": self.time_view(bytes_view, factory, path, options['requests']),
+        }
+        cache.delete(DICT_PATH_CACHE_KEY)
+
+        for name, elapsed in results.items():
+            self.stdout.write(
+                f"  {name}: {options['requests'] / elapsed:,.0f} req/s "
+                f"({elapsed / options['requests'] * 1000:.3f}ms per request)"
+            )
+
+        speedup = results["dict path"] / results["bytes path"]
+        self.stdout.write(self.style.SUCCESS(f"\nBytes path is {speedup:.2f}x the dict path"))
+
+    def time_view(self, view, factory, path, count):
+        """Time count full DRF dispatches of view, including rendering"""
+        start_time = time.perf_counter()
+        for _ in range(count):
+            response = view(factory.get(path, HTTP_ACCEPT="application/json"))
+            if hasattr(response, 'render'):
+                response.render()
+        return time.perf_counter() - start_time
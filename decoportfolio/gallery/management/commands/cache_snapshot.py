@@ -0,0 +1,237 @@
+import gzip
+import json
+import re
+import struct
+import time
+from django.core.management.base import BaseCommand, CommandError
+from django.core.cache import cache
+from redis.exceptions import ResponseError
+from gallery.caching.connection import get_redis_client
+from gallery.caching.generations import get_generation
+from gallery.caching.keys import ACTION_PARAMS, family_of, key_family
+
+SNAPSHOT_MAGIC = b'DECOSNAP1\n'
+# Per entry: key length, PTTL in ms (-1: no expiry), DUMP payload length
+RECORD_HEADER = struct.Struct('>Hqi')
+
+# Written before everything else on restore, so the keys they version match.
+# Only ever created, never overwritten: a live counter is newer than the dump.
+COUNTER_FAMILIES = ('gen', 'modified')
+# Pages and not-found answers fold in the portfolio generation and are
+# only valid while it is unchanged
+PAGE_FAMILIES = (
+    *(key_family(action) for action in ACTION_PARAMS),
+    'portfolio_notfound',
+)
+# Item fragments fold in their own counters instead, restored with them:
+# one that was edited since the dump is simply never read
+CONTENT_FAMILIES = PAGE_FAMILIES + ('portfolio_item',)
+# Nothing else is snapshotted: sessions could log a user back in, and
+# locks, tag sets, hotlist and metrics only describe the old Redis
+SNAPSHOT_FAMILIES = COUNTER_FAMILIES + CONTENT_FAMILIES
+
+GENERATION_SUFFIX = re.compile(r':g(\d+)$')
+
+
+class Command(BaseCommand):
+    help = 'Dump the Redis cache to a local file, or restore it into a fresh Redis'
+
+    def add_arguments(self, parser):
+        mode = parser.add_mutually_exclusive_group(required=True)
+        mode.add_argument(
+            '--dump',
+            action='store_true',
+            help='Write cached pages, items and their generation counters with their '
+                 'remaining TTL to the snapshot file'
+        )
+        mode.add_argument(
+            '--restore',
+            action='store_true',
+            help='Load the snapshot file into Redis, keeping keys that already exist'
+        )
+        parser.add_argument(
+            '--file',
+            default='cache_snapshot.bin.gz',
+            help='Snapshot path (default: cache_snapshot.bin.gz)'
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=500,
+            help='Keys per DUMP/RESTORE pipeline (default: 500)'
+        )
+        parser.add_argument(
+            '--scan-count',
+            type=int,
+            default=1000,
+            help='COUNT hint passed to each SCAN call (default: 1000)'
+        )
+
+    def handle(self, *args, **options):
+        self.redis = get_redis_client()
+        if self.redis is None:
+            raise CommandError('cache_snapshot needs the Redis cache backend to be reachable')
+
+        start_time = time.time()
+        if options['dump']:
+            self.stdout.write("DUMPING CACHE SNAPSHOT")
+            self.stdout.write("=" * 50)
+            self.dump(options['file'], options['batch_size'], options['scan_count'])
+        else:
+            self.stdout.write("RESTORING CACHE SNAPSHOT")
+            self.stdout.write("=" * 50)
+            self.restore(options['file'], options['batch_size'])
+
+        duration = time.time() - start_time
+        self.stdout.write(self.style.SUCCESS(f"\nDone in {duration:.2f}s"))
+
+    def dump(self, path, batch_size, scan_count):
+        generation = get_generation('portfolio')
+        counts = {'written': 0, 'stale': 0, 'skipped': 0, 'expired': 0}
+
+        with gzip.open(path, 'wb') as snapshot:
+            meta = json.dumps({'created_at': time.time(), 'generation': generation}).encode()
+            snapshot.write(SNAPSHOT_MAGIC + struct.pack('>I', len(meta)) + meta)
+
+            batch = []
+            for key in self.redis.scan_iter(match=cache.make_key('*'), count=scan_count):
+                reason = self.skip_reason(key.decode('utf-8'), generation)
+                if reason:
+                    counts[reason] += 1
+                    continue
+                batch.append(key)
+                if len(batch) >= batch_size:
+                    self.dump_batch(snapshot, batch, counts)
+                    batch = []
+            if batch:
+                self.dump_batch(snapshot, batch, counts)
+
+        self.stdout.write(f"Wrote {counts['written']} keys to {path}")
+        self.stdout.write(
+            f"Skipped {counts['stale']} from stale generations, {counts['skipped']} "
+            f"other keys (sessions, locks, tags, metrics), {counts['expired']} expired "
+            f"during the dump"
+        )
+
+    def skip_reason(self, key, generation):
+        if family_of(key) not in SNAPSHOT_FAMILIES:
+            return 'skipped'
+        match = GENERATION_SUFFIX.search(key)
+        # Page keys end in the portfolio generation alone; fragment keys
+        # (":g<epoch>.<counter>") never match
+        if match and int(match.group(1)) != generation:
+            return 'stale'
+        return None
+
+    def dump_batch(self, snapshot, keys, counts):
+        pipe = self.redis.pipeline(transaction=False)
+        for key in keys:
+            pipe.pttl(key)
+            pipe.dump(key)
+        replies = pipe.execute()
+
+        for key, ttl, payload in zip(keys, replies[0::2], replies[1::2]):
+            # Expired between SCAN and the pipeline
+            if payload is None or ttl == -2:
+                counts['expired'] += 1
+                continue
+            snapshot.write(RECORD_HEADER.pack(len(key), ttl, len(payload)))
+            snapshot.write(key)
+            snapshot.write(payload)
+            counts['written'] += 1
+
+    def read_snapshot(self, path):
+        """Return (meta, iterator of (key, ttl_ms, payload))"""
+        snapshot = gzip.open(path, 'rb')
+        if snapshot.read(len(SNAPSHOT_MAGIC)) != SNAPSHOT_MAGIC:
+            snapshot.close()
+            raise CommandError(f"{path} is not a cache snapshot")
+        (meta_length,) = struct.unpack('>I', snapshot.read(4))
+        meta = json.loads(snapshot.read(meta_length))
+
+        def records():
+            with snapshot:
+                while True:
+                    header = snapshot.read(RECORD_HEADER.size)
+                    if not header:
+                        return
+                    key_length, ttl, payload_length = RECORD_HEADER.unpack(header)
+                    yield snapshot.read(key_length), ttl, snapshot.read(payload_length)
+
+        return meta, records()
+
+    def restore(self, path, batch_size):
+        try:
+            meta, records = self.read_snapshot(path)
+        except FileNotFoundError:
+            raise CommandError(f"Snapshot not found: {path}")
+        age_ms = int((time.time() - meta['created_at']) * 1000)
+        self.stdout.write(f"Snapshot taken {age_ms / 1000:.0f}s ago")
+        counts = {'restored': 0, 'exists': 0, 'expired': 0, 'outdated': 0, 'failed': 0}
+
+        # Counters first, so the generation below is the one the snapshot's
+        # keys were written under unless the live Redis already moved on.
+        # RESTORE without REPLACE leaves an existing counter alone, so a
+        # bump made since the dump is never rolled back.
+        counters = (
+            record for record in records
+            if family_of(record[0].decode('utf-8')) in COUNTER_FAMILIES
+        )
+        self.restore_records(counters, age_ms, batch_size, counts)
+
+        current = get_generation('portfolio') == meta['generation']
+        if not current:
+            self.stdout.write(self.style.WARNING(
+                "Portfolio generation changed since the dump; skipping cached pages"
+            ))
+
+        def rest():
+            for record in self.read_snapshot(path)[1]:
+                family = family_of(record[0].decode('utf-8'))
+                # Counters are done; anything else came from an older dump
+                if family not in CONTENT_FAMILIES:
+                    continue
+                if not current and family in PAGE_FAMILIES:
+                    counts['outdated'] += 1
+                    continue
+                yield record
+
+        self.restore_records(rest(), age_ms, batch_size, counts)
+
+        self.stdout.write(f"Restored {counts['restored']} keys")
+        self.stdout.write(
+            f"Skipped {counts['exists']} already present, {counts['expired']} expired "
+            f"since the dump, {counts['outdated']} from an older generation"
+        )
+        if counts['failed']:
+            self.stdout.write(self.style.ERROR(f"{counts['failed']} keys failed to restore"))
+
+    def restore_records(self, records, age_ms, batch_size, counts):
+        pipe = self.redis.pipeline(transaction=False)
+        queued = 0
+        for key, ttl, payload in records:
+            if ttl >= 0:
+                ttl -= age_ms
+                if ttl <= 0:
+                    counts['expired'] += 1
+                    continue
+            else:
+                ttl = 0  # RESTORE's "no expiry"
+            # No REPLACE: whatever the live site wrote since is newer
+            pipe.restore(key, ttl, payload)
+            queued += 1
+            if queued >= batch_size:
+                self.count_replies(pipe.execute(raise_on_error=False), counts)
+                queued = 0
+        if queued:
+            self.count_replies(pipe.execute(raise_on_error=False), counts)
+
+    def count_replies(self, replies, counts):
+        for reply in replies:
+            if not isinstance(reply, ResponseError):
+                counts['restored'] += 1
+            elif str(reply).startswith('BUSYKEY'):
+                counts['exists'] += 1
+            else:
+                counts['failed'] += 1
+                print(f"Cache snapshot restore error: {reply}")
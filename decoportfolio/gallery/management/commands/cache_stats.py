@@ -1,19 +1,46 @@
+import random
 import redis
 import time
 from django.core.management.base import BaseCommand
 from django.core.cache import cache
 from django.conf import settings
+from gallery.caching.keys import family_of, keyspace_counter
+from gallery.caching.metrics import cache_metrics, histogram_percentile
+
+# TTL buckets for the distribution table: (label, upper bound in seconds)
+TTL_BUCKETS = [
+    ('< 1m', 60),
+    ('< 10m', 60 * 10),
+    ('< 1h', 60 * 60),
+    ('< 6h', 60 * 60 * 6),
+    ('< 24h', 60 * 60 * 24),
+    ('>= 24h', float('inf')),
+]
 
 class Command(BaseCommand):
     help = 'Display cache statistics and performance metrics'
 
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--sample',
+            type=int,
+            default=50,
+            help='Keys per family to measure with MEMORY USAGE and TTL (default: 50)'
+        )
+        parser.add_argument(
+            '--scan-count',
+            type=int,
+            default=1000,
+            help='COUNT hint passed to each SCAN call (default: 1000)'
+        )
+
     def handle(self, *args, **options):
         self.stdout.write("CACHE STATISTICS REPORT")
         self.stdout.write("=" * 50)
 
         # Redis connection
         try:
-            r = redis.Redis(host='127.0.0.1', port=6379, db=1)
+            r = redis.Redis.from_url(settings.REDIS_URL)
             r.ping()
 
             # Memory usage
@@ -21,32 +48,16 @@ class Command(BaseCommand):
             self.stdout.write(f"Memory Usage: {memory_usage['used_memory_human']}")
             self.stdout.write(f"Peak Memory: {memory_usage['used_memory_peak_human']}")
 
+            families = self.scan_families(r, options['sample'], options['scan_count'])
+            self.report_families(r, families)
+
+            # Distinct canonical keys written today, per key family
+            self.stdout.write("\nKey Cardinality (distinct keys today):")
+            for family, count in keyspace_counter.cardinality().items():
+                self.stdout.write(f"  {family}: {count}")
+
+            self.report_requests(r, options['scan_count'])
 
-            # Key statistics
-            keys = r.keys('decoportfolio:1:*')
-            self.stdout.write(f"Total Cache Keys: {len(keys)}")
-
-            # Cache key breakdown
-            key_types = {}
-            for key in keys:
-                key_str = key.decode('utf-8')
-                if 'portfolio_list' in key_str:
-                    key_types['Portfolio Lists'] = key_types.get('Portfolio Lists', 0) + 1
-                elif 'portfolio_item' in key_str:
-                    key_types['Portfolio Items'] = key_types.get('Portfolio Items', 0) + 1
-                elif 'category' in key_str:
-                    key_types['Categories'] = key_types.get('Categories', 0) + 1
-                elif 'service' in key_str:
-                    key_types['Services'] = key_types.get('Services', 0) + 1
-                elif 'business_info' in key_str:
-                    key_types['Business Info'] = key_types.get('Business Info', 0) + 1
-                else:
-                    key_types['Other'] = key_types.get('Other', 0) + 1
-            
-            self.stdout.write("\nCache Key Breakdown:")
-            for key_type, count in key_types.items():
-                self.stdout.write(f"  {key_type}: {count}")
-            
             # Performance test
             self.stdout.write("\nPerformance Test:")
             start_time = time.time()
@@ -61,4 +72,91 @@ class Command(BaseCommand):
         except Exception as e:
             self.stdout.write(self.style.ERROR(f"Redis connection failed: {e}"))
 
-        self.stdout.write("\nCache statistics report completed!")
\ No newline at end of file
+        self.stdout.write("\nCache statistics report completed!")
+
+    def scan_families(self, r, sample_size, scan_count):
+        """
+        Walk the keyspace with SCAN (never KEYS, which blocks Redis) and keep
+        a reservoir sample of up to sample_size keys per family.
+        """
+        families = {}
+        for key in r.scan_iter(match=cache.make_key('*'), count=scan_count):
+            family = families.setdefault(
+                family_of(key.decode('utf-8')), {'count': 0, 'sample': []}
+            )
+            family['count'] += 1
+            if len(family['sample']) < sample_size:
+                family['sample'].append(key)
+            else:
+                slot = random.randrange(family['count'])
+                if slot < sample_size:
+                    family['sample'][slot] = key
+        return families
+
+    def report_families(self, r, families):
+        total_keys = sum(family['count'] for family in families.values())
+        self.stdout.write(f"Total Cache Keys: {total_keys}")
+
+        self.stdout.write("\nCache Key Breakdown (memory estimated from samples):")
+        ttl_rows = {}
+        for name in sorted(families):
+            family = families[name]
+            pipe = r.pipeline(transaction=False)
+            for key in family['sample']:
+                pipe.memory_usage(key)
+                pipe.ttl(key)
+            replies = pipe.execute()
+
+            # Keys can expire between SCAN and the pipeline
+            sizes = [size for size in replies[0::2] if size is not None]
+            ttls = [ttl for ttl in replies[1::2] if ttl != -2]
+            average = sum(sizes) / len(sizes) if sizes else 0
+            estimate = average * family['count'] / 1024
+
+            self.stdout.write(
+                f"  {name}: {family['count']} keys, ~{average:.0f} B/key, "
+                f"~{estimate:.1f} KB total"
+            )
+            ttl_rows[name] = ttls
+
+        self.stdout.write("\nTTL Distribution (sampled):")
+        labels = ['no expiry'] + [label for label, _ in TTL_BUCKETS]
+        for name, ttls in ttl_rows.items():
+            counts = dict.fromkeys(labels, 0)
+            for ttl in ttls:
+                if ttl < 0:
+                    counts['no expiry'] += 1
+                    continue
+                for label, bound in TTL_BUCKETS:
+                    if ttl < bound:
+                        counts[label] += 1
+                        break
+            row = ', '.join(f"{label}: {count}" for label, count in counts.items() if count)
+            self.stdout.write(f"  {name}: {row or 'no samples'}")
+
+    def report_requests(self, r, scan_count):
+        """Hit/miss, latency and payload size totals pushed by every worker"""
+        cache_metrics.publish()
+        prefix = cache.make_key('metrics:')
+        families = [
+            key.decode('utf-8')[len(prefix):]
+            for key in r.scan_iter(match=f"{prefix}*", count=scan_count)
+        ]
+        metrics = cache_metrics.published(r, families)
+
+        self.stdout.write("\nRequest Metrics (all workers):")
+        if not metrics:
+            self.stdout.write("  No metrics published yet")
+            return
+
+        for name, counters in sorted(metrics.items()):
+            lookups = counters['hits'] + counters['misses']
+            hit_rate = counters['hits'] / lookups * 100 if lookups else 0
+            p50 = histogram_percentile(counters['get_latency'], 50)
+            p99 = histogram_percentile(counters['get_latency'], 99)
+            average_size = counters['bytes'] / counters['sets'] if counters['sets'] else 0
+            self.stdout.write(
+                f"  {name}: {counters['hits']} hits, {counters['misses']} misses "
+                f"({hit_rate:.1f}% hit rate), get p50 <= {p50}ms, p99 <= {p99}ms, "
+                f"{counters['sets']} sets averaging {average_size:.0f} B"
+            )
@@ -0,0 +1,117 @@
+import signal
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import close_old_connections, connection
+from gallery.media.pool import variant_pool
+from gallery.media.queue import (
+    claim_next,
+    enqueue_stale,
+    release_stale_jobs,
+    run_job,
+    worker_name,
+)
+
+
+class Command(BaseCommand):
+    help = 'Run queued thumbnail, gallery image and video frame jobs'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--concurrency',
+            type=int,
+            default=getattr(settings, 'MEDIA_WORKER_CONCURRENCY', 2),
+            help='Jobs run at once; their images share the process pool '
+                 '(default: MEDIA_WORKER_CONCURRENCY)'
+        )
+        parser.add_argument(
+            '--pool-workers',
+            type=int,
+            default=None,
+            help='Image resizing processes, 0 to resize in the job threads '
+                 '(default: MEDIA_POOL_WORKERS)'
+        )
+        parser.add_argument(
+            '--enqueue-stale',
+            action='store_true',
+            help='First queue every upload whose variants are missing or were '
+                 'rendered with an older variant spec'
+        )
+        parser.add_argument(
+            '--once',
+            action='store_true',
+            help='Exit once no job is due instead of waiting for new ones'
+        )
+        parser.add_argument(
+            '--poll-interval',
+            type=float,
+            default=2.0,
+            help='Seconds an idle worker waits before looking again (default: 2)'
+        )
+
+    def handle(self, *args, **options):
+        if options['concurrency'] < 1:
+            raise CommandError('--concurrency must be at least 1')
+
+        if options['pool_workers'] is not None:
+            variant_pool.workers = options['pool_workers']
+
+        self.stdout.write("MEDIA PROCESSING WORKER")
+        self.stdout.write("=" * 50)
+        self.stdout.write(
+            f"{options['concurrency']} job threads, {variant_pool.workers} resizing processes"
+        )
+
+        if options['enqueue_stale']:
+            self.stdout.write(f"Queued {enqueue_stale()} uploads with outdated variants")
+
+        released = release_stale_jobs()
+        if released:
+            self.stdout.write(self.style.WARNING(f"Released {released} jobs left by a dead worker"))
+
+        self.stop = threading.Event()
+        self.counts = {'done': 0, 'failed': 0}
+        self.counts_lock = threading.Lock()
+        if not options['once']:
+            # Finish the jobs in hand, then exit
+            for signum in (signal.SIGINT, signal.SIGTERM):
+                signal.signal(signum, lambda *args: self.stop.set())
+
+        start_time = time.time()
+        with ThreadPoolExecutor(max_workers=options['concurrency']) as pool:
+            workers = [
+                pool.submit(self.work, f"{worker_name()}:{index}", options)
+                for index in range(options['concurrency'])
+            ]
+            try:
+                for worker in workers:
+                    worker.result()
+            finally:
+                variant_pool.shutdown()
+
+        duration = time.time() - start_time
+        self.stdout.write(self.style.SUCCESS(
+            f"\nProcessed {self.counts['done']} jobs, {self.counts['failed']} failed "
+            f"attempts in {duration:.2f}s"
+        ))
+
+    def work(self, name, options):
+        try:
+            while not self.stop.is_set():
+                close_old_connections()
+                job = claim_next(name)
+                if job is None:
+                    if options['once']:
+                        return
+                    self.stop.wait(options['poll_interval'])
+                    continue
+
+                self.stdout.write(f"{name}: {job}")
+                succeeded = run_job(job)
+                with self.counts_lock:
+                    self.counts['done' if succeeded else 'failed'] += 1
+        finally:
+            # Each thread has its own connection
+            connection.close()
@@ -1,11 +1,34 @@
 import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from django.core.management.base import BaseCommand
 from django.core.cache import cache
-from gallery.models import PortfolioItem, Category, Service, BusinessInfo
-from gallery.serializers import PortfolioItemSerializer, CategorySerializer, ServiceSerializer, BusinessInfoSerializer
+from django.db import connection
+from django.http import QueryDict
+from gallery.models import PortfolioItem, Category, Service
+from gallery.caching.fragments import (
+    item_base_key,
+    item_fragment_key,
+    item_versions,
+    store_item_fragments,
+)
+from gallery.caching.generations import fold_generations, get_generation
+from gallery.caching.hotlist import hotlist
+from gallery.caching.keys import canonical_params, key_family, keyspace_counter, page_cache_key
+from gallery.caching.singleflight import stale_key
+from gallery.caching.swr import wrap
+from gallery.caching.tiered import response_cache
+from gallery.caching.ttl import ttl_policy
+from gallery.caching.warming import make_viewset, warm_entry
+from gallery.viewsets import PortfolioItemViewSet, paginate_queryset
+
+# Search terms warmed when --search is not given
+COMMON_SEARCHES = ['interior', 'exterior', 'painting', 'bathroom', 'kitchen']
+
+# Items serialized per fragment task
+FRAGMENT_BATCH_SIZE = 100
 
 class Command(BaseCommand):
-    help = 'Warm up the cache with frequently accessed data'
+    help = 'Warm up the cache with exactly the entries the public viewsets read'
 
     def add_arguments(self, parser):
         parser.add_argument(
@@ -13,116 +36,228 @@ class Command(BaseCommand):
             action='store_true',
             help='Clear existing cache before warming'
         )
-    
+        parser.add_argument(
+            '--concurrency',
+            type=int,
+            default=4,
+            help='Worker threads building pages and fragments (default: 4)'
+        )
+        parser.add_argument(
+            '--only-missing',
+            action='store_true',
+            help='Skip pages and fragments already cached for the current generation'
+        )
+        parser.add_argument(
+            '--search',
+            action='append',
+            help='Search term to warm (repeatable; default: a few common terms)'
+        )
+        parser.add_argument(
+            '--from-hotlist',
+            action='store_true',
+            help='Warm only the most requested pages and items, hottest first'
+        )
+        parser.add_argument(
+            '--hotlist-size',
+            type=int,
+            default=200,
+            help='Entries taken from the hotlist with --from-hotlist (default: 200)'
+        )
+
     def handle(self, *args, **options):
         start_time = time.time()
-        
+
         if options['clear']:
             self.stdout.write("Clearing existing cache...")
             cache.clear()
 
         self.stdout.write("Starting cache warming...")
+        self.only_missing = options['only_missing']
+        # Pages are written under the generation current at start and item
+        # fragments under the versions read before each batch; an edit
+        # during the run makes these entries unreachable, not wrong
+        self.generation = get_generation('portfolio')
 
-        # Warm portfolio items cache
-        self.warm_portfolio_cache()
-
-        # Warm categories cache
-        self.warm_categories_cache()
+        if options['from_hotlist']:
+            tasks = [
+                (f"{action_name} {self.describe(params)} (score {score:.1f})",
+                 self.warm_hot_entry, action_name, params)
+                for action_name, params, score in hotlist.top(options['hotlist_size'])
+            ]
+            if not tasks:
+                self.stdout.write(self.style.WARNING("Hotlist is empty; nothing to warm"))
+        else:
+            tasks = [
+                (f"items {ids[0]}-{ids[-1]}", self.warm_fragments, ids)
+                for ids in self.fragment_batches()
+            ]
+            combinations = self.page_combinations(options['search'] or COMMON_SEARCHES)
+            tasks += [
+                (f"{action_name} {self.describe(params)}", self.warm_pages, action_name, params)
+                for action_name, params in combinations
+            ]
 
-        # Warm services cache
-        self.warm_services_cache()
+        totals = {'written': 0, 'skipped': 0}
+        with ThreadPoolExecutor(max_workers=options['concurrency']) as executor:
+            futures = {executor.submit(self.run_task, *task[1:]): task[0] for task in tasks}
+            for done, future in enumerate(as_completed(futures), 1):
+                label = futures[future]
+                try:
+                    written, skipped, elapsed = future.result()
+                except Exception as e:
+                    self.stdout.write(self.style.ERROR(f"[{done}/{len(tasks)}] {label}: {e}"))
+                    continue
+                totals['written'] += written
+                totals['skipped'] += skipped
+                self.stdout.write(
+                    f"[{done}/{len(tasks)}] {label}: {written} written, "
+                    f"{skipped} skipped ({elapsed * 1000:.0f}ms)"
+                )
 
-        # Warm business info cache
-        self.warm_business_cache()
-
-        # Warm search/filter caches
-        self.warm_search_caches()
-
-        end_time = time.time()
-        duration = end_time - start_time
-        
+        duration = time.time() - start_time
         self.stdout.write(
             self.style.SUCCESS(
-                f"Cache warming completed in {duration:.2f} seconds"
+                f"Cache warming completed in {duration:.2f} seconds "
+                f"({totals['written']} entries written, {totals['skipped']} already cached)"
             )
         )
-    
-    def warm_portfolio_cache(self):
-        """Warm portfolio items cache"""
-        self.stdout.write("Warming portfolio cache...")
-
-        # Main portfolio list
-        items = PortfolioItem.objects.select_related('category', 'service').order_by('-upload_date')[:50]
-        serializer = PortfolioItemSerializer(items, many=True, context={})
-
-        cache_data = {
-            'portfolio_items': serializer.data,
-            'pagination': {
-                'page': 1,
-                'page_size': 50,
-                'total_items': PortfolioItem.objects.count(),
-                'total_pages': 1,
-                'has_next': False,
-                'has_previous': False
+
+    def describe(self, params):
+        filters = [
+            f"{name}={value}" for name, value in params.items()
+            if name != 'page_size' and (name, value) != ('page', 1)
+        ]
+        return ' '.join(filters) or '(all)'
+
+    def run_task(self, task, *args):
+        """Run one task in a pool thread and time it"""
+        start = time.perf_counter()
+        try:
+            written, skipped = task(*args)
+        finally:
+            # Pool threads open their own connection; don't leak it
+            connection.close()
+        return written, skipped, time.perf_counter() - start
+
+    def fragment_batches(self):
+        ids = list(PortfolioItem.objects.order_by('id').values_list('id', flat=True))
+        return [ids[i:i + FRAGMENT_BATCH_SIZE] for i in range(0, len(ids), FRAGMENT_BATCH_SIZE)]
+
+    def page_combinations(self, search_terms):
+        """
+        Every (action, canonical params) whose pages a visitor can reach
+        through the navigation: all items, each category and service alone,
+        the category/service pairs that have items, and the search terms.
+        The combined endpoint takes the same filters and terms, so each is
+        warmed for it as well.
+        """
+        categories = list(Category.objects.values_list('name', flat=True))
+        services = list(Service.objects.values_list('name', flat=True))
+        pairs = (
+            PortfolioItem.objects.filter(category__isnull=False, service__isnull=False)
+            .values_list('category__name', 'service__name')
+            .order_by()
+            .distinct()
+        )
+
+        combinations = [self.params('list'), self.params('filter'), self.params('combined')]
+        for category in categories:
+            combinations.append(self.params('list', category=category))
+            combinations.append(self.params('filter', category=category))
+            combinations.append(self.params('combined', category=category))
+            combinations.append(self.params('by_category', category=category))
+        for service in services:
+            combinations.append(self.params('filter', service=service))
+            combinations.append(self.params('combined', service=service))
+        for category, service in pairs:
+            combinations.append(self.params('filter', category=category, service=service))
+            combinations.append(self.params('combined', category=category, service=service))
+        for term in search_terms:
+            combinations.append(self.params('search', q=term))
+            combinations.append(self.params('combined', q=term))
+        return combinations
+
+    def params(self, action_name, **filters):
+        """(action, canonical params for page 1) with the view's page size defaults"""
+        viewset = PortfolioItemViewSet
+        if action_name == 'list':
+            sizes = {
+                'default_page_size': viewset.list_default_page_size,
+                'max_page_size': viewset.list_max_page_size,
+            }
+        else:
+            sizes = {'default_page_size': viewset.default_page_size}
+        return action_name, canonical_params(QueryDict(''), action_name, **sizes, **filters)
+
+    def missing_keys(self, keys):
+        """The keys to write: all of them, or only those not cached with --only-missing"""
+        if not self.only_missing:
+            return keys
+        found = cache.get_many(keys)
+        return [key for key in keys if key not in found]
+
+    def warm_hot_entry(self, action_name, params):
+        """Rebuild one hotlist entry: a page with its items, or one item"""
+        if action_name == 'retrieve':
+            key = item_fragment_key(params['pk'], item_versions([params['pk']])[params['pk']])
+        else:
+            key = fold_generations(page_cache_key(action_name, params), self.generation)
+        if not self.missing_keys([key]):
+            return 0, 1
+        warm_entry(action_name, params, self.generation)
+        return 1, 0
+
+    def warm_fragments(self, item_ids):
+        """Serialize and store one batch of item fragments in a pipeline"""
+        versions = item_versions(item_ids)
+        keys = {item_fragment_key(item_id, versions[item_id]): item_id for item_id in item_ids}
+        missing = [keys[key] for key in self.missing_keys(list(keys))]
+        if missing:
+            start = time.perf_counter()
+            viewset = make_viewset('list')
+            built = viewset.build_item_fragments(missing)
+            store_item_fragments(built, versions, time.perf_counter() - start)
+            keyspace_counter.record_many('portfolio_item', [item_base_key(i) for i in missing])
+        return len(missing), len(item_ids) - len(missing)
+
+    def warm_pages(self, action_name, params):
+        """
+        Store every page of one filter combination, as build_page would,
+        from a single id query.
+        """
+        start = time.perf_counter()
+        viewset = make_viewset(action_name)
+        ids = list(viewset.filter_items(action_name, params).values_list('id', flat=True))
+
+        # Same paginator as the view, so pagination metadata matches exactly
+        pages = {}
+        page, total_pages = 1, 1
+        while page <= total_pages:
+            page_ids, pagination_data = paginate_queryset(ids, page, params['page_size'], None)
+            total_pages = pagination_data['total_pages']
+            base_key = page_cache_key(action_name, {**params, 'page': page})
+            pages[base_key] = {'ids': list(page_ids), 'pagination': pagination_data}
+            page += 1
+
+        versioned = {fold_generations(base_key, self.generation): base_key for base_key in pages}
+        to_write = [versioned[key] for key in self.missing_keys(list(versioned))]
+        if to_write:
+            # set_many is one pipeline on django_redis, so the hard TTL is
+            # jittered per combination; soft expiry is jittered per page so
+            # a warm run doesn't come back as one refresh wave
+            policy = ttl_policy(key_family(action_name))
+            compute_time = (time.perf_counter() - start) / len(pages)
+            entries = {
+                fold_generations(base_key, self.generation): wrap(
+                    pages[base_key], policy, compute_time
+                )
+                for base_key in to_write
+            }
+            response_cache.set_many(entries, policy.hard_ttl(), self.generation)
+            stale = {
+                stale_key(base_key): {**pages[base_key], 'generation': self.generation}
+                for base_key in to_write
             }
-        }
-
-        cache.set('portfolio_list_', cache_data, 300)
-        self.stdout.write(f"Cached {len(items)} portfolio items")
-
-    def warm_categories_cache(self):
-        """Warm categories cache"""
-        self.stdout.write("Warming categories cache...")
-
-        categories = Category.objects.all()
-        serializer = CategorySerializer(categories, many=True)
-        cache.set('categories_list_', serializer.data, 600)
-
-        self.stdout.write(f"Cached {len(categories)} categories")
-
-    def warm_services_cache(self):
-        """Warm services cache"""
-        self.stdout.write("Warming services cache...")
-
-        services = Service.objects.select_related('category').filter(is_active=True)
-        serializer = ServiceSerializer(services, many=True)
-        cache.set('services_list_', serializer.data, 600)
-
-        self.stdout.write(f"Cached {len(services)} services")
-
-    def warm_business_cache(self):
-        """Warm business info cache"""
-        self.stdout.write("Warming business info cache...")
-
-        business_info = BusinessInfo.objects.filter(is_active=True).first()
-        if business_info:
-            serializer = BusinessInfoSerializer(business_info)
-            cache.set('business_info_', serializer.data, 1800) # 30 minutes
-            self.stdout.write("Cached business info")
-    
-    def warm_search_caches(self):
-        """Warm common search/filter caches"""
-        self.stdout.write("Warming search/filter caches...")
-
-        # Common search terms
-        common_searches = ['interior', 'exterior', 'painting', 'bathroom', 'kitchen']
-
-        cached_count = 0
-        for term in common_searches:
-            items = PortfolioItem.objects.filter(
-                title__icontains=term
-            ).select_related('category', 'service')[:20]
-
-            if items.exists():
-                serializer = PortfolioItemSerializer(items, many=True, context={})
-                cache_key = f'portfolio_search_{term}_'
-                cache.set(cache_key, {
-                    'portfolio_items': serializer.data,
-                    'search_term': term,
-                    'total_results': items.count()
-                }, 300)
-                cached_count += 1
-                self.stdout.write(f"Cached search for '{term}' ({len(items)} results)")
-        
-        if cached_count == 0:
-            self.stdout.write("No search results to cache")
\ No newline at end of file
+            cache.set_many(stale, ttl_policy('stale').hard_ttl())
+            keyspace_counter.record_many(key_family(action_name), to_write)
+        return len(to_write), len(pages) - len(to_write)
@@ -0,0 +1,67 @@
+import hashlib
+import os
+from .pool import VARIANT_SPEC
+from .registry import image_slots
+
+CHUNK_SIZE = 1024 * 1024
+
+# Compared on every save without reading the file; sha256 is only
+# computed by the worker
+CHEAP_KEYS = ("name", "size", "mtime_ns", "spec")
+
+
+def content_hash(path):
+    digest = hashlib.sha256()
+    with open(path, "rb") as source:
+        for chunk in iter(lambda: source.read(CHUNK_SIZE), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def fingerprint(image_field, sha256=None):
+    """
+    What an image field's variants were rendered from: the stored name, the
+    file's size and mtime, the variant spec and (from the worker) a hash of
+    its bytes. None when the file is missing.
+    """
+    try:
+        stat = os.stat(image_field.path)
+    except OSError:
+        return None
+    return {
+        "name": image_field.name,
+        "size": stat.st_size,
+        "mtime_ns": stat.st_mtime_ns,
+        "spec": VARIANT_SPEC,
+        "sha256": sha256,
+    }
+
+
+def field_changed(instance, field_name):
+    """
+    True when the field's variants may be out of date: a new upload, a file
+    rewritten in place, a new variant spec, or a cleared field whose old
+    variants are still on disk. Costs a stat(), so saves that don't touch
+    images stay cheap.
+    """
+    image_field = getattr(instance, field_name)
+    record = (instance.media_fingerprints or {}).get(field_name)
+    if not image_field:
+        return record is not None
+    current = fingerprint(image_field)
+    if record is None or current is None:
+        return True
+    return any(record.get(key) != current[key] for key in CHEAP_KEYS)
+
+
+def images_changed(instance, update_fields=None):
+    """True when a save may need new variants for one of the instance's image slots"""
+    field_names = [slot.field_name for slot in image_slots(instance)]
+    if update_fields is not None and not set(field_names) & set(update_fields):
+        return False
+    return any(field_changed(instance, field_name) for field_name in field_names)
+
+
+def content_unchanged(record, sha256):
+    """The bytes and spec match what the stored variants were rendered from"""
+    return bool(record) and record.get("sha256") == sha256 and record.get("spec") == VARIANT_SPEC
@@ -0,0 +1,209 @@
+import hashlib
+import math
+import multiprocessing
+import os
+import resource
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from django.conf import settings
+from PIL import Image
+from .registry import COVER, IMAGE_VARIANTS
+
+# Sources are decoded and reduced to no less than this multiple of a
+# variant's size before the final LANCZOS pass, which keeps its quality
+REDUCING_GAP = 2.0
+# Bump when render_variants writes different pixels for the same variants.
+# Stored with every rendered image field (see fingerprints.py): a new spec
+# makes process_media --enqueue-stale render everything again.
+PIPELINE_VERSION = 2
+VARIANT_SPEC = "{}-{}".format(
+    PIPELINE_VERSION,
+    hashlib.sha1(repr((IMAGE_VARIANTS, REDUCING_GAP)).encode()).hexdigest()[:10],
+)
+
+DEFAULT_MEMORY_LIMIT_MB = 1024
+# Workers are replaced after this many images, returning what PIL's
+# allocator kept from large decodes
+DEFAULT_TASKS_PER_CHILD = 50
+
+
+def plan(variant, size):
+    """
+    How to cut a variant from a source of size: (scale, crop box in source
+    pixels, output size). Never enlarges.
+    """
+    width, height = size
+    box_width, box_height = variant.size
+    if variant.fit == COVER:
+        scale = min(max(box_width / width, box_height / height), 1)
+        crop_width, crop_height = min(width, box_width / scale), min(height, box_height / scale)
+    else:
+        scale = min(box_width / width, box_height / height, 1)
+        crop_width, crop_height = width, height
+    left, top = (width - crop_width) / 2, (height - crop_height) / 2
+    output = (max(1, round(crop_width * scale)), max(1, round(crop_height * scale)))
+    return scale, (left, top, left + crop_width, top + crop_height), output
+
+
+def variant_paths(source_name, output_dir):
+    """Where render_variants writes each of IMAGE_VARIANTS, in order"""
+    return [
+        os.path.join(output_dir, variant.directory, variant.filename(source_name))
+        for variant in IMAGE_VARIANTS
+    ]
+
+
+def source_box(crop, original_size, source_size):
+    """
+    A plan's crop box, in original pixels, mapped onto a source that was
+    drafted or resized from the original; None for the whole picture. Each
+    axis is scaled on its own, since rounding leaves the source's aspect
+    slightly off, and the box is clamped to the source's edges.
+    """
+    if crop == (0, 0, *original_size):
+        return None
+    x_factor = source_size[0] / original_size[0]
+    y_factor = source_size[1] / original_size[1]
+    left, top, right, bottom = crop
+    return (
+        max(0, left * x_factor),
+        max(0, top * y_factor),
+        min(source_size[0], right * x_factor),
+        min(source_size[1], bottom * y_factor),
+    )
+
+
+def render_variants(source_path, source_name, output_dir):
+    """
+    Write every variant of one source image under output_dir; returns the
+    written paths. Runs in pool workers, so it takes plain paths and needs
+    nothing from Django.
+
+    The source is decoded once. JPEGs are decoded in draft mode, which lets
+    libjpeg scale by 1/2, 1/4 or 1/8 in the DCT domain, to no less than
+    REDUCING_GAP times the largest variant: a 24MP photo is never held at
+    full resolution. Each smaller variant is then resized from the largest
+    uncropped one before it (gallery, then thumbnail) instead of from the
+    source.
+    """
+    if not os.path.exists(source_path):
+        raise FileNotFoundError(f"Image file not found on disk: {source_path}")
+
+    paths = variant_paths(source_name, output_dir)
+    with Image.open(source_path) as img:
+        source_format = img.format
+        original_width, original_height = img.size
+
+        # Largest first, so each variant can be resized from the one before
+        plans = sorted(
+            (plan(variant, img.size) + (variant, path) for variant, path in zip(IMAGE_VARIANTS, paths)),
+            key=lambda planned: planned[0],
+            reverse=True,
+        )
+        draft_scale = min(plans[0][0] * REDUCING_GAP, 1)
+        img.draft(None, (math.ceil(original_width * draft_scale), math.ceil(original_height * draft_scale)))
+
+        # Always the whole picture: the decoded source or an uncropped variant
+        source = img
+        for scale, crop, size, variant, path in plans:
+            # With a reducing gap, resize() first shrinks by an integer
+            # factor with reduce() and only finishes with LANCZOS
+            resized = source.resize(
+                size,
+                Image.Resampling.LANCZOS,
+                box=source_box(crop, (original_width, original_height), source.size),
+                reducing_gap=REDUCING_GAP,
+            )
+
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            output_format = variant.output_format(source_format)
+            output = resized
+            # Convert to RGB if saving as JPEG (JPEG doesn't support transparency)
+            if output_format == "JPEG" and resized.mode in ["RGBA", "LA", "P"]:
+                output = resized.convert("RGB")
+            output.save(path, output_format, quality=variant.quality)
+            if output is not resized:
+                output.close()
+
+            if variant.fit == COVER:
+                resized.close()
+            else:
+                if source is not img:
+                    source.close()
+                source = resized
+        if source is not img:
+            source.close()
+    return paths
+
+
+def _limit_memory(limit_mb):
+    """Pool initializer: cap each worker's address space"""
+    if limit_mb:
+        limit = limit_mb * 1024 * 1024
+        resource.setrlimit(resource.RLIMIT_AS, (limit, limit))
+
+
+class VariantPool:
+    """
+    Worker processes for render_variants, so one item's images resize on
+    separate cores and concurrent jobs share the machine instead of each
+    running single-threaded under the GIL.
+
+    Each worker's address space is capped at memory_limit_mb: an image that
+    would need more fails its job with MemoryError (and is retried) instead
+    of pushing the host into swap. A worker that dies outright breaks the
+    executor; the pool is rebuilt for the next submission. With workers=0
+    everything runs in the calling thread.
+    """
+
+    def __init__(self, workers, memory_limit_mb=DEFAULT_MEMORY_LIMIT_MB,
+                 tasks_per_child=DEFAULT_TASKS_PER_CHILD):
+        self.workers = workers
+        self.memory_limit_mb = memory_limit_mb
+        self.tasks_per_child = tasks_per_child
+        self._executor = None
+        self._lock = threading.Lock()
+
+    def _get_executor(self):
+        with self._lock:
+            if self._executor is None:
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self.workers,
+                    # Not fork: the caller has threads (process_media's
+                    # workers, the invalidation bus) holding locks
+                    mp_context=multiprocessing.get_context("forkserver"),
+                    initializer=_limit_memory,
+                    initargs=(self.memory_limit_mb,),
+                    max_tasks_per_child=self.tasks_per_child,
+                )
+            return self._executor
+
+    def render_many(self, tasks):
+        """Run render_variants(*task) for every task; returns all written paths"""
+        if not self.workers:
+            return [path for task in tasks for path in render_variants(*task)]
+
+        executor = self._get_executor()
+        try:
+            futures = [executor.submit(render_variants, *task) for task in tasks]
+            return [path for future in futures for path in future.result()]
+        except BrokenProcessPool:
+            with self._lock:
+                if self._executor is executor:
+                    self._executor = None
+            executor.shutdown(wait=False, cancel_futures=True)
+            raise
+
+    def shutdown(self):
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown()
+
+
+variant_pool = VariantPool(
+    getattr(settings, "MEDIA_POOL_WORKERS", os.cpu_count() or 1),
+    memory_limit_mb=getattr(settings, "MEDIA_WORKER_MEMORY_LIMIT_MB", DEFAULT_MEMORY_LIMIT_MB),
+    tasks_per_child=getattr(settings, "MEDIA_POOL_TASKS_PER_CHILD", DEFAULT_TASKS_PER_CHILD),
+)
@@ -0,0 +1,203 @@
+import os
+import socket
+import traceback
+from datetime import timedelta
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+from gallery.models import (
+    MediaJob,
+    PortfolioImage,
+    PortfolioItem,
+    PortfolioVideo,
+    ProcessingStatus,
+)
+from .fingerprints import images_changed
+from .registry import IMAGE_SLOTS
+from .variants import process_images, process_video
+
+DEFAULT_MAX_ATTEMPTS = 3
+# First retry after this many seconds, doubling with every further attempt
+DEFAULT_RETRY_DELAY = 30
+# A job still "processing" after this long belongs to a worker that died
+DEFAULT_JOB_TIMEOUT = 60 * 10
+# Pending jobs looked at per claim; others may be taking the first ones
+CLAIM_CANDIDATES = 10
+
+ASSET_MODELS = {
+    MediaJob.AssetType.ITEM: PortfolioItem,
+    MediaJob.AssetType.IMAGE: PortfolioImage,
+    MediaJob.AssetType.VIDEO: PortfolioVideo,
+}
+ASSET_TYPES = {model: asset_type for asset_type, model in ASSET_MODELS.items()}
+PROCESSORS = {
+    MediaJob.AssetType.ITEM: process_images,
+    MediaJob.AssetType.IMAGE: process_images,
+    MediaJob.AssetType.VIDEO: process_video,
+}
+
+
+def worker_name():
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+
+def retry_delay(attempts):
+    """Seconds before retrying a job that has failed attempts times"""
+    base = getattr(settings, "MEDIA_JOB_RETRY_DELAY", DEFAULT_RETRY_DELAY)
+    return base * 2 ** max(0, attempts - 1)
+
+
+def set_asset_status(asset_type, asset_id, status):
+    # update(), not save(): a save would enqueue the asset again
+    ASSET_MODELS[asset_type].objects.filter(pk=asset_id).update(
+        processing_status=status
+    )
+
+
+def enqueue(instance):
+    """
+    Queue variant generation for a saved PortfolioItem, PortfolioImage or
+    PortfolioVideo and mark it pending.
+
+    The job row is written once the caller's transaction commits (right
+    away outside one), so workers never claim a job for an upload that is
+    not visible yet, and a rollback queues nothing. A job already waiting
+    for the asset covers this save too.
+    """
+    asset_type = ASSET_TYPES[type(instance)]
+    asset_id = instance.pk
+
+    def create_job():
+        waiting = MediaJob.objects.filter(
+            asset_type=asset_type, asset_id=asset_id, status=MediaJob.Status.PENDING
+        ).exists()
+        if not waiting:
+            MediaJob.objects.create(
+                asset_type=asset_type,
+                asset_id=asset_id,
+                max_attempts=getattr(settings, "MEDIA_JOB_MAX_ATTEMPTS", DEFAULT_MAX_ATTEMPTS),
+            )
+
+    transaction.on_commit(create_job)
+    set_asset_status(asset_type, asset_id, ProcessingStatus.PENDING)
+    # The upload response is serialized from this instance
+    instance.processing_status = ProcessingStatus.PENDING
+
+
+def enqueue_stale():
+    """
+    Queue every item and image whose variants predate the current variant
+    spec or source file; returns how many were queued. Run after changing
+    IMAGE_VARIANTS, so existing uploads get the new sizes.
+    """
+    queued = 0
+    for model in [PortfolioItem, PortfolioImage]:
+        slots = IMAGE_SLOTS[model._meta.label]
+        columns = ["pk", "media_fingerprints"] + [slot.field_name for slot in slots]
+        for instance in model.objects.only(*columns).iterator():
+            if images_changed(instance):
+                enqueue(instance)
+                queued += 1
+    return queued
+
+
+def release_stale_jobs():
+    """Put jobs whose worker died mid-run back in the queue"""
+    timeout = getattr(settings, "MEDIA_JOB_TIMEOUT", DEFAULT_JOB_TIMEOUT)
+    cutoff = timezone.now() - timedelta(seconds=timeout)
+    stale = MediaJob.objects.filter(
+        status=MediaJob.Status.PROCESSING, locked_at__lt=cutoff
+    )
+    failed = stale.filter(attempts__gte=F("max_attempts")).update(
+        status=MediaJob.Status.FAILED,
+        last_error="Worker timed out",
+        locked_at=None,
+    )
+    released = stale.update(
+        status=MediaJob.Status.PENDING, run_after=timezone.now(), locked_at=None
+    )
+    return released + failed
+
+
+def claim_next(worker):
+    """
+    Take the next due job, or None. Each claim is a conditional UPDATE, so
+    concurrent workers (threads here, other processes or hosts) never run
+    the same job without needing SELECT ... FOR UPDATE SKIP LOCKED.
+    """
+    now = timezone.now()
+    candidates = MediaJob.objects.filter(
+        status=MediaJob.Status.PENDING, run_after__lte=now
+    ).values_list("id", flat=True)[:CLAIM_CANDIDATES]
+
+    for job_id in candidates:
+        claimed = MediaJob.objects.filter(
+            id=job_id, status=MediaJob.Status.PENDING
+        ).update(
+            status=MediaJob.Status.PROCESSING,
+            locked_at=now,
+            locked_by=worker,
+            attempts=F("attempts") + 1,
+            updated_at=now,
+        )
+        if claimed:
+            return MediaJob.objects.get(id=job_id)
+    return None
+
+
+def run_job(job):
+    """Generate the job's variants; returns True when it succeeded"""
+    from gallery.signals import invalidate_related_caches
+
+    instance = ASSET_MODELS[job.asset_type].objects.filter(pk=job.asset_id).first()
+    if instance is None:
+        # Deleted after the upload; its files went with it
+        finish(job, MediaJob.Status.DONE)
+        return True
+
+    try:
+        PROCESSORS[job.asset_type](instance)
+    except Exception as e:
+        print(f"Error processing {job}: {e}")
+        error = traceback.format_exc()
+        if job.attempts < job.max_attempts:
+            delay = retry_delay(job.attempts)
+            finish(
+                job,
+                MediaJob.Status.PENDING,
+                last_error=error,
+                run_after=timezone.now() + timedelta(seconds=delay),
+            )
+            print(f"Retrying {job} in {delay}s (attempt {job.attempts}/{job.max_attempts})")
+            return False
+        finish(job, MediaJob.Status.FAILED, last_error=error)
+        asset_status = ProcessingStatus.FAILED
+    else:
+        finish(job, MediaJob.Status.DONE, last_error="")
+        asset_status = ProcessingStatus.READY
+
+    # A newer upload of the same asset is still queued; it stays pending
+    newer = (
+        MediaJob.objects.filter(
+            asset_type=job.asset_type,
+            asset_id=job.asset_id,
+            status__in=[MediaJob.Status.PENDING, MediaJob.Status.PROCESSING],
+        )
+        .exclude(id=job.id)
+        .exists()
+    )
+    if not newer:
+        set_asset_status(job.asset_type, job.asset_id, asset_status)
+        instance.processing_status = asset_status
+
+    # Cached pages and fragments carry the status and the variant URLs
+    invalidate_related_caches(instance)
+    return asset_status == ProcessingStatus.READY
+
+
+def finish(job, status, **fields):
+    MediaJob.objects.filter(id=job.id).update(
+        status=status, locked_at=None, updated_at=timezone.now(), **fields
+    )
+    job.status = status
@@ -0,0 +1,115 @@
+import os
+import posixpath
+
+CONTAIN = "contain"  # scaled to fit inside the box
+COVER = "cover"  # scaled to fill the box, centre-cropped
+# Output as JPEG when the upload is a JPEG, PNG otherwise
+SOURCE_FORMAT = "source"
+
+FORMAT_EXTENSIONS = {"JPEG": ".jpg", "PNG": ".png", "WEBP": ".webp"}
+
+
+class Variant:
+    """
+    One generated image: its box, how the source is fitted into it, the
+    output format and quality, and where it is written relative to the
+    upload's variant directory (directory/prefix_name).
+    """
+
+    def __init__(self, name, size, fit=CONTAIN, format=SOURCE_FORMAT, quality=85,
+                 directory=None, prefix=None):
+        self.name = name
+        self.size = size
+        self.fit = fit
+        self.format = format
+        self.quality = quality
+        self.directory = directory or name
+        self.prefix = name if prefix is None else prefix
+
+    def __repr__(self):
+        return (
+            f"Variant({self.name!r}, {self.size!r}, fit={self.fit!r}, format={self.format!r}, "
+            f"quality={self.quality!r}, directory={self.directory!r}, prefix={self.prefix!r})"
+        )
+
+    def output_format(self, source_format):
+        if self.format != SOURCE_FORMAT:
+            return self.format
+        return "JPEG" if source_format in ["JPEG", "JPG"] else "PNG"
+
+    def filename(self, source_name):
+        """thumb_photo.jpg for photo.jpg; the extension follows a fixed format"""
+        stem, extension = os.path.splitext(os.path.basename(source_name))
+        if self.format != SOURCE_FORMAT:
+            extension = FORMAT_EXTENSIONS[self.format]
+        prefix = f"{self.prefix}_" if self.prefix else ""
+        return f"{prefix}{stem}{extension}"
+
+    def path(self, base_dir, source_name):
+        """Path relative to MEDIA_ROOT, with forward slashes as in FileField names"""
+        return posixpath.join(base_dir, self.directory, self.filename(source_name))
+
+
+class ImageSlot:
+    """An uploaded image field and the directory its variants go under"""
+
+    def __init__(self, field_name, base_dir, label):
+        self.field_name = field_name
+        self.base_dir = base_dir
+        self.label = label
+
+
+# Every generated image, declared once. The renderer (pool.py), the
+# serializers' URLs and the file cleanup on delete all read these, so a new
+# size is added here alone; `manage.py process_media --enqueue-stale` then
+# renders it for existing uploads. Nothing here imports Django: pool
+# workers load this module on their own.
+IMAGE_VARIANTS = [
+    Variant("thumb", (300, 300), quality=85, directory="thumbnails"),
+    Variant("gallery", (800, 600), quality=90, directory="gallery"),
+]
+VARIANTS_BY_NAME = {variant.name: variant for variant in IMAGE_VARIANTS}
+
+# Image fields of each model ("app_label.ModelName") that get IMAGE_VARIANTS
+IMAGE_SLOTS = {
+    "gallery.PortfolioItem": [
+        ImageSlot("image", "portfolio", "main"),
+        ImageSlot("before_image", "portfolio/before", "before"),
+        ImageSlot("after_image", "portfolio/after", "after"),
+    ],
+    "gallery.PortfolioImage": [
+        ImageSlot("image", "portfolio/images", "portfolio_image"),
+    ],
+}
+
+# A frame of each video, stored in PortfolioVideo.thumbnail
+VIDEO_DIR = "portfolio/videos"
+VIDEO_THUMBNAIL = Variant(
+    "video_thumb", (300, 300), format="JPEG", quality=85, directory="thumbnails", prefix=""
+)
+
+
+def image_slots(instance):
+    return IMAGE_SLOTS.get(instance._meta.label, [])
+
+
+def variant_path(instance, field_name, variant_name):
+    """Relative path of one variant of an image field; None without an upload"""
+    image_field = getattr(instance, field_name)
+    if not image_field:
+        return None
+    slot = next(slot for slot in image_slots(instance) if slot.field_name == field_name)
+    return VARIANTS_BY_NAME[variant_name].path(slot.base_dir, image_field.name)
+
+
+def variant_files(instance):
+    """
+    Relative paths of every variant generated for the instance's current
+    uploads, whether or not they exist yet
+    """
+    return [
+        variant.path(slot.base_dir, getattr(instance, slot.field_name).name)
+        for slot in image_slots(instance)
+        if getattr(instance, slot.field_name)
+        for variant in IMAGE_VARIANTS
+    ]
@@ -0,0 +1,129 @@
+import os
+import cv2
+from django.conf import settings
+from PIL import Image
+from .fingerprints import content_hash, content_unchanged, fingerprint
+from .pool import plan, render_variants, variant_pool, variant_paths
+from .registry import IMAGE_VARIANTS, VIDEO_DIR, VIDEO_THUMBNAIL, image_slots
+
+
+def image_task(image_field, base_dir):
+    """render_variants arguments for one upload"""
+    return (
+        image_field.path,
+        image_field.name,
+        os.path.join(settings.MEDIA_ROOT, base_dir),
+    )
+
+
+def report(image_type, paths):
+    for path in paths:
+        print(f"Generated {image_type} variant: {path}")
+
+
+def generate_image_variants(image_field, base_dir, image_type):
+    """
+    Write every registry variant of one upload in this process. Raises on a
+    missing or unreadable file so the job can be retried.
+    """
+    paths = render_variants(*image_task(image_field, base_dir))
+    report(image_type, paths)
+    return paths
+
+
+def generate_video_thumbnail(video_field):
+    """Save the VIDEO_THUMBNAIL of a frame of the video; returns its path relative to MEDIA_ROOT"""
+    if not os.path.exists(video_field.path):
+        raise FileNotFoundError(f"Video file not found on disk: {video_field.path}")
+
+    # Open video file with OpenCV
+    cap = cv2.VideoCapture(video_field.path)
+    if not cap.isOpened():
+        raise ValueError(f"Error opening video file: {video_field.path}")
+
+    try:
+        # Get total number of frames
+        total_frames = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+
+        # Calculate frame position (use 1 second or 10% of video, whichever is smaller)
+        fps = cap.get(cv2.CAP_PROP_FPS) or 30  # Default to 30 fps if not available
+        frame_position = min(int(fps), total_frames // 10) if total_frames > 0 else 0
+
+        cap.set(cv2.CAP_PROP_POS_FRAMES, frame_position)
+        ret, frame = cap.read()
+
+        if not ret or frame is None:
+            # If frame extraction failed, try middle of video
+            cap.set(cv2.CAP_PROP_POS_FRAMES, total_frames // 2 if total_frames > 0 else 0)
+            ret, frame = cap.read()
+    finally:
+        cap.release()
+
+    if not ret or frame is None:
+        raise ValueError(f"Error reading frame from video: {video_field.path}")
+
+    # Convert BGR to RGB (OpenCV uses BGR, PIL uses RGB)
+    pil_image = Image.fromarray(cv2.cvtColor(frame, cv2.COLOR_BGR2RGB))
+    _, crop, size = plan(VIDEO_THUMBNAIL, pil_image.size)
+    pil_image = pil_image.resize(size, Image.Resampling.LANCZOS, box=crop)
+
+    thumbnail = VIDEO_THUMBNAIL.path(VIDEO_DIR, video_field.name)
+    thumbnail_path = os.path.join(settings.MEDIA_ROOT, thumbnail)
+    os.makedirs(os.path.dirname(thumbnail_path), exist_ok=True)
+    pil_image.save(thumbnail_path, VIDEO_THUMBNAIL.output_format(None), quality=VIDEO_THUMBNAIL.quality)
+
+    print(f"Generated video thumbnail: {thumbnail_path}")
+    return thumbnail
+
+
+def remove_variants(base_dir, source_name):
+    """Delete the variants rendered for an upload that has been replaced"""
+    for variant in IMAGE_VARIANTS:
+        path = os.path.join(settings.MEDIA_ROOT, variant.path(base_dir, source_name))
+        if os.path.exists(path):
+            os.remove(path)
+            print(f"Deleted outdated variant: {path}")
+
+
+def process_images(instance):
+    """
+    Render the variants of each of the instance's image slots whose bytes
+    or variant spec changed since they were last rendered, all in
+    parallel, then store the new fingerprints. A slot whose hash still
+    matches and whose variants are on disk (the file was only touched, or
+    the job was queued by an older fingerprint) is skipped; variants of a
+    replaced or cleared upload are deleted.
+    """
+    records = dict(instance.media_fingerprints or {})
+    tasks = []
+    for slot in image_slots(instance):
+        image_field = getattr(instance, slot.field_name)
+        record = records.get(slot.field_name)
+        if record and record.get("name") != (image_field.name if image_field else None):
+            remove_variants(slot.base_dir, record["name"])
+        if not image_field:
+            records.pop(slot.field_name, None)
+            continue
+        if not os.path.exists(image_field.path):
+            raise FileNotFoundError(f"Image file not found on disk: {image_field.path}")
+
+        sha256 = content_hash(image_field.path)
+        task = image_task(image_field, slot.base_dir)
+        rendered = all(os.path.exists(path) for path in variant_paths(*task[1:]))
+        if content_unchanged(record, sha256) and rendered:
+            print(f"Skipped {slot.label} variants: source unchanged")
+        else:
+            tasks.append(task)
+        records[slot.field_name] = fingerprint(image_field, sha256)
+
+    report(type(instance).__name__, variant_pool.render_many(tasks))
+    # update(), not save(): a save would re-enter the post_save handler
+    type(instance).objects.filter(pk=instance.pk).update(media_fingerprints=records)
+    instance.media_fingerprints = records
+
+
+def process_video(video):
+    thumbnail = generate_video_thumbnail(video.video)
+    # update(), not save(): a save would re-enter the post_save handler
+    type(video).objects.filter(pk=video.pk).update(thumbnail=thumbnail)
+    video.thumbnail.name = thumbnail
@@ -0,0 +1,23 @@
+from .caching.invalidation import invalidation_collector
+
+SAFE_METHODS = ("GET", "HEAD", "OPTIONS")
+
+
+class InvalidationBatchMiddleware:
+    """
+    Flush cache invalidations once per write request.
+
+    Writes that run in autocommit (the admin API endpoints) would otherwise
+    flush after every save; batching them here means a request that creates
+    an item and its images invalidates each tag and generation once.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if request.method in SAFE_METHODS:
+            return self.get_response(request)
+
+        with invalidation_collector.batch():
+            return self.get_response(request)
@@ -0,0 +1,23 @@
+# Generated by Django 5.2.5 on 2026-10-17 23:38
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('gallery', '0002_media_jobs'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='portfolioimage',
+            name='media_fingerprints',
+            field=models.JSONField(blank=True, default=dict, editable=False, help_text='Per image field: what its generated variants were rendered from'),
+        ),
+        migrations.AddField(
+            model_name='portfolioitem',
+            name='media_fingerprints',
+            field=models.JSONField(blank=True, default=dict, editable=False, help_text='Per image field: what its generated variants were rendered from'),
+        ),
+    ]
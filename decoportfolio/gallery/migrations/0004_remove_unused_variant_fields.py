@@ -0,0 +1,37 @@
+# Generated by Django 5.2.5 on 2026-10-17 23:42
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('gallery', '0003_media_fingerprints'),
+    ]
+
+    operations = [
+        migrations.RemoveField(
+            model_name='portfolioimage',
+            name='gallery_image',
+        ),
+        migrations.RemoveField(
+            model_name='portfolioimage',
+            name='thumbnail',
+        ),
+        migrations.RemoveField(
+            model_name='portfolioitem',
+            name='after_thumbnail',
+        ),
+        migrations.RemoveField(
+            model_name='portfolioitem',
+            name='before_thumbnail',
+        ),
+        migrations.RemoveField(
+            model_name='portfolioitem',
+            name='gallery_image',
+        ),
+        migrations.RemoveField(
+            model_name='portfolioitem',
+            name='thumbnail',
+        ),
+    ]
@@ -7,11 +7,58 @@ from django.contrib.auth.models import (
 from django.db import models
 from django.utils import timezone
 from django.utils.crypto import get_random_string
-from imagekit.models import ProcessedImageField
-from imagekit.processors import ResizeToFill, ResizeToFit, ResizeToCover
 from category.models import Category
 
 
+class ProcessingStatus(models.TextChoices):
+    """Where an upload's thumbnails and gallery images are (see MediaJob)"""
+
+    PENDING = "pending", "Pending"
+    READY = "ready", "Ready"
+    FAILED = "failed", "Failed"
+
+
+def media_fingerprints_field():
+    return models.JSONField(
+        default=dict,
+        blank=True,
+        editable=False,
+        help_text="Per image field: what its generated variants were rendered from",
+    )
+
+
+def processing_status_field():
+    return models.CharField(
+        max_length=10,
+        choices=ProcessingStatus.choices,
+        default=ProcessingStatus.READY,
+        help_text="Generated thumbnails and gallery images are ready",
+    )
+
+
+class MediaAsset(models.Model):
+    """
+    Base for uploads the process_media worker fills in. The worker writes
+    worker_fields with update(); saving an existing row writes every other
+    field only, so an edit loaded before the worker finished can't put the
+    old values back.
+    """
+
+    worker_fields = ("processing_status", "media_fingerprints")
+
+    class Meta:
+        abstract = True
+
+    def save(self, *args, **kwargs):
+        if not self._state.adding and kwargs.get("update_fields") is None:
+            kwargs["update_fields"] = [
+                field.name
+                for field in self._meta.concrete_fields
+                if not field.primary_key and field.name not in self.worker_fields
+            ]
+        return super().save(*args, **kwargs)
+
+
 class FamilyMemberManager(BaseUserManager):
     """Manager for FamilyMember model"""
 
@@ -208,7 +255,7 @@ class Service(models.Model):
         return self.name
 
 
-class PortfolioItem(models.Model):
+class PortfolioItem(MediaAsset):
     title = models.CharField(max_length=200)
     description = models.TextField(blank=True)
     category = models.ForeignKey(
@@ -230,57 +277,20 @@ class PortfolioItem(models.Model):
         null=True,
     )
 
-    # Thumbnails (auto-generated from main image)
-    thumbnail = ProcessedImageField(
-        upload_to="portfolio/thumbnails/",
-        processors=[ResizeToFill(300, 300)],
-        format="JPEG",
-        options={"quality": 85},
-        blank=True,
-        null=True,
-    )
-
-    # Gallery image (optimized for gallery display)
-    gallery_image = ProcessedImageField(
-        upload_to="portfolio/gallery/",
-        processors=[ResizeToFit(800, 600)],
-        format=f"WebP",
-        options={"quality": 90},
-        blank=True,
-        null=True,
-    )
-
     # Before/After images (optional)
     before_image = models.ImageField(
         upload_to="portfolio/before/", blank=True, null=True
     )
     after_image = models.ImageField(upload_to="portfolio/after/", blank=True, null=True)
 
-    # Before/After thumbnails (auto-generated)
-    before_thumbnail = ProcessedImageField(
-        upload_to="portfolio/before/thumbnails/",
-        processors=[ResizeToFill(300, 300)],
-        format="JPEG",
-        options={"quality": 85},
-        blank=True,
-        null=True,
-    )
-
-    after_thumbnail = ProcessedImageField(
-        upload_to="portfolio/after/thumbnails/",
-        processors=[ResizeToFill(300, 300)],
-        format="JPEG",
-        options={"quality": 85},
-        blank=True,
-        null=True,
-    )
-
     # Before/After flag
     is_before_after = models.BooleanField(
         default=False, help_text="Is this a before/after project?"
     )
 
     upload_date = models.DateTimeField(auto_now_add=True)
+    processing_status = processing_status_field()
+    media_fingerprints = media_fingerprints_field()
 
     class Meta:
         ordering = ["-upload_date"]
@@ -305,35 +315,17 @@ class PortfolioItem(models.Model):
         return bool(self.before_image and self.after_image)
 
 
-class PortfolioImage(models.Model):
+class PortfolioImage(MediaAsset):
     portfolio_item = models.ForeignKey(
         PortfolioItem, on_delete=models.CASCADE, related_name="pictures"
     )
     image = models.ImageField(upload_to="portfolio/images/")
 
-    # Thumbnails (auto-generated)
-    thumbnail = ProcessedImageField(
-        upload_to="portfolio/images/thumbnails/",
-        processors=[ResizeToFill(300, 300)],
-        format="JPEG",
-        options={"quality": 85},
-        blank=True,
-        null=True,
-    )
-
-    # Gallery image (optimized for gallery display)
-    gallery_image = ProcessedImageField(
-        upload_to="portfolio/images/gallery/",
-        processors=[ResizeToFit(800, 600)],
-        format="WebP",
-        options={"quality": 90},
-        blank=True,
-        null=True,
-    )
-
     caption = models.CharField(max_length=200, blank=True)
     display_order = models.IntegerField(default=0)
     created_at = models.DateTimeField(auto_now_add=True)
+    processing_status = processing_status_field()
+    media_fingerprints = media_fingerprints_field()
 
     class Meta:
         ordering = ["display_order", "created_at"]
@@ -342,7 +334,7 @@ class PortfolioImage(models.Model):
         return f"{self.portfolio_item.title} - Image {self.id}"
 
 
-class PortfolioVideo(models.Model):
+class PortfolioVideo(MediaAsset):
     portfolio_item = models.ForeignKey(
         PortfolioItem, on_delete=models.CASCADE, related_name="videos"
     )
@@ -359,9 +351,57 @@ class PortfolioVideo(models.Model):
     caption = models.CharField(max_length=200, blank=True)
     display_order = models.IntegerField(default=0)
     created_at = models.DateTimeField(auto_now_add=True)
+    processing_status = processing_status_field()
+
+    worker_fields = ("processing_status", "thumbnail")
 
     class Meta:
         ordering = ["display_order", "created_at"]
 
     def __str__(self):
         return f"{self.portfolio_item.title} - Video {self.id}"
+
+
+class MediaJob(models.Model):
+    """
+    Thumbnail, gallery image or video frame generation for one uploaded
+    asset. Written by the post_save handlers in the upload's transaction
+    and run by the process_media command.
+    """
+
+    class Status(models.TextChoices):
+        PENDING = "pending", "Pending"
+        PROCESSING = "processing", "Processing"
+        DONE = "done", "Done"
+        FAILED = "failed", "Failed"
+
+    class AssetType(models.TextChoices):
+        ITEM = "item", "Portfolio item"
+        IMAGE = "image", "Portfolio image"
+        VIDEO = "video", "Portfolio video"
+
+    asset_type = models.CharField(max_length=10, choices=AssetType.choices)
+    asset_id = models.PositiveBigIntegerField()
+    status = models.CharField(
+        max_length=10, choices=Status.choices, default=Status.PENDING
+    )
+    attempts = models.PositiveSmallIntegerField(default=0)
+    max_attempts = models.PositiveSmallIntegerField(default=3)
+    run_after = models.DateTimeField(
+        default=timezone.now, help_text="Not picked up before this (retry backoff)"
+    )
+    locked_at = models.DateTimeField(null=True, blank=True)
+    locked_by = models.CharField(max_length=100, blank=True)
+    last_error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        ordering = ["run_after", "id"]
+        indexes = [
+            models.Index(fields=["status", "run_after"]),
+            models.Index(fields=["asset_type", "asset_id"]),
+        ]
+
+    def __str__(self):
+        return f"{self.get_asset_type_display()} {self.asset_id} ({self.status})"
@@ -1,6 +1,6 @@
 from rest_framework import serializers
 from django.conf import settings
-import os
+from .media.registry import IMAGE_VARIANTS, image_slots, variant_path
 from .models import (
     PortfolioItem,
     Category,
@@ -11,6 +11,32 @@ from .models import (
 )
 
 
+def variant_url(request, obj, field_name, variant_name):
+    """
+    URL of one registry variant of an image field, built from its name alone
+    (no filesystem check); None without an upload
+    """
+    path = variant_path(obj, field_name, variant_name)
+    if path is None:
+        return None
+    path = settings.MEDIA_URL + path
+    if request:
+        return request.build_absolute_uri(path)
+    return path
+
+
+def variant_urls(request, obj):
+    """{image field: {variant name: url}} for every uploaded image slot"""
+    return {
+        slot.field_name: {
+            variant.name: variant_url(request, obj, slot.field_name, variant.name)
+            for variant in IMAGE_VARIANTS
+        }
+        for slot in image_slots(obj)
+        if getattr(obj, slot.field_name)
+    }
+
+
 class FamilyLoginSerializer(serializers.Serializer):
     username = serializers.CharField()
     password = serializers.CharField(write_only=True, style={"input_type": "passowrd"})
@@ -66,6 +92,7 @@ class PortfolioImageSerializer(serializers.ModelSerializer):
     image_url = serializers.SerializerMethodField()
     thumbnail_url = serializers.SerializerMethodField()
     gallery_image_url = serializers.SerializerMethodField()
+    variants = serializers.SerializerMethodField()
 
     class Meta:
         model = PortfolioImage
@@ -76,8 +103,10 @@ class PortfolioImageSerializer(serializers.ModelSerializer):
             "image_url",
             "thumbnail_url",
             "gallery_image_url",
+            "variants",
             "caption",
             "display_order",
+            "processing_status",
             "created_at",
         ]
         read_only_fields = [
@@ -85,6 +114,8 @@ class PortfolioImageSerializer(serializers.ModelSerializer):
             "image_url",
             "thumbnail_url",
             "gallery_image_url",
+            "variants",
+            "processing_status",
             "created_at",
         ]
         # Prevent image from being included in the API response
@@ -105,15 +136,13 @@ class PortfolioImageSerializer(serializers.ModelSerializer):
         return None
 
     def get_thumbnail_url(self, obj):
-        if obj.thumbnail:
-            request = self.context.get("request")
-            return self._build_url(request, obj.thumbnail.url)
-        return None
+        return variant_url(self.context.get("request"), obj, "image", "thumb")
 
     def get_gallery_image_url(self, obj):
-        if obj.gallery_image:
-            request = self.context.get("request")
-            return self._build_url(request, obj.gallery_image.url)
+        return variant_url(self.context.get("request"), obj, "image", "gallery")
+
+    def get_variants(self, obj):
+        return variant_urls(self.context.get("request"), obj)
 
 
 class PortfolioVideoSerializer(serializers.ModelSerializer):
@@ -130,12 +159,14 @@ class PortfolioVideoSerializer(serializers.ModelSerializer):
             "thumbnail_url",
             "caption",
             "display_order",
+            "processing_status",
             "created_at",
         ]
         read_only_fields = [
             "id",
             "video_url",
             "thumbnail_url",
+            "processing_status",
             "created_at",
         ]
         # Prevent video from being included in the API response
@@ -173,6 +204,7 @@ class PortfolioItemSerializer(serializers.ModelSerializer):
     after_image_url = serializers.SerializerMethodField()
     before_thumbnail_url = serializers.SerializerMethodField()
     after_thumbnail_url = serializers.SerializerMethodField()
+    variants = serializers.SerializerMethodField()
     image_count = serializers.SerializerMethodField()
     has_before_after = serializers.SerializerMethodField()
 
@@ -209,11 +241,13 @@ class PortfolioItemSerializer(serializers.ModelSerializer):
             "after_image_url",
             "before_thumbnail_url",
             "after_thumbnail_url",
+            "variants",
             "pictures",
             "videos",
             "image_count",
             "has_before_after",
             "is_before_after",
+            "processing_status",
             "upload_date",
         ]
         read_only_fields = [
@@ -225,10 +259,12 @@ class PortfolioItemSerializer(serializers.ModelSerializer):
             "after_image_url",
             "before_thumbnail_url",
             "after_thumbnail_url",
+            "variants",
             "pictures",
             "videos",
             "image_count",
             "has_before_after",
+            "processing_status",
             "upload_date",
         ]
         extra_kwargs = {
@@ -274,34 +310,10 @@ class PortfolioItemSerializer(serializers.ModelSerializer):
         return None
 
     def get_thumbnail_url(self, obj):
-        if obj.image:
-            # Get the original image filename
-            original_filename = os.path.basename(obj.image.name)
-            thumbnail_filename = f"thumb_{original_filename}"
-
-            # Construct thumbnail path
-            thumbnail_path = f"/media/portfolio/thumbnails/{thumbnail_filename}"
-
-            request = self.context.get("request")
-            if request:
-                return request.build_absolute_uri(thumbnail_path)
-            return thumbnail_path
-        return None
+        return variant_url(self.context.get("request"), obj, "image", "thumb")
 
     def get_gallery_image_url(self, obj):
-        if obj.image:
-            # Get the original image filename
-            original_filename = os.path.basename(obj.image.name)
-            gallery_filename = f"gallery_{original_filename}"
-
-            # Construct the gallery image path
-            gallery_path = f"/media/portfolio/gallery/{gallery_filename}"
-
-            request = self.context.get("request")
-            if request:
-                return request.build_absolute_uri(gallery_path)
-            return gallery_path
-        return None
+        return variant_url(self.context.get("request"), obj, "image", "gallery")
 
     def get_before_image_url(self, obj):
         if obj.before_image:
@@ -320,28 +332,13 @@ class PortfolioItemSerializer(serializers.ModelSerializer):
         return None
 
     def get_before_thumbnail_url(self, obj):
-        if obj.before_image:
-            original_filename = os.path.basename(obj.before_image.name)
-            thumbnail_filename = f"thumb_{original_filename}"
-            thumbnail_path = f"/media/portfolio/before/thumbnails/{thumbnail_filename}"
-
-            request = self.context.get("request")
-            if request:
-                return request.build_absolute_uri(thumbnail_path)
-            return thumbnail_path
-        return None
+        return variant_url(self.context.get("request"), obj, "before_image", "thumb")
 
     def get_after_thumbnail_url(self, obj):
-        if obj.after_image:
-            original_filename = os.path.basename(obj.after_image.name)
-            thumbnail_filename = f"thumb_{original_filename}"
-            thumbnail_path = f"/media/portfolio/after/thumbnails/{thumbnail_filename}"
+        return variant_url(self.context.get("request"), obj, "after_image", "thumb")
 
-            request = self.context.get("request")
-            if request:
-                return request.build_absolute_uri(thumbnail_path)
-            return thumbnail_path
-        return None
+    def get_variants(self, obj):
+        return variant_urls(self.context.get("request"), obj)
 
     def get_image_count(self, obj):
         return obj.pictures.count()
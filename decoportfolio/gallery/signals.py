@@ -1,13 +1,14 @@
 import os
-import cv2
-import numpy as np
-from django.db.models.signals import post_save, post_delete
+from django.db.models import Q
+from django.db.models.signals import post_save, post_delete, pre_delete
 from django.dispatch import receiver
 from django.conf import settings
-from django.core.cache import cache
 from django.contrib.auth.models import Group
-from PIL import Image
 from .models import PortfolioItem, Category, Service, BusinessInfo, PortfolioImage, PortfolioVideo
+from .caching.invalidation import invalidation_collector
+from .media.fingerprints import images_changed
+from .media.queue import enqueue as enqueue_media_job
+from .media.registry import image_slots, variant_files
 
 def ensure_family_group_exists(sender, **kwargs):
     group, created = Group.objects.get_or_create(name='Family')
@@ -17,383 +18,95 @@ def ensure_family_group_exists(sender, **kwargs):
 
 def invalidate_related_caches(instance):
     """Smart cache invalidation for related data"""
-    cache_keys_to_clear = []
-
-    # Handle PortfolioImage and PortfolioVideo instances
+    # Images and videos only carry the parent id; no need to load the item
     if isinstance(instance, (PortfolioImage, PortfolioVideo)):
-        # Get the parent PortfolioItem
-        portfolio_item = instance.portfolio_item
-        instance = portfolio_item  # Use portfolio_item for cache invalidation
-    
+        invalidation_collector.add(
+            tags=[f'item:{instance.portfolio_item_id}'],
+            scopes=[('portfolio', None), ('item', instance.portfolio_item_id)],
+        )
+        return
+
     # Check if instance has required attributes (must be PortfolioItem)
     if not hasattr(instance, 'category'):
         return
-    
-    cache_keys_to_clear.extend([
-        'portfolio_list_',
-        f'portfolio_category_{instance.category.id if instance.category else "all"}_',
-        f'portfolio_service_{instance.service.id if instance.service else "all"}_',
-    ])
-
-    # Clear search and filter caches
-    cache_keys_to_clear.extend([
-        'portfolio_search_',
-        'portfolio_filter_',
-        'portfolio_combined_',
-    ])
-
-    # Clear individual item cache
-    cache_keys_to_clear.append(f'portfolio_item_{instance.id}')
-
-    # Clear category and service related caches
-    if instance.category:
-        cache_keys_to_clear.extend([
-            f'category_{instance.category.id}',
-            f'service_category_{instance.category.id}_',
-        ])
-
-    # Clear all matching cache keys
-    for key in cache_keys_to_clear:
-        cache.delete(key)
-        print(f"Cleared cache key: {key}")
+
+    # The item's own fragment, every list/search/filter/category page and
+    # cached not-found answers (a new item's pk may have been requested
+    # before). Every page key folds in the portfolio generation alone;
+    # fragments of other items are left alone.
+    invalidation_collector.add(
+        tags=[f'item:{instance.id}'],
+        scopes=[('portfolio', None), ('item', instance.id)],
+    )
+
+def item_scopes(items):
+    """Version scopes of the fragments of the given items"""
+    return [('item', item_id) for item_id in items.values_list('id', flat=True)]
 
 @receiver(post_save, sender=PortfolioImage)
-def generate_portfolio_image_thumbnails(sender, instance, created, **kwargs):
-    """Generate thumbnails for portfolio images"""
-    if created and instance.image:
-        print(f"=== PROCESSING PORTFOLIO IMAGE: {instance.id} ===")
-        print(f"Portfolio Item: {instance.portfolio_item.title}")
-        print(f"Image: {instance.image.name}")
-
-        def generate_image_variants(image_field, base_dir, image_type):
-            """Helper function to generate thumbnail and gallery images"""
-            if not image_field:
-                return
-            
-            try:
-                # Check if image file exists on disk
-                if not os.path.exists(image_field.path):
-                    print(f"Image file not found on disk: {image_field.path}")
-                    return
-                
-                # Open the original image
-                img = Image.open(image_field.path)
-
-                # Get original format and determine output format
-                original_format = img.format
-                output_format = 'JPEG' if original_format in ['JPEG', 'JPG'] else 'PNG'
-
-                # Create thumbnail (300x300)
-                thumbnail_img = img.copy()
-                thumbnail_img.thumbnail((300, 300), Image.Resampling.LANCZOS)
-
-                # Save thumbnail
-                thumbnail_dir = os.path.join(settings.MEDIA_ROOT, base_dir, 'thumbnails')
-                os.makedirs(thumbnail_dir, exist_ok=True)
-
-                thumbnail_filename = f"thumb_{os.path.basename(image_field.name)}"
-                thumbnail_path = os.path.join(thumbnail_dir, thumbnail_filename)
-
-                # Convert to RGB if saving as JPEG (JPEG doesn't support transparency)
-                if output_format == 'JPEG' and thumbnail_img.mode in ['RGBA', 'LA', 'P']:
-                    thumbnail_img = thumbnail_img.convert('RGB')
-                
-                thumbnail_img.save(thumbnail_path, output_format, quality=85)
-
-                # Create gallery image (800x600 max)
-                gallery_img = img.copy()
-                gallery_img.thumbnail((800, 600), Image.Resampling.LANCZOS)
-
-                gallery_dir = os.path.join(settings.MEDIA_ROOT, base_dir, 'gallery')
-                os.makedirs(gallery_dir, exist_ok=True)
-
-                gallery_filename = f"gallery_{os.path.basename(image_field.name)}"
-                gallery_path = os.path.join(gallery_dir, gallery_filename)
-
-                # Convert to RGB if saving as JPEG
-                if output_format == 'JPEG' and gallery_img.mode in ['RGBA', 'LA', 'P']:
-                    gallery_img = gallery_img.convert('RGB')
-
-                gallery_img.save(gallery_path, output_format, quality=90)
-                
-                print(f"Generated {image_type} thumbnail: {thumbnail_path}")
-                print(f"Generated {image_type} gallery image: {gallery_path}")
-            
-            except Exception as e:
-                print(f"Error generating {image_type} images: {e}")
-            
-        # Generate image variants
-        generate_image_variants(instance.image, 'portfolio/images', 'portfolio_image')
+def generate_portfolio_image_thumbnails(sender, instance, created, update_fields=None, **kwargs):
+    """Queue thumbnails for new or replaced portfolio images"""
+    # Caption and display_order edits leave the variants alone
+    if images_changed(instance, update_fields):
+        # Generated by the process_media worker, off the request thread
+        enqueue_media_job(instance)
+        print(f"Queued media processing for portfolio image: {instance.id}")
 
-        # Invalidate parent PortfolioItem cache
-        invalidate_related_caches(instance)
+    # Invalidate parent PortfolioItem cache
+    invalidate_related_caches(instance)
 
 @receiver(post_save, sender=PortfolioVideo)
 def generate_video_thumbnail(sender, instance, created, **kwargs):
-    """Generate thumbnail from video"""
+    """Queue the thumbnail of a video"""
     if created and instance.video:
-        print(f"=== PROCESSING PORTFOLIO VIDEO: {instance.id} ===")
-        print(f"Portfolio Item: {instance.portfolio_item.title}")
-        print(f"Video: {instance.video.name}")
-
-        try:
-            # Check if video file exists on disk
-            if not os.path.exists(instance.video.path):
-                print(f"Video file not found on disk: {instance.video.path}")
-                return
-            
-            # Open video file with OpenCV
-            cap = cv2.VideoCapture(instance.video.path)
-
-            if not cap.isOpened():
-                print(f"Error opening video file: {instance.video.path}")
-                return
-            
-            # Get total number of frames
-            total_frames = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
-
-            # Calculate frame position (use 1 second or 10% of video, whichever is smaller)
-            fps = cap.get(cv2.CAP_PROP_FPS) or 30  # Default to 30 fps if not available
-            frame_position = min(int(fps), total_frames // 10) if total_frames > 0 else 0
-
-            # Set frame position
-            cap.set(cv2.CAP_PROP_POS_FRAMES, frame_position)
-
-            # Read frame
-            ret, frame = cap.read()
-
-            if not ret or frame is None:
-                # If frame extraction failed, try middle of video
-                cap.set(cv2.CAP_PROP_POS_FRAMES, total_frames // 2 if total_frames > 0 else 0) 
-                ret, frame = cap.read()
-
-            cap.release()
-
-            if not ret or frame is None:
-                print(f"Error raeding frame from video: {instance.video.path}")
-                return
-            
-            # Convert BGR to RGB (OpenCV uses BGR, PIL uses RGB)
-            frame_rgb = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
-
-            # Convert to PIL Image
-            pil_image = Image.fromarray(frame_rgb)
-
-            # Resize to thumbnail size (300x300)
-            pil_image.thumbnail((300, 300), Image.Resampling.LANCZOS)
-
-            # Create thumbnail directory
-            thumbnail_dir = os.path.join(settings.MEDIA_ROOT, 'portfolio/videos/thumbnails')
-            os.makedirs(thumbnail_dir, exist_ok=True)
-
-            # Generate thumbnail filename
-            video_basename = os.path.basename(instance.video.name)
-            video_name_without_ext = os.path.splitext(video_basename)[0]
-            thumbnail_filename = f"{video_name_without_ext}.jpg"
-            thumbnail_path = os.path.join(thumbnail_dir, thumbnail_filename)
-
-            # Convert to RGB if needed (for JPEG compatibility)
-            if pil_image.mode in ['RGBA', 'LA', 'P']:
-                pil_image = pil_image.convert('RGB')
-
-            # Save thumbnail
-            pil_image.save(thumbnail_path, 'JPEG', quality=85)
-
-            # Update the thumbnail field in the model
-            # We need to save the relative path from MEDIA_ROOT
-            thumbnail_relative_path = f"portfolio/videos/thumbnails/{thumbnail_filename}"
-            instance.thumbnail.name = thumbnail_relative_path
-            instance.save(update_fields=['thumbnail'])
-
-            print(f"Generated video thumbnail: {thumbnail_path}")
-            print(f"=== PORTFOLIO VIDEO PROCESSING COMPLETED ===\n")
+        enqueue_media_job(instance)
+        print(f"Queued media processing for portfolio video: {instance.id}")
 
-        except Exception as e:
-            print(f"Error generating video thumbnail: {e}")
-            import traceback
-            traceback.print_exc()
-        
         # Invalidate parent PortfolioItem cache
         invalidate_related_caches(instance)
 
 @receiver(post_save, sender=PortfolioItem)
-def generate_thumbnails_and_invalidate_cache(sender, instance, created, **kwargs):
-    """Generate thumbnails and invalidate related caches"""
+def generate_thumbnails_and_invalidate_cache(sender, instance, created, update_fields=None, **kwargs):
+    """Queue thumbnails and invalidate related caches"""
     print(f"=== PROCESSING PORTFOLIO ITEM: {instance.title} ===")
     print(f"Created: {created}, Updated: {not created}")
-    print(f"Has main image: {bool(instance.image)}")
-    print(f"Has before image: {bool(instance.before_image)}")
-    print(f"Has after image: {bool(instance.after_image)}")
-
-    def generate_image_variants(image_field, base_dir, image_type):
-        """Helper function to generate thumbnail and gallery images"""
-        if not image_field:
-            return
-        
-        try:
-            # Check if image file exists on disk
-            if not os.path.exists(image_field.path):
-                print(f"Image file not found on disk: {image_field.path}")
-                return
-            
-            # Open the original image
-            img = Image.open(image_field.path)
-
-            # Get original format and determine output format
-            original_format = img.format
-            output_format = 'JPEG' if original_format in ['JPEG', 'JPG'] else 'PNG'
-
-            # Create thumbnail (300x300)
-            thumbnail_img = img.copy()
-            thumbnail_img.thumbnail((300, 300), Image.Resampling.LANCZOS)
-
-            # Save thumbnail
-            thumbnail_dir = os.path.join(settings.MEDIA_ROOT, base_dir, 'thumbnails')
-            os.makedirs(thumbnail_dir, exist_ok=True)
-
-            thumbnail_filename = f"thumb_{os.path.basename(image_field.name)}"
-            thumbnail_path = os.path.join(thumbnail_dir, thumbnail_filename)
-
-            # Convert to RGB if saving as JPEG (JPEG doesn't support transparency)
-            if output_format == 'JPEG' and thumbnail_img.mode in ['RGBA', 'LA', 'P']:
-                thumbnail_img = thumbnail_img.convert('RGB')
-
-            thumbnail_img.save(thumbnail_path, output_format, quality=85)
-
-            # Create gallery image (800x600 max)
-            gallery_img = img.copy()
-            gallery_img.thumbnail((800, 600), Image.Resampling.LANCZOS)
-            
-            gallery_dir = os.path.join(settings.MEDIA_ROOT, base_dir, 'gallery')
-            os.makedirs(gallery_dir, exist_ok=True)
-
-            gallery_filename = f"gallery_{os.path.basename(image_field.name)}"
-            gallery_path = os.path.join(gallery_dir, gallery_filename)
-
-            # Convert to RGB if saving as JPEG
-            if output_format == 'JPEG' and gallery_img.mode in ['RGBA', 'LA', 'P']:
-                gallery_img = gallery_img.convert('RGB')
-
-            gallery_img.save(gallery_path, output_format, quality=90)
-
-            print(f"Generated {image_type} thumbnail: {thumbnail_path}")
-            print(f"Generated {image_type} gallery image: {gallery_path}")
-        
-        except Exception as e:
-            print(f"Error generating {image_type} images: {e}")
 
-    # Generate main image variants
-    if instance.image:
-        generate_image_variants(instance.image, 'portfolio', 'main')
-    
-    # Generate before image variants
-    if instance.before_image:
-        generate_image_variants(instance.before_image, 'portfolio/before', 'before')
-    
-    # Generate after image variants
-    if instance.after_image:
-        generate_image_variants(instance.after_image, 'portfolio/after', 'after')
+    # Main, before and after image variants, unless this save didn't change
+    # any of them (a title-only PATCH)
+    if images_changed(instance, update_fields):
+        enqueue_media_job(instance)
+        print("Queued media processing")
 
     # Smart cache invalidation
     invalidate_related_caches(instance)
 
     print("=== CACHE INVALIDATION COMPLETED ===\n")
 
+def image_files(instance):
+    """Existing uploads of an item or image and every registry variant of them"""
+    paths = [
+        getattr(instance, slot.field_name).path
+        for slot in image_slots(instance)
+        if getattr(instance, slot.field_name)
+    ]
+    paths += [os.path.join(settings.MEDIA_ROOT, path) for path in variant_files(instance)]
+    return [path for path in paths if os.path.exists(path)]
+
 @receiver(post_delete, sender=PortfolioItem)
 def cleanup_and_invalidate_cache(sender, instance, **kwargs):
     """Cleanup files and invalidate cache when item is deleted"""
     print(f"=== DELETING PORTFOLIO ITEM: {instance.title} ===")
 
-    # Clean up image files
-    files_to_delete = []
-
-    # Main image and its generated files
-    if instance.image:
-        try:
-            # Original main image
-            if os.path.exists(instance.image.path):
-                files_to_delete.append(instance.image.path)
-            
-            # Main image thumbnail
-            thumbnail_filename = f"thumb_{os.path.basename(instance.image.name)}"
-            thumbnail_path = os.path.join(settings.MEDIA_ROOT, 'portfolio', 'thumbnails', thumbnail_filename)
-            if os.path.exists(thumbnail_path):
-                files_to_delete.append(thumbnail_path)
-
-            # Main image gallery version
-            gallery_filename = f"gallery_{os.path.basename(instance.image.name)}"
-            gallery_path = os.path.join(settings.MEDIA_ROOT, 'portfolio', 'gallery', gallery_filename)
-            if os.path.exists(gallery_path):
-                files_to_delete.append(gallery_path)
-
-        except Exception as e:
-            print(f"Error preparing main image cleanup: {e}")
-    
-    # Before image and its generated files
-    if instance.before_image:
-        try:
-            # Original before image
-            if os.path.exists(instance.before_image.path):
-                files_to_delete.append(instance.before_image.path)
-            
-            # Before image thumbnail
-            thumbnail_filename = f"thumb_{os.path.basename(instance.before_image.name)}"
-            thumbnail_path = os.path.join(settings.MEDIA_ROOT, 'portfolio', 'before', 'thumbnails', thumbnail_filename)
-            if os.path.exists(thumbnail_path):
-                files_to_delete.append(thumbnail_path)
-
-            # Before image gallery version
-            gallery_filename = f"gallery_{os.path.basename(instance.before_image.name)}"
-            gallery_path = os.path.join(settings.MEDIA_ROOT, 'portfolio', 'before', 'gallery', gallery_filename)
-            if os.path.exists(gallery_path):
-                files_to_delete.append(gallery_path)
+    # Main, before and after images and their generated files
+    files_to_delete = image_files(instance)
 
-        except Exception as e:
-            print(f"Error preparing before image cleanup: {e}")
-        
-    # After image and its generated files
-    if instance.after_image:
-        try:
-            # Original after image
-            if os.path.exists(instance.after_image.path):
-                files_to_delete.append(instance.after_image.path)
-            
-            # After image thumbnail
-            thumbnail_filename = f"thumb_{os.path.basename(instance.after_image.name)}"
-            thumbnail_path = os.path.join(settings.MEDIA_ROOT, 'portfolio', 'after', 'thumbnails', thumbnail_filename)
-            if os.path.exists(thumbnail_path):
-                files_to_delete.append(thumbnail_path)
-            
-            # After image gallery version
-            gallery_filename = f"gallery_{os.path.basename(instance.after_image.name)}"
-            gallery_path = os.path.join(settings.MEDIA_ROOT, 'portfolio', 'after', 'gallery', gallery_filename)
-            if os.path.exists(gallery_path):
-                files_to_delete.append(gallery_path)
-            
-        except Exception as e:
-            print(f"Error preparing after image cleanup: {e}")
-    
     # Delete all related PortfolioImage files
     try:
         for portfolio_image in instance.pictures.all():
-            # Delete original image
-            if portfolio_image.image and os.path.exists(portfolio_image.image.path):
-                files_to_delete.append(portfolio_image.image.path)
-
-            # Delete thumbnail
-            thumbnail_filename = f"thumb_{os.path.basename(portfolio_image.image.name)}"
-            thumbnail_path = os.path.join(settings.MEDIA_ROOT, 'portfolio/images/thumbnails', thumbnail_filename)
-            if os.path.exists(thumbnail_path):
-                files_to_delete.append(thumbnail_path)
-            
-            # Delete gallery image
-            gallery_filename = f"gallery_{os.path.basename(portfolio_image.image.name)}"
-            gallery_path = os.path.join(settings.MEDIA_ROOT, 'portfolio/images/gallery', gallery_filename)
-            if os.path.exists(gallery_path):
-                files_to_delete.append(gallery_path)
+            files_to_delete.extend(image_files(portfolio_image))
     except Exception as e:
         print(f"Error preparing PortfolioImage cleanup: {e}")
-    
+
     # Delete all related PortfolioVideo Files
     try:
         for portfolio_video in instance.videos.all():
@@ -430,29 +143,8 @@ def cleanup_portfolio_image(sender, instance, **kwargs):
     """Cleanup files and invalidate cache when PortfolioImage is deleted"""
     print(f"=== DELETING PORTFOLIO IMAGE: {instance.id} ===")
 
-    files_to_delete = []
-
-    # Delete original image
-    if instance.image and os.path.exists(instance.image.path):
-        files_to_delete.append(instance.image.path)
-
-    # Delete thumbnail
-    try:
-        thumbnail_filename = f"thumb_{os.path.basename(instance.image.name)}"
-        thumbnail_path = os.path.join(settings.MEDIA_ROOT, 'portfolio/images/thumbnails', thumbnail_filename)
-        if os.path.exists(thumbnail_path):
-            files_to_delete.append(thumbnail_path)
-    except Exception as e:
-        print(f"Error preparing thumbnail cleanup: {e}")
-    
-    # Delete gallery image
-    try:
-        gallery_filename = f"gallery_{os.path.basename(instance.image.name)}"
-        gallery_path = os.path.join(settings.MEDIA_ROOT, 'portfolio/images/gallery', gallery_filename)
-        if os.path.exists(gallery_path):
-            files_to_delete.append(gallery_path)
-    except Exception as e:
-        print(f"Error preparing gallery image cleanup: {e}")
+    # Original image and its generated files
+    files_to_delete = image_files(instance)
 
     # Actually delete the files
     deleted_count = 0
@@ -505,45 +197,45 @@ def cleanup_portfolio_video(sender, instance, **kwargs):
 
     print("=== PORTFOLIO VIDEO DELETION COMPLETED ===\n")
 
-@receiver(post_save, sender=Category)
+# pre_delete, not post_delete: the items that embed a category or service
+# can only be looked up while it exists (a deleted service is SET_NULL on its
+# items without signals). Deletes run in a transaction, so the bumps still
+# wait for the commit.
+@receiver([post_save, pre_delete], sender=Category)
 def invalidate_category_cache(sender, instance, **kwargs):
     """Invalidate cache when category is updated"""
-    cache_keys = [
-        f'category_{instance.id}',
-        'portfolio_list_',
-        'portfolio_search_',
-        'portfolio_filter_',
-        'portfolio_combined_',
-    ]
-
-    for key in cache_keys:
-        cache.delete(key)
-    print(f"Cleared category-related caches for: {instance.name}")
-
-@receiver(post_save, sender=Service)
+    # Items embed their category, directly and through their service, so
+    # their fragments and every page go too. Services embed their category
+    # as well (the family generations are the ETags of the category and
+    # service endpoints). The portfolio bump also drops cached "category not
+    # found" answers, so a new category shows at once.
+    items = PortfolioItem.objects.filter(Q(category=instance) | Q(service__category=instance))
+    invalidation_collector.add(
+        tags=[f'category:{instance.id}'],
+        scopes=[('category', None), ('service', None), ('portfolio', None)]
+        + item_scopes(items),
+        # Category ids memoized by name in every worker; a rename changes
+        # which name maps where, so the whole namespace goes
+        memos=[('category', None)],
+    )
+    print(f"Queued category-related cache invalidation for: {instance.name}")
+
+@receiver([post_save, pre_delete], sender=Service)
 def invalidate_service_cache(sender, instance, **kwargs):
     """Invalidate cache when service is updated"""
-    cache_keys = [
-        f'service_{instance.id}',
-        f'service_category_{instance.category.id}_',
-        'portfolio_list_',
-        'portfolio_search_',
-        'portfolio_filter_',
-        'portfolio_combined_',
-    ]
-
-    for key in cache_keys:
-        cache.delete(key)
-    print(f"Cleared service-related caches for: {instance.name}")
-
-@receiver(post_save, sender=BusinessInfo)
+    items = PortfolioItem.objects.filter(service=instance)
+    invalidation_collector.add(
+        tags=[f'service:{instance.id}'],
+        scopes=[('service', None), ('portfolio', None)] + item_scopes(items),
+    )
+    print(f"Queued service-related cache invalidation for: {instance.name}")
+
+@receiver([post_save, post_delete], sender=BusinessInfo)
 def invalidate_business_cache(sender, instance, **kwargs):
     """Invalidate cache when business info is updated"""
-    cache_keys = [
-        'business_info_',
-        'business_info_list_',
-    ]
-
-    for key in cache_keys:
-        cache.delete(key)
-    print(f"Cleared business info caches")
\ No newline at end of file
+    invalidation_collector.add(
+        tags=['business'],
+        scopes=[('business', None)],
+        memos=[('business', None)],
+    )
+    print(f"Queued business info cache invalidation")
\ No newline at end of file
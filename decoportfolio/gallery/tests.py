@@ -1,3 +1,951 @@
-from django.test import TestCase
+import os
+import pickle
+import tempfile
+import threading
+import time
+from types import SimpleNamespace
+from unittest import mock, skipIf
+from io import StringIO
+from django.core.cache import cache
+from django.core.management import call_command
+from django.http import HttpResponse, QueryDict
+from django.test import SimpleTestCase, override_settings
+from django_redis.cache import RedisCache
+from redis.exceptions import ConnectionError as RedisConnectionError
+from rest_framework.test import APIRequestFactory
+from gallery.caching import codecs, invalidation, singleflight, swr
+from gallery.caching.bus import InvalidationBus, ProcessMemo
+from gallery.caching.breaker import CLOSED, HALF_OPEN, OPEN, CircuitBreaker
+from gallery.caching.fragments import (
+    get_item_fragments,
+    item_fragment_key,
+    item_versions,
+    store_item_fragments,
+)
+from gallery.caching.conditional import make_version_etag
+from gallery.caching.generations import bump_generation, fold_generations, get_generation
+from gallery.caching.hotlist import Hotlist
+from gallery.caching.keys import canonical_params, family_of, page_cache_key
+from gallery.caching.metrics import CacheMetrics, histogram_percentile
+from gallery.caching.negative import is_known_missing, remember_missing
+from gallery.caching.tags import DEFAULT_TAG_TIMEOUT, TagRegistry
+from gallery.caching.rendering import assemble_list_body, render_fragment, render_json
+from gallery.caching.swr import unwrap, wrap
+from gallery.caching.tiered import LocalLRUCache, TieredCache, response_cache
+from gallery.caching.ttl import TTLPolicy, refresh_due, ttl_policy
+from gallery.caching.warming import make_viewset
+from gallery.caching.singleflight import (
+    acquire_lock,
+    release_lock,
+    single_flight,
+    stale_key,
+    store_stale,
+)
+from gallery.management.commands import cache_snapshot, warm_cache
+from gallery.media.fingerprints import fingerprint, images_changed
+from gallery.media.pool import VariantPool, plan, render_variants, source_box
+from gallery.media import queue
+from gallery.media.queue import retry_delay
+from gallery.media.registry import COVER, Variant, variant_files
+from gallery.media.variants import generate_image_variants
+from gallery import signals
+from gallery.models import Category, PortfolioImage, PortfolioItem, Service
+from gallery.serializers import variant_urls
+from gallery.viewsets import PortfolioItemViewSet
+from PIL import Image, JpegImagePlugin
 
-# Create your tests here.
+try:
+    import fakeredis
+except ImportError:  # pub/sub test only; the polling path needs no Redis
+    fakeredis = None
+
+LOCMEM_CACHES = {
+    "default": {
+        "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+        "LOCATION": "gallery-tests",
+    }
+}
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class SingleFlightTests(SimpleTestCase):
+    def setUp(self):
+        cache.clear()
+
+    def test_lock_is_exclusive_until_released(self):
+        token = acquire_lock("page")
+        self.assertIsNotNone(token)
+        self.assertIsNone(acquire_lock("page"))
+
+        release_lock("page", token)
+        self.assertIsNotNone(acquire_lock("page"))
+
+    def test_lock_holder_generates_once_and_releases_lock(self):
+        def generate():
+            store_stale("page:stale", {"ids": [1, 2]})
+            return {"ids": [1, 2]}
+
+        generate = mock.Mock(side_effect=generate)
+
+        value = single_flight(
+            "page", read=lambda: None, generate=generate, stale_key="page:stale"
+        )
+
+        self.assertEqual(value, {"ids": [1, 2]})
+        generate.assert_called_once()
+        self.assertEqual(cache.get("page:stale"), {"ids": [1, 2]})
+        self.assertIsNotNone(acquire_lock("page"))
+
+    def test_waiter_reads_value_stored_by_lock_holder(self):
+        acquire_lock("page")
+        cache.set("page", {"ids": [3]})
+        generate = mock.Mock()
+
+        value = single_flight(
+            "page", read=lambda: cache.get("page"), generate=generate
+        )
+
+        self.assertEqual(value, {"ids": [3]})
+        generate.assert_not_called()
+
+    @mock.patch.object(singleflight, "WAIT_TIMEOUT", 0.1)
+    def test_waiter_falls_back_to_stale_value(self):
+        acquire_lock("page")
+        cache.set("page:stale", {"ids": [4]})
+        generate = mock.Mock()
+
+        value = single_flight(
+            "page", read=lambda: None, generate=generate, stale_key="page:stale"
+        )
+
+        self.assertEqual(value, {"ids": [4]})
+        generate.assert_not_called()
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class StaleWhileRevalidateTests(SimpleTestCase):
+    def setUp(self):
+        cache.clear()
+
+    def wait_until_idle(self, key):
+        deadline = time.monotonic() + 2
+        while key in swr._pending_keys and time.monotonic() < deadline:
+            time.sleep(0.01)
+        self.assertNotIn(key, swr._pending_keys)
+
+    def test_stale_value_is_served_and_refreshed_in_the_background(self):
+        envelope = swr.wrap({"ids": [1]}, TTLPolicy(60, 10, jitter=0))
+        envelope["soft_expires_at"] = time.time() - 1
+        self.assertEqual(swr.unwrap(envelope), ({"ids": [1]}, True))
+
+        refreshed = threading.Event()
+        self.assertTrue(swr.schedule_refresh("page", refreshed.set))
+        self.assertTrue(refreshed.wait(2))
+        self.wait_until_idle("page")
+        # The refresh released its lock
+        self.assertIsNotNone(acquire_lock("page"))
+
+    @mock.patch.object(swr, "acquire_lock", side_effect=RedisConnectionError("down"))
+    def test_lock_error_does_not_leave_the_key_pending(self, _):
+        refresh = mock.Mock()
+        self.assertTrue(swr.schedule_refresh("page", refresh))
+        self.wait_until_idle("page")
+        refresh.assert_not_called()
+
+
+class CanonicalKeyTests(SimpleTestCase):
+    def key_for(self, query_string, action="list"):
+        params = canonical_params(QueryDict(query_string), action)
+        return page_cache_key(action, params)
+
+    def test_equivalent_queries_share_a_key(self):
+        expected = self.key_for("")
+        for query_string in [
+            "page=1&page_size=20",
+            "page_size=20&page=1",
+            "page=1",
+            "page=junk&utm_source=crawler",
+        ]:
+            self.assertEqual(self.key_for(query_string), expected)
+
+    def test_filters_are_case_insensitive_and_page_size_is_clamped(self):
+        self.assertEqual(
+            self.key_for("category=Kitchen&page_size=5000", "filter"),
+            self.key_for("category=%20kitchen&page_size=200", "filter"),
+        )
+
+    @override_settings(CACHES=LOCMEM_CACHES)
+    def test_out_of_range_page_is_cached_under_its_own_key_too(self):
+        cache.clear()
+        response_cache.local.clear()
+        viewset = make_viewset("list")
+        viewset.filter_items = mock.Mock()
+        viewset.filter_items.return_value.values_list.return_value = list(range(1, 8))
+        params = canonical_params(QueryDict("page=99&page_size=5"), "list")
+
+        page = viewset.build_page("list", params, generation=1)
+
+        self.assertEqual(page["pagination"]["current_page"], 1)
+        for page_number in (99, 1):
+            key = fold_generations(page_cache_key("list", {**params, "page": page_number}), 1)
+            self.assertEqual(unwrap(response_cache.get(key, 1))[0], page)
+
+    def test_long_search_terms_are_hashed(self):
+        key = self.key_for("q=" + "bathroom remodel " * 10, "search")
+        self.assertNotIn("bathroom", key)
+        self.assertLess(len(key), 100)
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class NegativeCacheTests(SimpleTestCase):
+    def setUp(self):
+        cache.clear()
+
+    def test_not_found_is_remembered_within_a_generation(self):
+        self.assertFalse(is_known_missing("item", 9999, generation=1))
+        remember_missing("item", 9999, generation=1)
+        self.assertTrue(is_known_missing("item", 9999, generation=1))
+        self.assertFalse(is_known_missing("item", 9998, generation=1))
+
+    def test_generation_bump_forgets_not_found(self):
+        remember_missing("category", "kitchen", generation=1)
+        # Creating the category bumps the portfolio generation
+        self.assertFalse(is_known_missing("category", "kitchen", generation=2))
+        self.assertEqual(
+            family_of("portfolio_notfound_category=kitchen:g1"), "portfolio_notfound"
+        )
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class TagRegistryTests(SimpleTestCase):
+    def setUp(self):
+        cache.clear()
+        self.registry = TagRegistry()
+
+    def test_invalidating_a_tag_deletes_only_dependent_keys(self):
+        cache.set_many({"portfolio_item_1": "a", "portfolio_item_2": "b"})
+        self.registry.register(
+            {
+                "portfolio_item_1": ["item:1", "category:3"],
+                "portfolio_item_2": ["item:2", "category:4"],
+            }
+        )
+
+        self.assertEqual(self.registry.invalidate("category:3"), 1)
+
+        self.assertIsNone(cache.get("portfolio_item_1"))
+        self.assertEqual(cache.get("portfolio_item_2"), "b")
+        self.assertEqual(self.registry.invalidate("category:3"), 0)
+
+    @skipIf(fakeredis is None, "fakeredis not installed")
+    def test_short_lived_batch_never_shortens_a_tag_set(self):
+        redis_client = fakeredis.FakeRedis()
+        policy = ttl_policy("portfolio_item")
+        with mock.patch("gallery.caching.tags.get_redis_client", return_value=redis_client):
+            self.registry.register({"portfolio_item_1:g1": ["category:3"]}, policy.max_ttl())
+            self.registry.register({"portfolio_list_page=1:g1": ["category:3"]}, 60)
+
+        self.assertGreaterEqual(
+            redis_client.ttl(self.registry._tag_key("category:3")),
+            max(policy.max_ttl(), DEFAULT_TAG_TIMEOUT) - 1,
+        )
+        self.assertTrue(all(policy.hard_ttl() <= policy.max_ttl() for _ in range(100)))
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class ItemFragmentTests(SimpleTestCase):
+    def setUp(self):
+        cache.clear()
+        response_cache.local.clear()
+
+    def test_edit_rebuilds_only_the_edited_item(self):
+        # A page build read both versions, then an edit to item 1 bumped
+        # its counter before the build wrote its fragments
+        store_item_fragments(
+            {1: {"id": 1, "title": "old"}, 2: {"id": 2, "title": "other"}},
+            item_versions([1, 2]),
+        )
+        bump_generation("item", 1)
+        build = mock.Mock(return_value={1: {"id": 1, "title": "new"}})
+
+        fragments = get_item_fragments([1, 2], build)
+
+        build.assert_called_once_with([1])
+        self.assertEqual(
+            [fragment["body"] for fragment in fragments],
+            [b'{"id":1,"title":"new"}', b'{"id":2,"title":"other"}'],
+        )
+        self.assertEqual(family_of(item_fragment_key(1, (1, 2))), "portfolio_item")
+
+    def test_resync_retires_every_fragment(self):
+        store_item_fragments({2: {"id": 2}}, item_versions([2]))
+        bump_generation("portfolio_item")
+        build = mock.Mock(return_value={2: {"id": 2}})
+
+        get_item_fragments([2], build)
+
+        build.assert_called_once_with([2])
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class TieredCacheTests(SimpleTestCase):
+    def setUp(self):
+        cache.clear()
+
+    def test_local_tier_evicts_oldest_entries_past_its_byte_budget(self):
+        size = len(pickle.dumps("x" * 100, pickle.HIGHEST_PROTOCOL))
+        local = LocalLRUCache(max_bytes=size * 3)
+        for key in "abcd":
+            local.set(key, "x" * 100, 60, generation=1)
+
+        self.assertEqual(local.get("a", 1), (False, None))
+        self.assertTrue(all(local.get(key, 1)[0] for key in "bcd"))
+        self.assertLessEqual(local.current_bytes, local.max_bytes)
+        self.assertEqual(local.evictions, 1)
+
+    def test_entry_from_an_older_generation_is_dropped_locally(self):
+        tiered = TieredCache(cache, max_bytes=1024 * 1024)
+        tiered.set("portfolio_list_page=1:g1", {"ids": [1]}, 60, generation=1)
+        # Another worker bumped the generation and rewrote the key in Redis
+        cache.set("portfolio_list_page=1:g1", {"ids": [2]}, 60)
+
+        self.assertEqual(tiered.get("portfolio_list_page=1:g1", 2), {"ids": [2]})
+        self.assertEqual(tiered.counters["local_misses"], 1)
+        self.assertEqual(tiered.local.get("portfolio_list_page=1:g1", 1), (False, None))
+
+    def test_local_copies_never_outlive_the_soft_expiry(self):
+        tiered = TieredCache(cache, max_bytes=1024 * 1024, max_age=60)
+        policy = ttl_policy("portfolio_list")
+        due = {"data": {"ids": [1]}, "soft_expires_at": time.time() - 1}
+        cache.set("portfolio_list_page=1:g1", due, 60)
+
+        # Already due: every worker keeps reading Redis, where the one
+        # refresh that takes the lock lands
+        self.assertEqual(tiered.get("portfolio_list_page=1:g1", 1), due)
+        self.assertEqual(len(tiered.local), 0)
+        refreshed = wrap({"ids": [2]}, policy)
+        cache.set("portfolio_list_page=1:g1", refreshed, 60)
+        self.assertEqual(tiered.get("portfolio_list_page=1:g1", 1), refreshed)
+
+        # Fresh for hours: kept for max_age at most
+        expires_at = tiered.local._entries["portfolio_list_page=1:g1"][1]
+        self.assertLessEqual(expires_at, time.monotonic() + 60)
+
+
+class InvalidationCollectorTests(SimpleTestCase):
+    @mock.patch.object(invalidation, "schedule_rewarm")
+    @mock.patch.object(invalidation, "bump_generations")
+    @mock.patch.object(invalidation, "tag_registry")
+    def test_batch_flushes_deduplicated_work_once(self, tag_registry, bump, rewarm):
+        collector = invalidation.InvalidationCollector()
+
+        with collector.batch():
+            for _ in range(10):
+                collector.add(
+                    tags=["item:1"], scopes=[("portfolio", None), ("category", None)]
+                )
+            tag_registry.invalidate.assert_not_called()
+
+        tag_registry.invalidate.assert_called_once_with("item:1")
+        bump.assert_called_once_with(("category", None), ("portfolio", None))
+        rewarm.assert_called_once()
+
+    @override_settings(CACHES=LOCMEM_CACHES)
+    @mock.patch.object(invalidation, "schedule_rewarm")
+    @mock.patch.object(invalidation, "invalidation_bus")
+    def test_category_and_service_edits_change_page_keys(self, bus, rewarm):
+        cache.clear()
+        params = canonical_params(QueryDict(""), "by_category", category="Kitchen")
+        page_key = lambda: fold_generations(
+            page_cache_key("by_category", params), get_generation("portfolio")
+        )
+
+        versions = lambda: item_versions([11, 12, 13])
+
+        before, before_versions = page_key(), versions()
+        with mock.patch.object(signals.PortfolioItem.objects, "filter") as embedding:
+            embedding.return_value.values_list.return_value = [11]
+            signals.invalidate_category_cache(Category, Category(id=3, name="Kitchen"))
+            after_category, after_category_versions = page_key(), versions()
+            embedding.return_value.values_list.return_value = [12]
+            signals.invalidate_service_cache(Service, Service(id=7, name="Paint"))
+
+        self.assertNotEqual(before, after_category)
+        self.assertNotEqual(after_category, page_key())
+        # Only the fragments of the items that embed them
+        self.assertNotEqual(before_versions[11], after_category_versions[11])
+        self.assertEqual(before_versions[12], after_category_versions[12])
+        self.assertNotEqual(after_category_versions[12], versions()[12])
+        self.assertEqual(before_versions[13], versions()[13])
+
+
+class CacheMetricsTests(SimpleTestCase):
+    def test_keys_are_grouped_by_family(self):
+        self.assertEqual(family_of("portfolio_item_12"), "portfolio_item")
+        self.assertEqual(family_of("portfolio_by_category_page=1:g5"), "portfolio_by_category")
+        self.assertEqual(family_of("portfolio_list_page=1:stale"), "portfolio_list:stale")
+        self.assertEqual(family_of("gen:portfolio"), "gen")
+
+    def test_latency_histogram_percentiles(self):
+        metrics = CacheMetrics()
+        for _ in range(99):
+            metrics.record_get("portfolio_item", 1, 0, 0.0004)
+        metrics.record_get("portfolio_item", 0, 1, 0.2)
+
+        counters = metrics.snapshot()["portfolio_item"]
+        self.assertEqual((counters["hits"], counters["misses"]), (99, 1))
+        self.assertEqual(histogram_percentile(counters["get_latency"], 50), 0.5)
+        self.assertEqual(histogram_percentile(counters["get_latency"], 100), 250)
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class HotlistTests(SimpleTestCase):
+    def test_ranks_queries_and_decays_scores(self):
+        hotlist = Hotlist(sample_rate=1.0)
+        for _ in range(3):
+            hotlist.record("list", {"page": 2, "page_size": 12})
+        hotlist.record("retrieve", {"pk": "7"})
+
+        self.assertEqual(
+            hotlist.top(2),
+            [
+                ("list", {"page": 2, "page_size": 12}, 3),
+                ("retrieve", {"pk": "7"}, 1),
+            ],
+        )
+
+        hotlist.decay()
+        self.assertEqual(hotlist.top(1)[0][2], 1.5)
+
+
+class CircuitBreakerTests(SimpleTestCase):
+    def setUp(self):
+        self.now = 0
+        self.breaker = CircuitBreaker(
+            failure_threshold=3, cooldown=30, clock=lambda: self.now
+        )
+
+    def test_trips_after_threshold_and_probes_once_after_cooldown(self):
+        for _ in range(3):
+            self.assertTrue(self.breaker.allow_request())
+            self.breaker.record_failure()
+        self.assertEqual(self.breaker.state, OPEN)
+        self.assertFalse(self.breaker.allow_request())
+
+        self.now = 30
+        self.assertTrue(self.breaker.allow_request())
+        self.assertEqual(self.breaker.state, HALF_OPEN)
+        self.assertFalse(self.breaker.allow_request())
+
+        self.breaker.record_failure()
+        self.assertEqual(self.breaker.state, OPEN)
+
+    def test_successful_probe_closes_and_runs_recovery_callbacks(self):
+        recovered = mock.Mock()
+        self.breaker.on_recover(recovered)
+        for _ in range(3):
+            self.breaker.record_failure()
+
+        self.now = 30
+        self.assertTrue(self.breaker.allow_request())
+        self.breaker.record_success()
+
+        self.assertEqual(self.breaker.state, CLOSED)
+        recovered.assert_called_once()
+
+
+# Nothing listens on port 1; RedisCache calls are replaced by a stand-in
+# that fails like a dead server, so no test waits on a real timeout
+DEAD_REDIS_CACHES = {
+    "default": {
+        "BACKEND": "gallery.caching.backends.CircuitBreakerRedisCache",
+        "LOCATION": "redis://127.0.0.1:1/0",
+        "CIRCUIT_BREAKER": {"FAILURE_THRESHOLD": 2, "COOLDOWN": 30},
+    }
+}
+
+
+@override_settings(CACHES=DEAD_REDIS_CACHES)
+class CircuitBreakerCacheTests(SimpleTestCase):
+    def setUp(self):
+        cache.breaker.__init__(failure_threshold=2, cooldown=30)
+        cache.fallback.clear()
+
+    def dead_redis(self):
+        refused = RedisConnectionError("Connection refused")
+        return mock.patch.multiple(
+            RedisCache,
+            get=mock.Mock(side_effect=refused),
+            set=mock.Mock(side_effect=refused),
+        )
+
+    def test_dead_redis_trips_breaker_and_serves_local_fallback(self):
+        with self.dead_redis():
+            cache.set("page", {"ids": [1]}, 300)
+            self.assertEqual(cache.get("page"), {"ids": [1]})
+            self.assertEqual(cache.breaker.state, OPEN)
+
+            # Open: Redis is not tried at all
+            self.assertEqual(cache.get("page"), {"ids": [1]})
+            self.assertEqual(RedisCache.get.call_count, 1)
+
+    def test_raw_redis_users_fall_back_while_open(self):
+        from gallery.caching.connection import get_redis_client
+
+        with self.dead_redis():
+            cache.get("page")
+            cache.get("page")
+
+        self.assertIsNone(get_redis_client())
+
+
+class CodecTests(SimpleTestCase):
+    payload = {"portfolio_items": [{"id": i, "title": "Kitchen remodel"} for i in range(50)]}
+
+    def test_entries_decode_whatever_compressor_wrote_them(self):
+        encoded = codecs.Codec("zlib-9", threshold=0).encode(self.payload)
+        self.assertLess(len(encoded), 300)
+        self.assertEqual(codecs.Codec("lzma").decode(encoded), self.payload)
+
+    def test_small_values_are_stored_uncompressed(self):
+        codec = codecs.Codec("zlib-6", threshold=1024, adaptive=False)
+        self.assertEqual(codec.encode({"id": 1})[0], codecs.IDENTITY.frame_id)
+
+    @mock.patch.object(codecs, "PROBE_EVERY", 1)
+    def test_threshold_drops_when_probes_compress_well(self):
+        codec = codecs.Codec("zlib-6", threshold=64 * 1024)
+        codec.encode(self.payload)
+        self.assertLess(codec.threshold, 64 * 1024)
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class RenderedResponseTests(SimpleTestCase):
+    def setUp(self):
+        cache.clear()
+        response_cache.local.clear()
+
+    def test_list_body_matches_what_the_renderer_would_produce(self):
+        fragments = [render_fragment({"id": 1}), render_fragment({"id": 2})]
+        body = assemble_list_body(fragments, {"current_page": 1}, {"search_query": "tile"})
+        self.assertEqual(
+            body,
+            render_json(
+                {
+                    "search_query": "tile",
+                    "portfolio_items": [{"id": 1}, {"id": 2}],
+                    "pagination": {"current_page": 1},
+                }
+            ),
+        )
+
+    def request_item(self, accept):
+        store_item_fragments({1: {"id": 1, "title": "Kitchen"}}, item_versions([1]))
+        view = PortfolioItemViewSet.as_view({"get": "retrieve"})
+        return view(APIRequestFactory().get("/api/portfolio-items/1/", HTTP_ACCEPT=accept), pk=1)
+
+    def test_json_clients_get_the_cached_bytes(self):
+        response = self.request_item("application/json")
+        self.assertEqual(response.content, b'{"id":1,"title":"Kitchen"}')
+        self.assertEqual(response["Content-Type"], "application/json")
+
+    @override_settings(ALLOWED_HOSTS=["example.com", "cdn.test"], MEDIA_URL="/media/")
+    def test_media_urls_get_the_host_of_each_request(self):
+        store_item_fragments(
+            {1: {"id": 1, "image_url": "/media/portfolio/main/a.jpg"}}, item_versions([1])
+        )
+        view = PortfolioItemViewSet.as_view({"get": "retrieve"})
+        for host, secure, url in [
+            ("example.com", True, b"https://example.com/media/portfolio/main/a.jpg"),
+            ("cdn.test", False, b"http://cdn.test/media/portfolio/main/a.jpg"),
+        ]:
+            request = APIRequestFactory().get("/api/portfolio-items/1/", HTTP_HOST=host, secure=secure)
+            self.assertIn(url, view(request, pk=1).content)
+
+    def test_other_renderers_get_the_decoded_data(self):
+        response = self.request_item("text/html")
+        self.assertEqual(response.data, {"id": 1, "title": "Kitchen"})
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class ConditionalGetTests(SimpleTestCase):
+    def setUp(self):
+        cache.clear()
+
+    def get_list(self, etag):
+        view = PortfolioItemViewSet.as_view({"get": "list"})
+        request = APIRequestFactory().get(
+            "/api/portfolio-items/", HTTP_ACCEPT="application/json", HTTP_IF_NONE_MATCH=etag
+        )
+        return view(request)
+
+    @mock.patch.object(PortfolioItemViewSet, "get_queryset", side_effect=AssertionError)
+    def test_matching_etag_is_answered_before_any_query(self, get_queryset):
+        etag = make_version_etag("portfolio", get_generation("portfolio"), "application/json")
+
+        response = self.get_list(etag)
+
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response["ETag"], etag)
+        get_queryset.assert_not_called()
+
+    @mock.patch.object(singleflight, "WAIT_TIMEOUT", 0)
+    def test_stale_fallback_is_sent_without_validators(self):
+        store_item_fragments({1: {"id": 1}}, item_versions([1]))
+        params = canonical_params(
+            QueryDict(""),
+            "list",
+            default_page_size=PortfolioItemViewSet.list_default_page_size,
+            max_page_size=PortfolioItemViewSet.list_max_page_size,
+        )
+        base_key = page_cache_key("list", params)
+        old_generation = get_generation("portfolio")
+        cache.set(stale_key(base_key), {"ids": [1], "pagination": {}, "generation": old_generation})
+        generation = bump_generation("portfolio")
+        # Another worker is rebuilding the current page
+        acquire_lock(fold_generations(base_key, generation))
+
+        with mock.patch.object(PortfolioItemViewSet, "build_page", side_effect=AssertionError):
+            response = self.get_list('"portfolio-0-0"')
+
+        self.assertEqual(response.status_code, 200)
+        self.assertIn(b'"portfolio_items":[{"id":1}]', response.content)
+        self.assertFalse(response.has_header("ETag"))
+        self.assertFalse(response.has_header("Last-Modified"))
+        self.assertIn("no-store", response["Cache-Control"])
+
+    @mock.patch.object(PortfolioItemViewSet, "list", return_value=HttpResponse(b"{}"))
+    def test_edit_since_the_etag_was_issued_runs_the_view(self, list_view):
+        etag = make_version_etag("portfolio", get_generation("portfolio"), "application/json")
+        bump_generation("portfolio")
+
+        response = self.get_list(etag)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response["ETag"], etag)
+        list_view.assert_called_once()
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class CacheWarmingTests(SimpleTestCase):
+    def setUp(self):
+        cache.clear()
+        response_cache.local.clear()
+
+    @mock.patch.object(PortfolioItemViewSet, "build_item_fragments")
+    @mock.patch.object(PortfolioItemViewSet, "filter_items")
+    def test_warmed_pages_are_the_ones_the_views_read(self, filter_items, build_item_fragments):
+        filter_items.return_value.values_list.return_value = [1, 2]
+        build_item_fragments.side_effect = lambda ids: {i: {"id": i} for i in ids}
+        command = warm_cache.Command()
+        command.only_missing = False
+        command.generation = get_generation("portfolio")
+        for action_name in ("list", "combined"):
+            command.warm_pages(*command.params(action_name))
+
+        with mock.patch.object(PortfolioItemViewSet, "build_page", side_effect=AssertionError):
+            for action_name, url in (
+                ("list", "/api/portfolio-items/"),
+                ("combined", "/api/gallery/combined/"),
+            ):
+                view = PortfolioItemViewSet.as_view({"get": action_name})
+                response = view(APIRequestFactory().get(url, HTTP_ACCEPT="application/json"))
+                self.assertEqual(response.status_code, 200)
+                self.assertIn(b'"portfolio_items":[{"id":1},{"id":2}]', response.content)
+
+    def test_combined_endpoint_is_warmed(self):
+        command = warm_cache.Command()
+        with mock.patch.object(Category.objects, "values_list", return_value=[]), \
+                mock.patch.object(Service.objects, "values_list", return_value=[]), \
+                mock.patch.object(PortfolioItem.objects, "filter") as pairs:
+            pairs.return_value.values_list.return_value.order_by.return_value.distinct.return_value = []
+            combinations = command.page_combinations(["tile"])
+
+        actions = [action_name for action_name, _ in combinations]
+        self.assertEqual(actions.count("combined"), 2)
+        self.assertIn(command.params("combined", q="tile"), combinations)
+
+
+class TTLPolicyTests(SimpleTestCase):
+    def test_timeouts_are_spread_within_the_jitter(self):
+        policy = TTLPolicy(1000, 100, jitter=0.1)
+        hard = {policy.hard_ttl() for _ in range(200)}
+        soft = {policy.soft_ttl() for _ in range(200)}
+        self.assertGreater(len(hard), 10)
+        self.assertTrue(all(900 <= ttl <= 1100 for ttl in hard))
+        self.assertTrue(all(90 <= ttl <= 110 for ttl in soft))
+
+    def test_soft_ttl_never_outlives_the_hard_one(self):
+        policy = TTLPolicy(100, 100, jitter=0.2)
+        self.assertTrue(all(policy.soft_ttl() <= 80 for _ in range(100)))
+
+    def test_stale_copies_share_a_policy(self):
+        self.assertIs(ttl_policy("portfolio_list:stale"), ttl_policy("stale"))
+        self.assertIs(ttl_policy("unknown"), ttl_policy("default"))
+
+    @mock.patch("gallery.caching.ttl.random.random", return_value=0.99)
+    def test_refresh_due_early_inside_the_xfetch_window(self, _):
+        # -log(0.01) * 2s reaches about 9s ahead of the soft expiry
+        self.assertTrue(refresh_due(soft_expires_at=105, early=2.0, now=100))
+        self.assertFalse(refresh_due(soft_expires_at=105, early=0.0, now=100))
+        self.assertFalse(refresh_due(soft_expires_at=120, early=2.0, now=100))
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class InvalidationBusTests(SimpleTestCase):
+    def setUp(self):
+        cache.clear()
+
+    def worker(self, client_factory=lambda: None):
+        """A memo and bus as one gunicorn worker would have them"""
+        memo = ProcessMemo()
+        bus = InvalidationBus(memo, client_factory=client_factory, poll_interval=0.05)
+        memo_get = lambda key, value: memo.get_or_load("category", key, lambda: value)
+        return memo, bus, memo_get
+
+    @mock.patch("gallery.caching.bus.invalidation_bus")
+    def test_polling_worker_evicts_after_a_publish_elsewhere(self, _):
+        memo_a, bus_a, get_a = self.worker()
+        memo_b, bus_b, get_b = self.worker()
+        get_b("kitchen", 3)
+        bus_b.poll_once()  # baseline
+
+        bus_a.publish([("category", None)])
+        self.assertEqual(get_b("kitchen", 4), 3)
+        bus_b.poll_once()
+        self.assertEqual(get_b("kitchen", 4), 4)
+
+    @mock.patch("gallery.caching.bus.invalidation_bus")
+    def test_messages_evict_one_key_or_a_namespace(self, _):
+        memo, bus, get = self.worker()
+        get("kitchen", 3)
+        get("bath", 5)
+        bus.handle_message('[["category","kitchen"]]')
+        self.assertEqual(get("kitchen", 4), 4)
+        self.assertEqual(get("bath", 6), 5)
+        bus.handle_message("not json")
+        bus.handle_message('[["category",null]]')
+        self.assertEqual(get("bath", 6), 6)
+
+    @skipIf(fakeredis is None, "fakeredis not installed")
+    @mock.patch("gallery.caching.bus.invalidation_bus")
+    def test_pubsub_subscriber_thread_evicts(self, _):
+        server = fakeredis.FakeServer()
+        client_factory = lambda: fakeredis.FakeRedis(server=server)
+        memo_a, bus_a, get_a = self.worker(client_factory)
+        memo_b, bus_b, get_b = self.worker(client_factory)
+        get_b("kitchen", 3)
+        bus_b.ensure_started()
+        self.addCleanup(bus_b.stop)
+        time.sleep(0.1)  # subscribed
+
+        bus_a.publish([("category", "kitchen")])
+        deadline = time.monotonic() + 2
+        while get_b("kitchen", 4) == 3 and time.monotonic() < deadline:
+            time.sleep(0.02)
+        self.assertEqual(get_b("kitchen", 4), 4)
+
+
+@skipIf(fakeredis is None, "fakeredis not installed")
+@override_settings(CACHES=LOCMEM_CACHES)
+class CacheSnapshotTests(SimpleTestCase):
+    def setUp(self):
+        self.redis = fakeredis.FakeRedis()
+        patches = [
+            mock.patch.object(cache_snapshot, "get_redis_client", return_value=self.redis),
+            mock.patch.object(
+                cache_snapshot,
+                "get_generation",
+                side_effect=lambda family: int(self.redis.get(self.key(f"gen:{family}"))),
+            ),
+        ]
+        for patch in patches:
+            patch.start()
+            self.addCleanup(patch.stop)
+        snapshot_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(snapshot_dir.cleanup)
+        self.path = os.path.join(snapshot_dir.name, "snapshot.bin.gz")
+
+    def key(self, name):
+        return cache.make_key(name)
+
+    def run_command(self, **options):
+        call_command("cache_snapshot", file=self.path, stdout=StringIO(), **options)
+
+    def dump_site(self):
+        self.redis.set(self.key("gen:portfolio"), 5)
+        self.redis.set(self.key("portfolio_list_page=1:g5"), b"page")
+        self.redis.set(self.key("portfolio_item_1:g5"), b"item", ex=600)
+        self.redis.set(self.key("portfolio_list_page=1:g4"), b"old page")
+        self.redis.set(self.key("django.contrib.sessions.cacheabc"), b"session")
+        self.redis.sadd(self.key("tag:item:1"), "portfolio_item_1:g5")
+        self.run_command(dump=True)
+        self.redis.flushall()
+
+    def test_round_trip_restores_only_pages_items_and_counters(self):
+        self.dump_site()
+        self.run_command(restore=True)
+
+        self.assertEqual(
+            sorted(key.decode() for key in self.redis.keys()),
+            sorted(
+                self.key(name)
+                for name in ["gen:portfolio", "portfolio_list_page=1:g5", "portfolio_item_1:g5"]
+            ),
+        )
+        self.assertGreater(self.redis.ttl(self.key("portfolio_item_1:g5")), 0)
+
+    def test_restore_never_lowers_a_live_counter(self):
+        self.dump_site()
+        # An edit bumped the generation after the dump
+        self.redis.set(self.key("gen:portfolio"), 6)
+        self.run_command(restore=True)
+
+        self.assertEqual(int(self.redis.get(self.key("gen:portfolio"))), 6)
+        self.assertIsNone(self.redis.get(self.key("portfolio_list_page=1:g5")))
+
+
+class MediaProcessingTests(SimpleTestCase):
+    def setUp(self):
+        media_root = tempfile.TemporaryDirectory()
+        self.addCleanup(media_root.cleanup)
+        self.media_root = media_root.name
+        override = override_settings(MEDIA_ROOT=self.media_root)
+        override.enable()
+        self.addCleanup(override.disable)
+
+    def upload(self, name, size, mode="RGB"):
+        path = os.path.join(self.media_root, name)
+        Image.new(mode, size).save(path)
+        return SimpleNamespace(path=path, name=f"portfolio/main/{name}")
+
+    def test_variants_fit_their_boxes(self):
+        generate_image_variants(self.upload("wide.png", (1600, 400), "RGBA"), "portfolio", "main")
+        with Image.open(os.path.join(self.media_root, "portfolio/thumbnails/thumb_wide.png")) as thumb:
+            self.assertEqual(thumb.size, (300, 75))
+        with Image.open(os.path.join(self.media_root, "portfolio/gallery/gallery_wide.png")) as gallery:
+            self.assertEqual(gallery.size, (800, 200))
+
+    def test_large_jpeg_is_drafted_not_copied(self):
+        source = self.upload("photo.jpg", (3200, 2400))
+        draft = JpegImagePlugin.JpegImageFile.draft
+        with mock.patch.object(JpegImagePlugin.JpegImageFile, "draft", autospec=True, side_effect=draft) as drafted, \
+                mock.patch.object(Image.Image, "copy") as copy:
+            generate_image_variants(source, "portfolio", "main")
+        # Decoded at half size: twice the 800x600 gallery image
+        self.assertEqual(drafted.call_args.args[2], (1600, 1200))
+        copy.assert_not_called()
+        for name, size in [("thumbnails/thumb_photo.jpg", (300, 225)), ("gallery/gallery_photo.jpg", (800, 600))]:
+            with Image.open(os.path.join(self.media_root, "portfolio", name)) as variant:
+                self.assertEqual(variant.size, size)
+
+    def test_sizes_that_round_unevenly_still_render(self):
+        # Drafting and the gallery pass leave the source's aspect off by a
+        # pixel; each crop box must still fit inside it
+        for size, thumb, gallery in [
+            ((6000, 4000), (300, 200), (800, 533)),
+            ((1080, 1920), (169, 300), (338, 600)),
+            ((4000, 3001), (300, 225), (800, 600)),
+            ((799, 601), (300, 226), (798, 600)),
+            ((4033, 3025), (300, 225), (800, 600)),
+        ]:
+            for extension in ("jpg", "png"):
+                with self.subTest(size=size, format=extension):
+                    name = f"odd.{extension}"
+                    paths = render_variants(self.upload(name, size).path, name, self.media_root)
+                    self.assertEqual([Image.open(path).size for path in paths], [thumb, gallery])
+
+        square = Variant("square", (200, 200), fit=COVER, format="WEBP", directory="square")
+        crop = plan(square, (4033, 3025))[1]
+        left, top, right, bottom = source_box(crop, (4033, 3025), (1009, 756))
+        self.assertTrue(0 <= left < right <= 1009 and 0 <= top < bottom <= 756)
+        self.assertIsNone(source_box((0, 0, 799, 601), (799, 601), (798, 600)))
+
+    def test_pool_renders_in_worker_processes(self):
+        source = self.upload("pool.jpg", (1200, 900))
+        pool = VariantPool(1, memory_limit_mb=512)
+        self.addCleanup(pool.shutdown)
+        paths = pool.render_many([(source.path, "pool.jpg", os.path.join(self.media_root, "out"))])
+        self.assertEqual(
+            [os.path.relpath(path, self.media_root) for path in paths],
+            ["out/thumbnails/thumb_pool.jpg", "out/gallery/gallery_pool.jpg"],
+        )
+
+    def test_missing_upload_raises_so_the_job_is_retried(self):
+        missing = SimpleNamespace(path=os.path.join(self.media_root, "gone.jpg"), name="gone.jpg")
+        with self.assertRaises(FileNotFoundError):
+            generate_image_variants(missing, "portfolio", "main")
+
+    def test_unchanged_images_are_not_queued_again(self):
+        os.makedirs(os.path.join(self.media_root, "portfolio/main"))
+        Image.new("RGB", (100, 100)).save(os.path.join(self.media_root, "portfolio/main/same.jpg"))
+        item = PortfolioItem(image="portfolio/main/same.jpg")
+        item.media_fingerprints = {"image": fingerprint(item.image, "abc")}
+        self.assertFalse(images_changed(item))
+        self.assertFalse(images_changed(item, update_fields=["title"]))
+
+        os.utime(item.image.path, ns=(0, 0))
+        self.assertTrue(images_changed(item))
+        item.media_fingerprints = {}
+        self.assertTrue(images_changed(item))
+
+    def test_clearing_an_image_queues_cleanup_of_its_variants(self):
+        item = PortfolioItem(image="")
+        self.assertFalse(images_changed(item))
+        item.media_fingerprints = {"image": {"name": "portfolio/main/old.jpg"}}
+        self.assertTrue(images_changed(item))
+
+    @mock.patch("django.db.models.Model.save")
+    def test_edits_never_write_the_fields_the_worker_owns(self, model_save):
+        item = PortfolioItem(pk=1, title="Kitchen")
+        item._state.adding = False
+        item.save()
+
+        update_fields = model_save.call_args.kwargs["update_fields"]
+        self.assertIn("title", update_fields)
+        self.assertIn("image", update_fields)
+        self.assertNotIn("media_fingerprints", update_fields)
+        self.assertNotIn("processing_status", update_fields)
+
+        PortfolioItem(title="New").save()
+        self.assertNotIn("update_fields", model_save.call_args.kwargs)
+
+    def test_urls_and_cleanup_follow_the_registry(self):
+        item = PortfolioItem(image="portfolio/main/a.png", after_image="portfolio/after/b.jpg")
+        self.assertEqual(
+            variant_files(item),
+            [
+                "portfolio/thumbnails/thumb_a.png",
+                "portfolio/gallery/gallery_a.png",
+                "portfolio/after/thumbnails/thumb_b.jpg",
+                "portfolio/after/gallery/gallery_b.jpg",
+            ],
+        )
+        picture = PortfolioImage(image="portfolio/images/c.jpg")
+        self.assertEqual(
+            variant_urls(None, picture),
+            {"image": {
+                "thumb": "/media/portfolio/images/thumbnails/thumb_c.jpg",
+                "gallery": "/media/portfolio/images/gallery/gallery_c.jpg",
+            }},
+        )
+
+    def test_cover_variant_is_cropped_to_its_box(self):
+        square = Variant("square", (200, 200), fit=COVER, format="WEBP", directory="square")
+        self.assertEqual(square.filename("wide.jpg"), "square_wide.webp")
+        self.assertEqual(plan(square, (1600, 400)), (0.5, (600.0, 0.0, 1000.0, 400.0), (200, 200)))
+
+    @override_settings(MEDIA_JOB_RETRY_DELAY=30)
+    def test_retry_delay_doubles(self):
+        self.assertEqual([retry_delay(n) for n in (1, 2, 3)], [30, 60, 120])
+
+    @mock.patch.object(queue, "set_asset_status")
+    @mock.patch.object(queue, "MediaJob")
+    def test_job_is_written_when_the_upload_commits(self, media_job, _):
+        media_job.objects.filter.return_value.exists.return_value = False
+        on_commit = []
+        with mock.patch.object(queue.transaction, "on_commit", on_commit.append):
+            queue.enqueue(PortfolioItem(pk=5))
+
+        media_job.objects.create.assert_not_called()
+        on_commit[0]()
+        media_job.objects.create.assert_called_once()
@@ -1,68 +1,126 @@
-import json
-import gzip
-import base64
+import struct
 import time
 import hashlib
+import math
 from django.core.cache import cache
+from django.core.cache.backends.base import DEFAULT_TIMEOUT
 from django.conf import settings
+from .caching.codecs import Codec, DEFAULT_THRESHOLD
+from .caching.keys import family_of
+from .caching.swr import schedule_refresh
+from .caching.tags import tag_registry
+from .caching.ttl import refresh_due, ttl_policy
+
+# Stored in front of the encoded value: soft_expires_at, the early refresh
+# window, and the unjittered timeout and soft_timeout (-1 for no timeout)
+ENTRY_HEADER = struct.Struct(">ddii")
 
 class AdvancedCache:
     """Advanced caching with versioning and compression"""
 
-    CACHE_VERSION = 1
-    COMPRESSION_THRESHOLD = 1024 # Compress data larger than 1KB
+    # 3: early refresh window in the header (2 added the binary codec,
+    # 1 was a JSON/gzip/base64 dict)
+    CACHE_VERSION = 3
+
+    # Pickle plus the configured compressor above an adaptive threshold;
+    # see caching.codecs and the benchmark_codecs command
+    codec = Codec(
+        getattr(settings, 'CACHE_CODEC', 'zlib-6'),
+        getattr(settings, 'CACHE_COMPRESSION_THRESHOLD', DEFAULT_THRESHOLD),
+    )
 
     @classmethod
-    def _compress_data(cls, data):
-        """Compress data if it's large enough"""
-        json_data = json.dumps(data)
-        if len(json_data) > cls.COMPRESSION_THRESHOLD:
-            compressed = gzip.compress(json_data.encode('utf-8'))
-            return base64.b64encode(compressed).decode('utf-8'), True
-        return json_data, False
-    
+    def _encode_entry(cls, data, soft_expires_at, early, timeout, soft_timeout):
+        """Header and encoded data as one bytes value"""
+        header = ENTRY_HEADER.pack(
+            soft_expires_at,
+            early,
+            -1 if timeout is None else timeout,
+            -1 if soft_timeout is None else soft_timeout,
+        )
+        return header + cls.codec.encode(data)
+
     @classmethod
-    def _decompress_data(cls, data, is_compressed):
-        """Decompress data if it was compressed"""
-        if is_compressed:
-            compressed_data = base64.b64decode(data.encode('utf-8'))
-            json_data = gzip.decompress(compressed_data).decode('utf-8')
-            return json.loads(json_data)
-        return json.loads(data)
+    def _decode_entry(cls, entry):
+        """Return (data, soft_expires_at, early, timeout, soft_timeout)"""
+        soft_expires_at, early, timeout, soft_timeout = ENTRY_HEADER.unpack_from(entry)
+        data = cls.codec.decode(memoryview(entry)[ENTRY_HEADER.size:])
+        return (
+            data,
+            soft_expires_at,
+            early,
+            None if timeout == -1 else timeout,
+            None if soft_timeout == -1 else soft_timeout,
+        )
 
     @classmethod
-    def set(cls, key, data, timeout=300, version=None):
-        """Set cache with compression and versioning"""
+    def set(
+        cls,
+        key,
+        data,
+        timeout=DEFAULT_TIMEOUT,
+        version=None,
+        soft_timeout=None,
+        tags=None,
+        compute_time=0.0,
+    ):
+        """
+        Set cache with compression and versioning.
+
+        timeout is the hard expiry; by default it (and soft_timeout) come
+        from the TTL policy of the key's family. After soft_timeout (default:
+        timeout) get() still returns the data but flags it for a background
+        refresh. Both are jittered by the policy. compute_time is how long
+        data took to build, for early refresh. tags (e.g. ['category:3',
+        'business']) let invalidate_tags() drop the entry when something it
+        depends on changes.
+        """
         version = version or cls.CACHE_VERSION
+        policy = ttl_policy(family_of(key))
+        if timeout is DEFAULT_TIMEOUT:
+            timeout = policy.timeout
+            if soft_timeout is None:
+                soft_timeout = policy.soft_timeout
+        soft_timeout = soft_timeout if soft_timeout is not None else timeout
         versioned_key = f"{key}:v{version}"
 
-        # Compress data if needed
-        compressed_data, is_compressed = cls._compress_data(data)
+        stored_timeout = policy.jittered(timeout)
+        soft_ttl = policy.jittered(soft_timeout)
+        if stored_timeout is not None and soft_ttl is not None:
+            soft_ttl = min(soft_ttl, stored_timeout)
+        soft_expires_at = time.time() + soft_ttl if soft_ttl is not None else float('inf')
 
-        cache_data = {
-            'data': compressed_data,
-            'compressed': is_compressed,
-            'version': version,
-            'timestamp': time.time()
-        }
+        # Compresses above the codec's threshold; stored as plain bytes
+        entry = cls._encode_entry(
+            data, soft_expires_at, policy.early(compute_time), timeout, soft_timeout
+        )
 
-        cache.set(versioned_key, cache_data, timeout)
-        print(f"Cached {key} (compressed: {is_compressed}, version: {version})")
+        cache.set(versioned_key, entry, stored_timeout)
+        if tags:
+            # As long as any entry with this timeout can live, not just this one
+            tag_timeout = math.ceil(timeout * (1 + policy.jitter)) if timeout else None
+            tag_registry.register({versioned_key: tags}, tag_timeout)
+        print(f"Cached {key} ({len(entry)} bytes, version: {version})")
 
     @classmethod
-    def get(cls, key, version=None):
-        """Get cache with decompression and versioning"""
+    def get(cls, key, version=None, refresh=None):
+        """
+        Get cache with decompression and versioning.
+
+        If the entry is past its soft expiry and refresh is given, the stale
+        data is returned immediately and refresh() is called in the
+        background pool to produce the replacement.
+        """
         version = version or cls.CACHE_VERSION
         versioned_key = f"{key}:v{version}"
 
-        cache_data = cache.get(versioned_key)
-        if cache_data:
+        entry = cache.get(versioned_key)
+        if entry:
             try:
-                data = cls._decompress_data(
-                    cache_data['data'],
-                    cache_data.get('compressed', False)
-                )
+                data, soft_expires_at, early, timeout, soft_timeout = cls._decode_entry(entry)
                 print(f"Cache hit: {key} (version: {version})")
+                if refresh and refresh_due(soft_expires_at, early):
+                    cls._schedule_refresh(key, version, refresh, timeout, soft_timeout)
                 return data
             except Exception as e:
                 print(f"Cache decompression error: {e}")
@@ -71,6 +129,23 @@ class AdvancedCache:
         print(f"Cache miss: {key}")
         return None
 
+    @classmethod
+    def _schedule_refresh(cls, key, version, refresh, timeout, soft_timeout):
+        """Rebuild a soft-expired entry off the request path"""
+        def rebuild():
+            start = time.perf_counter()
+            data = refresh()
+            cls.set(
+                key,
+                data,
+                timeout=timeout,
+                version=version,
+                soft_timeout=soft_timeout,
+                compute_time=time.perf_counter() - start,
+            )
+
+        schedule_refresh(f"{key}:v{version}", rebuild)
+
     @classmethod
     def delete(cls, key, version=None):
         """Delete cache with versioning"""
@@ -79,10 +154,25 @@ class AdvancedCache:
         cache.delete(versioned_key)
         print(f"Deleted cache: {key} (version: {version})")
 
+    @classmethod
+    def invalidate_tags(cls, *tags):
+        """Delete every entry registered under any of the given tags"""
+        cleared = tag_registry.invalidate(*tags)
+        print(f"Invalidated tags: {', '.join(tags)} ({cleared} keys)")
+        return cleared
+
     @classmethod
     def invalidate_pattern(cls, pattern, version=None):
-        """Invalidate all caches matching a pattern"""
+        """
+        Invalidate all caches matching a glob pattern.
+
+        This SCANs the keyspace, so prefer invalidate_tags() on hot paths.
+        """
         version = version or cls.CACHE_VERSION
-        # This would require Redis-specific implementation
-        # For now, we'll use a simple approach
-        print(f"Invalidating pattern: {pattern} (version: {version})")
\ No newline at end of file
+        if hasattr(cache, 'delete_pattern'):
+            cleared = cache.delete_pattern(f"{pattern}:v{version}")
+            print(f"Invalidated pattern: {pattern} (version: {version}, {cleared} keys)")
+            return cleared
+
+        print(f"Pattern invalidation needs the Redis cache backend: {pattern}")
+        return 0
\ No newline at end of file
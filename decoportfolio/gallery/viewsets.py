@@ -5,7 +5,9 @@ from django.db import models
 from django.core.cache import cache
 from django.core.cache.utils import make_template_fragment_key
 from django.core.paginator import Paginator, EmptyPage, PageNotAnInteger
+from django.http import Http404
 import json
+import time
 from .models import PortfolioItem, Category, Service, BusinessInfo
 from .serializers import (
     PortfolioItemSerializer,
@@ -13,28 +15,44 @@ from .serializers import (
     ServiceSerializer,
     BusinessInfoSerializer,
 )
+from .caching.bus import process_memo
+from .caching.generations import fold_generations, get_generation
+from .caching.hotlist import hotlist
+from .caching.keys import (
+    DEFAULT_PAGE,
+    canonical_params,
+    key_family,
+    keyspace_counter,
+    normalize_pagination,
+    page_cache_key,
+)
+from .caching.fragments import (
+    LOCAL_GENERATION,
+    get_item_fragments,
+    item_base_key,
+    item_fragment_key,
+    item_versions,
+    store_item_fragments,
+)
+from .caching.negative import is_known_missing, remember_missing
+from .caching.tiered import response_cache
+from .caching.singleflight import single_flight, stale_key, store_stale
+from .caching.swr import schedule_refresh, unwrap, wrap
+from .caching.ttl import ttl_policy
+from .caching.rendering import assemble_list_body, rendered_response
+from .caching.conditional import ConditionalGetMixin, mark_outdated
 
 
 def paginate_queryset(queryset, page, page_size, request):
     """Helper function to paginate queryset and return paginated data"""
-    min_page_size = 5
-    max_page_size = 200
-    default_page = 1
-    default_page_size = 20
-
-    try:
-        page_size = int(page_size) if page_size else default_page_size
-        page_size = max(min_page_size, min(page_size, max_page_size))
-    except (ValueError, TypeError):
-        page_size = default_page_size
+    page_number, page_size = normalize_pagination(page, page_size)
 
     paginator = Paginator(queryset, page_size)
 
     try:
-        page_number = int(page) if page else default_page
         page_obj = paginator.page(page_number)
-    except (ValueError, TypeError, EmptyPage):
-        page_obj = paginator.page(default_page)
+    except EmptyPage:
+        page_obj = paginator.page(DEFAULT_PAGE)
 
     items = page_obj.object_list
 
@@ -54,7 +72,7 @@ def paginate_queryset(queryset, page, page_size, request):
     return items, pagination_data
 
 
-class PortfolioItemViewSet(viewsets.ReadOnlyModelViewSet):
+class PortfolioItemViewSet(ConditionalGetMixin, viewsets.ReadOnlyModelViewSet):
     """
     ViewSet for portfolio items with search, filter, and pagination capabilities
 
@@ -65,10 +83,12 @@ class PortfolioItemViewSet(viewsets.ReadOnlyModelViewSet):
     - Filter by category and service
     - Combined search and filtering
     - Pagination support
+    - Conditional GET (ETag / Last-Modified)
     """
 
     permission_classes = [permissions.AllowAny]
     authentication_classes = []
+    content_version_family = "portfolio"
 
     queryset = PortfolioItem.objects.select_related(
         "category", "service"
@@ -76,62 +96,206 @@ class PortfolioItemViewSet(viewsets.ReadOnlyModelViewSet):
     serializer_class = PortfolioItemSerializer
     default_page = 1
     default_page_size = 20
+    list_default_page_size = 12
+    list_max_page_size = 100
+
+    def get_fragment_serializer(self, instance, many=False):
+        """
+        Serializer for the shared fragment cache. Without a request in its
+        context media URLs stay relative to MEDIA_URL; rendered_response
+        adds the scheme and host of whoever reads the fragment.
+        """
+        context = {"view": self, "format": self.format_kwarg}
+        return self.get_serializer(instance, many=many, context=context)
+
+    def build_item_fragments(self, item_ids):
+        """Serialize the given items, keyed by id, for the fragment cache"""
+        items = self.get_queryset().filter(id__in=item_ids)
+        serializer = self.get_fragment_serializer(items, many=True)
+        return {data["id"]: data for data in serializer.data}
+
+    def filter_items(self, action_name, params):
+        """Apply an action's canonical search/filter params to the queryset"""
+        queryset = self.get_queryset()
 
-    def list(self, request, *args, **kwargs):
-        # Check cache first
-        cache_key = f"portfolio_list_{request.GET.urlencode()}"
-        cached_data = cache.get(cache_key)
-
-        if cached_data:
-            print(f"Serving from cache: {cache_key}")
-            return Response(cached_data)
+        if action_name == "by_category":
+            # Evicted in every worker by the invalidation bus on category saves
+            category_id = process_memo.get_or_load(
+                "category",
+                params["category"],
+                lambda: Category.objects.get(name__iexact=params["category"]).id,
+            )
+            return queryset.filter(category_id=category_id)
 
-        # Generate response if not in cache
-        print(f"Generating new response for: {cache_key}")
-        queryset = self.get_queryset()
+        # Apply text search if query provided
+        query = params.get("q")
+        if query:
+            queryset = queryset.filter(
+                models.Q(title__icontains=query)
+                | models.Q(description__icontains=query)
+            )
 
         # Apply filters
-        category = request.GET.get("category")
-        if category:
-            queryset = queryset.filter(category__name__iexact=category)
+        if params.get("category"):
+            queryset = queryset.filter(category__name__iexact=params["category"])
+
+        if params.get("service"):
+            queryset = queryset.filter(service__name__iexact=params["service"])
+
+        return queryset
 
-        # Pagination
-        page = int(request.GET.get("page", self.default_page))
-        page_size = min(int(request.GET.get("page_size", 12)), 100)
+    def build_page(self, action_name, params, generation):
+        """Query the ids and pagination for one page and cache them"""
+        start = time.perf_counter()
+        base_key = page_cache_key(action_name, params)
+        print(f"Generating new response for: {base_key}")
 
-        items, pagination_data = paginate_queryset(
-            self.queryset, page, page_size, request
+        page_ids, pagination_data = paginate_queryset(
+            self.filter_items(action_name, params).values_list("id", flat=True),
+            params["page"],
+            params["page_size"],
+            self.request,
         )
-        serializer = self.get_serializer(items, many=True)
+        cached_page = {"ids": list(page_ids), "pagination": pagination_data}
+        compute_time = time.perf_counter() - start
+
+        # Out-of-range pages are answered with page 1, stored under the
+        # page-1 key. The requested key only gets a short-lived copy, so
+        # repeats and single-flight waiters find it while junk page numbers
+        # expire within a minute instead of adding long-lived keys.
+        if pagination_data["current_page"] != params["page"]:
+            out_of_range = ttl_policy("portfolio_notfound")
+            response_cache.set(
+                fold_generations(base_key, generation),
+                wrap(cached_page, out_of_range, compute_time),
+                out_of_range.hard_ttl(),
+                generation,
+            )
+            base_key = page_cache_key(
+                action_name, {**params, "page": pagination_data["current_page"]}
+            )
+
+        # Jittered per key family so pages built together expire apart
+        policy = ttl_policy(key_family(action_name))
+        response_cache.set(
+            fold_generations(base_key, generation),
+            wrap(cached_page, policy, compute_time),
+            policy.hard_ttl(),
+            generation,
+        )
+        # Tagged with its generation: a waiter may serve it after later edits
+        store_stale(stale_key(base_key), {**cached_page, "generation": generation})
+        keyspace_counter.record(key_family(action_name), base_key)
+        return cached_page
+
+    def cached_page_response(
+        self, request, action_name, params, extra=None, generation=None
+    ):
+        """
+        Serve one page of items for an action from the cache.
+
+        Pages only hold item ids; the items themselves are cached once each.
+        extra holds the request-specific fields (echoed query, filters) that
+        precede portfolio_items in the response.
+        """
+        if generation is None:
+            generation = get_generation("portfolio")
+        base_key = page_cache_key(action_name, params)
+        cache_key = fold_generations(base_key, generation)
+        cached_page, is_stale = unwrap(response_cache.get(cache_key, generation))
+
+        if cached_page:
+            print(f"Serving from cache: {cache_key}")
+            if is_stale:
+                # Past its soft expiry: serve it now, rebuild it off-request
+                schedule_refresh(
+                    cache_key,
+                    lambda: self.build_page(action_name, params, generation),
+                )
+        else:
+            # Only one request regenerates; the rest wait or get the last page
+            cached_page = single_flight(
+                cache_key,
+                read=lambda: unwrap(response_cache.get(cache_key, generation))[0],
+                generate=lambda: self.build_page(action_name, params, generation),
+                stale_key=stale_key(base_key),
+            )
+
+        # Stitch the pre-rendered items into the response body
+        fragments = get_item_fragments(cached_page["ids"], self.build_item_fragments)
+        body = assemble_list_body(fragments, cached_page["pagination"], extra)
 
-        # Prepare response data
-        response_data = {
-            "portfolio_items": serializer.data,
-            "pagination": pagination_data,
-        }
+        # Sampled; ranks what to rebuild first after an invalidation
+        hotlist.record(action_name, params)
+        response = rendered_response(request, body)
+        if cached_page.get("generation", generation) != generation:
+            mark_outdated(response)
+        return response
+
+    def list(self, request, *args, **kwargs):
+        params = canonical_params(
+            request.GET,
+            "list",
+            default_page_size=self.list_default_page_size,
+            max_page_size=self.list_max_page_size,
+        )
+        return self.cached_page_response(request, "list", params)
 
-        # Cache the response for 5 minutes
-        cache.set(cache_key, response_data, 300)
+    def build_item(self, cache_key, version):
+        """Serialize the requested item and cache it as a fragment"""
+        start = time.perf_counter()
+        print(f"Generating new response for: {cache_key}")
+        instance = self.get_object()
+        serializer = self.get_fragment_serializer(instance)
 
-        return Response(response_data)
+        fragments = store_item_fragments(
+            {instance.id: serializer.data},
+            {instance.id: version},
+            time.perf_counter() - start,
+        )
+        keyspace_counter.record("portfolio_item", item_base_key(instance.id))
+        return fragments[instance.id]
 
     def retrieve(self, request, *args, **kwargs):
         """Retrieve a portfolio item by ID"""
-        # Check cache first
-        cache_key = f"portfolio_item_{kwargs['pk']}"
-        cached_data = cache.get(cache_key)
+        pk = kwargs["pk"]
+        # Only real ids get a version counter
+        if not str(pk).isdigit():
+            raise Http404(
+                f"No {PortfolioItem._meta.object_name} matches the given query."
+            )
 
-        if cached_data:
-            print(f"Serving from cache: {cache_key}")
-            return Response(cached_data)
+        # Check cache first; this is the same fragment the list pages use
+        version = item_versions([pk])[pk]
+        cache_key = item_fragment_key(pk, version)
+        fragment, is_stale = unwrap(response_cache.get(cache_key, LOCAL_GENERATION))
 
-        # Generate response if not in cache
-        print(f"Generating new response for: {cache_key}")
-        instance = self.get_object()
-        serializer = self.get_serializer(instance)
+        if fragment:
+            print(f"Serving from cache: {cache_key}")
+            if is_stale:
+                schedule_refresh(
+                    cache_key, lambda: self.build_item(cache_key, version)
+                )
+            hotlist.record("retrieve", {"pk": pk})
+            return rendered_response(request, fragment["body"])
+
+        # Unknown pks are remembered briefly so repeats skip the database;
+        # creating any item bumps the portfolio generation
+        generation = get_generation("portfolio")
+        if is_known_missing("item", pk, generation):
+            raise Http404(
+                f"No {PortfolioItem._meta.object_name} matches the given query."
+            )
 
-        # Cache for 10 minutes (individual items change less frequently)
-        cache.set(cache_key, serializer.data, 600)
+        try:
+            fragment = single_flight(
+                cache_key,
+                read=lambda: unwrap(response_cache.get(cache_key, LOCAL_GENERATION))[0],
+                generate=lambda: self.build_item(cache_key, version),
+            )
+        except Http404:
+            remember_missing("item", pk, generation)
+            raise
 
         # try:
         #     item = self.queryset.get(id=pk)
@@ -140,36 +304,24 @@ class PortfolioItemViewSet(viewsets.ReadOnlyModelViewSet):
         # except PortfolioItem.DoesNotExist:
         #     return Response({'error': 'Portfolio item not found'}, status=status.HTTP_404_NOT_FOUND)
 
-        return Response(serializer.data)
+        hotlist.record("retrieve", {"pk": pk})
+        return rendered_response(request, fragment["body"])
 
     @action(detail=False, methods=["get"])
     def search(self, request):
         """ "Search portfolio items by text"""
         query = request.GET.get("q", "").strip()
-        page = request.GET.get("page", self.default_page)
-        page_size = request.GET.get("page_size", self.default_page_size)
 
         if not query:
             return Response(
                 {"error": "Seach query is required"}, status=status.HTTP_400_BAD_REQUEST
             )
 
-        # Search in title and description
-        search_results = self.queryset.filter(
-            models.Q(title__icontains=query) | models.Q(description__icontains=query)
-        )
-
-        items, pagination_data = paginate_queryset(
-            search_results, page, page_size, request
+        params = canonical_params(
+            request.GET, "search", default_page_size=self.default_page_size
         )
-        serializer = self.get_serializer(items, many=True)
-
-        return Response(
-            {
-                "search_query": query,
-                "portfolio_items": serializer.data,
-                "pagination": pagination_data,
-            }
+        return self.cached_page_response(
+            request, "search", params, {"search_query": query}
         )
 
     @action(detail=False, methods=["get"])
@@ -177,33 +329,20 @@ class PortfolioItemViewSet(viewsets.ReadOnlyModelViewSet):
         """Filter portfolio items by category and service"""
         category = request.GET.get("category", "").strip()
         service = request.GET.get("service", "").strip()
-        page = request.GET.get("page", self.default_page)
-        page_size = request.GET.get("page_size", self.default_page_size)
-
-        # Start with all items
-        filtered_results = self.queryset.all()
-
-        # Apply filters
-        if category:
-            filtered_results = filtered_results.filter(category__name__iexact=category)
-
-        if service:
-            filtered_results = filtered_results.filter(service__name__iexact=service)
 
-        items, pagination_data = paginate_queryset(
-            filtered_results, page, page_size, request
+        params = canonical_params(
+            request.GET, "filter", default_page_size=self.default_page_size
         )
-        serializer = self.get_serializer(items, many=True)
-
-        return Response(
+        return self.cached_page_response(
+            request,
+            "filter",
+            params,
             {
                 "filters_applied": {
                     "category": category if category else None,
                     "service": service if service else None,
                 },
-                "portfolio_items": serializer.data,
-                "pagination": pagination_data,
-            }
+            },
         )
 
     @action(detail=False, methods=["get"])
@@ -212,49 +351,28 @@ class PortfolioItemViewSet(viewsets.ReadOnlyModelViewSet):
         query = request.GET.get("q", "").strip()
         category = request.GET.get("category", "").strip()
         service = request.GET.get("service", "").strip()
-        page = request.GET.get("page", self.default_page)
-        page_size = request.GET.get("page_size", self.default_page_size)
-
-        # Start with all items
-        combined_results = self.queryset.all()
-
-        # Apply text search if query provided
-        if query:
-            combined_results = combined_results.filter(
-                models.Q(title__icontains=query)
-                | models.Q(description__icontains=query)
-            )
-
-        # Apply filters
-        if category:
-            combined_results = combined_results.filter(category__name__iexact=category)
 
-        if service:
-            combined_results = combined_results.filter(service__name__iexact=service)
-
-        items, pagination_data = paginate_queryset(
-            combined_results, page, page_size, request
+        params = canonical_params(
+            request.GET, "combined", default_page_size=self.default_page_size
         )
-        serializer = self.get_serializer(items, many=True)
-
-        return Response(
+        return self.cached_page_response(
+            request,
+            "combined",
+            params,
             {
                 "search_query": query if query else None,
                 "filters_applied": {
                     "category": category if category else None,
                     "service": service if service else None,
                 },
-                "portfolio_items": serializer.data,
-                "pagination": pagination_data,
-            }
+            },
         )
 
     @action(detail=False, methods=["get"])
-    def by_category(self, request):
+    def by_category(self, request, category=None):
         """Get portfolio items by category"""
-        category = request.GET.get("category", "").strip()
-        page = request.GET.get("page", self.default_page)
-        page_size = request.GET.get("page_size", self.default_page_size)
+        # From the query string, or the path on api/gallery/category/<category>/
+        category = (category or request.GET.get("category", "")).strip()
 
         if not category:
             return Response(
@@ -262,66 +380,82 @@ class PortfolioItemViewSet(viewsets.ReadOnlyModelViewSet):
                 status=status.HTTP_400_BAD_REQUEST,
             )
 
-        try:
-            category_obj = Category.objects.get(name__iexact=category)
-            category_results = self.queryset.filter(category=category_obj)
-
-            items, pagination_data = paginate_queryset(
-                category_results, page, page_size, request
-            )
-            serializer = self.get_serializer(items, many=True)
+        params = canonical_params(
+            request.GET,
+            "by_category",
+            default_page_size=self.default_page_size,
+            category=category,
+        )
+        generation = get_generation("portfolio")
+        if is_known_missing("category", params["category"], generation):
+            return self.category_not_found()
 
-            return Response(
-                {
-                    "category": category,
-                    "portfolio_items": serializer.data,
-                    "pagination": pagination_data,
-                }
+        try:
+            return self.cached_page_response(
+                request, "by_category", params, {"category": category}, generation
             )
         except Category.DoesNotExist:
-            return Response(
-                {"error": "Category not found"}, status=status.HTTP_404_NOT_FOUND
-            )
+            remember_missing("category", params["category"], generation)
+            return self.category_not_found()
+
+    def category_not_found(self):
+        return Response(
+            {"error": "Category not found"}, status=status.HTTP_404_NOT_FOUND
+        )
 
 
-class CategoryViewSet(viewsets.ReadOnlyModelViewSet):
+class CategoryViewSet(ConditionalGetMixin, viewsets.ReadOnlyModelViewSet):
     """ViewSet for categories - Public read-only access"""
 
     queryset = Category.objects.all()
     serializer_class = CategorySerializer
     permission_classes = [permissions.AllowAny]
     authentication_classes = []
+    content_version_family = "category"
 
 
-class ServiceViewSet(viewsets.ReadOnlyModelViewSet):
+class ServiceViewSet(ConditionalGetMixin, viewsets.ReadOnlyModelViewSet):
     """ViewSet for services - Public read-only access"""
 
     queryset = Service.objects.select_related("category")
     serializer_class = ServiceSerializer
     permission_classes = [permissions.AllowAny]
     authentication_classes = []
+    content_version_family = "service"
 
 
-class BusinessInfoViewSet(viewsets.ReadOnlyModelViewSet):
+class BusinessInfoViewSet(ConditionalGetMixin, viewsets.ReadOnlyModelViewSet):
     """ViewSet for business information - Public read-only access"""
 
     queryset = BusinessInfo.objects.filter(is_active=True)
     serializer_class = BusinessInfoSerializer
     permission_classes = [permissions.AllowAny]
     authentication_classes = []
+    content_version_family = "business"
+
+    def serialized_business_info(self):
+        business_info = self.queryset.first()
+        if not business_info:
+            return None
+        return self.get_serializer(business_info).data
 
     def list(self, request):
         """Get active business information"""
         try:
-            business_info = self.queryset.first()
-            if not business_info:
+            # Memoized per worker (and host, for absolute media URLs); the
+            # invalidation bus evicts it everywhere when it is edited
+            data = process_memo.get_or_load(
+                "business",
+                request.build_absolute_uri("/"),
+                self.serialized_business_info,
+            )
+            if data is None:
                 return Response(
                     {"error": "Business information not found"},
                     status=status.HTTP_404_NOT_FOUND,
                 )
 
-            serializer = self.get_serializer(business_info)
-            return Response(serializer.data)
+            return Response(data)
         except Exception as e:
             return Response(
                 {"error": "Failed to retrieve business information"},